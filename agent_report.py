@@ -0,0 +1,73 @@
+import json
+
+class AgentReport(str):
+    """
+    The result of an agent: the markdown text shown to readers, together with the structured
+    findings it was rendered from. Being a string, a report passes through the executor, the caches
+    and the text responses unchanged; the JSON response format, the session history and batch
+    records read the findings instead of parsing the text.
+    """
+
+    def __new__(cls, text, score=None, score_label=None, verdicts=(), evidence=None, partial=False):
+        """
+        :param text: The markdown text of the result.
+        :param score: The agent's 0-100 score of the article, None if it does not score articles.
+        :param score_label: What the score measures, e.g. "trustworthiness" (higher is better) or
+            "bias" (higher is worse).
+        :param verdicts: The agent's verdicts as dictionaries, e.g. {"claim": ..., "verdict": "False"}.
+        :param evidence: A dictionary with claims as keys and the evidence lines found for them as values.
+        :param partial: Whether the run was cut short by the deadline and covers only part of the article.
+        """
+        report = super().__new__(cls, text)
+        report.score = score
+        report.score_label = score_label
+        report.verdicts = list(verdicts)
+        report.evidence = dict(evidence or {})
+        report.partial = partial
+        return report
+
+    def findings(self):
+        """
+        Returns the structured findings of the report.
+        """
+        return {
+            "score": self.score,
+            "score_label": self.score_label,
+            "verdicts": self.verdicts,
+            "evidence": self.evidence,
+            "partial": self.partial,
+        }
+
+    def to_json(self):
+        """
+        Serializes the text and the findings, for caches that store strings.
+        """
+        return json.dumps({"text": str(self), **self.findings()}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, value):
+        """
+        Restores a report serialized by to_json.
+        :return: The report, or None if the value is not a serialized report.
+        """
+        try:
+            data = json.loads(value)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("text"), str):
+            return None
+        return cls(data["text"], data.get("score"), data.get("score_label"), data.get("verdicts", ()),
+                   data.get("evidence"), data.get("partial", False))
+
+
+def as_report(result):
+    """
+    Returns the result as an AgentReport; plain strings, such as error messages, have no findings.
+    """
+    return result if isinstance(result, AgentReport) else AgentReport(result)
+
+def result_score(result):
+    """
+    Returns the score reported by an agent result, or None if it has none.
+    """
+    return as_report(result).score
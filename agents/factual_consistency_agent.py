@@ -1,46 +1,192 @@
 # agents/factual_consistency_agent.py
 import os
-from openai import OpenAI
+import re
+import json
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+from llm import create_openai_clients, create_chat_completion, acreate_chat_completion, split_into_chunks
+from metrics import FACTCHECK_SECONDS, FACTCHECK_ERRORS, record_cache_lookup
+from context import RunContext, ArticleContext, DeadlineExceeded, count_tokens
+from scheduler import PRIORITY_BATCH
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from cache import LRUCache, ClaimVerdictStore, normalize_claim
+from claim_batcher import ClaimBatcher
+from evidence_index import EvidenceIndex
+from agent_report import AgentReport
+
+# "[2] The Eiffel Tower was constructed in 1889." lines of the extraction reply
+TAGGED_CLAIM = re.compile(r"^\s*\[(\d+)\]\s*(.*)$")
+
+def dedupe_claims(claims):
+    """
+    Removes empty and duplicate claims, keeping the first occurrence of each in order.
+    """
+    unique = {}
+    for claim in claims:
+        claim = claim.strip()
+        key = normalize_claim(claim)
+        if key and key not in unique:
+            unique[key] = claim
+    return list(unique.values())
+
+def collect_by_deadline(futures, context=None):
+    """
+    Waits for futures until the context's deadline and returns their results in submission order,
+    with None for those that did not finish in time; these are cancelled and mark the run as partial.
+    Errors other than DeadlineExceeded are raised as usual.
+    :param futures: concurrent.futures.Future objects.
+    :param context: Optional RunContext carrying the deadline.
+    :return: A list of results, one per future.
+    """
+    deadline = context.deadline if context is not None else None
+    done, not_done = wait(futures, timeout=deadline.remaining() if deadline is not None else None)
+    for future in not_done:
+        future.cancel()
+    results, missed = [], bool(not_done)
+    for future in futures:
+        try:
+            results.append(future.result() if future in done else None)
+        except DeadlineExceeded:
+            results.append(None)
+            missed = True
+    if missed:
+        context.partial = True
+    return results
+
+async def acollect_by_deadline(awaitables, context=None):
+    """
+    Asynchronous variant of collect_by_deadline, for coroutines and asyncio futures.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    if not tasks:
+        return []
+    deadline = context.deadline if context is not None else None
+    done, pending = await asyncio.wait(tasks, timeout=deadline.remaining() if deadline is not None else None)
+    for task in pending:
+        task.cancel()
+    results, missed = [], bool(pending)
+    for task in tasks:
+        try:
+            results.append(task.result() if task in done else None)
+        except DeadlineExceeded:
+            results.append(None)
+            missed = True
+    if missed:
+        context.partial = True
+    return results
 
 class FactualConsistencyAgent:
     description = "Verifies the factual accuracy of the article by cross-referencing its claims with external sources."
     OPENAI_MODEL = "gpt-4o"  # Define a constant for the OpenAI model to be used
+    PROMPT_VERSION = "3"  # Bump when the prompts change to invalidate cached results
 
     def __init__(self):
 
-        self.output_log = []  # Accumulate output for Gradio interface
-
         # Ensure the OPENAI API key is set
         api_key = os.environ.get("OPENAI_API_KEY")
         if api_key is None:
             raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
 
-        # Initialize the OpenAI client
-        self.client = OpenAI(api_key=api_key)
+        # Initialize the pooled OpenAI clients (blocking and asyncio-based), shared by all requests
+        self.client, self.async_client = create_openai_clients(api_key)
 
         # Initialize Google Fact Check Tools API client
         google_api_key = os.environ.get("GOOGLE_API_KEY")
         if google_api_key is None:
             raise ValueError("Google API key not found. Please set the GOOGLE_API_KEY environment variable.")
-        self.google_client = build("factchecktools", "v1alpha1", developerKey=google_api_key)
+        self.google_api_key = google_api_key
+        self.google_api_endpoint = os.environ.get("INFOFACT_FACTCHECK_ENDPOINT")  # e.g. a local stub for benchmarks
+        self.google_client_instance = None  # Built on first use, see google_client
+        self.google_client_lock = threading.Lock()
+
+        # httplib2 connections are not thread-safe, so each lookup thread gets its own
+        self.http_local = threading.local()
+        self.factcheck_timeout = float(os.environ.get("INFOFACT_FACTCHECK_TIMEOUT", "10"))
+
+        # Fact Check lookups for false claims run concurrently, bounded by INFOFACT_FACTCHECK_CONCURRENCY
+        max_lookups = int(os.environ.get("INFOFACT_FACTCHECK_CONCURRENCY", "4"))
+        self.evidence_pool = ThreadPoolExecutor(max_workers=max_lookups, thread_name_prefix="factcheck")
+
+        # Cache evidence per query; "No evidence found." is cached too, for a shorter time
+        self.evidence_cache = LRUCache(
+            max_entries=int(os.environ.get("INFOFACT_EVIDENCE_CACHE_SIZE", "4096")),
+            ttl=float(os.environ.get("INFOFACT_EVIDENCE_TTL", "86400")),
+        )
+        self.negative_evidence_ttl = float(os.environ.get("INFOFACT_EVIDENCE_NEGATIVE_TTL", "3600"))
+
+        # Every claim review the API returns is kept in a local similarity index, so paraphrases of
+        # claims checked before find their evidence without a remote call; "" disables the index
+        index_path = os.environ.get(
+            "INFOFACT_EVIDENCE_INDEX", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "evidence_index")
+        )
+        self.evidence_index = EvidenceIndex(index_path) if index_path else None
+        self.evidence_similarity = float(os.environ.get("INFOFACT_EVIDENCE_SIMILARITY", "0.9"))
+        self.evidence_index_results = int(os.environ.get("INFOFACT_EVIDENCE_INDEX_RESULTS", "5"))
 
-        # Test Google API
-        self.test_google_api()
+        # Long articles are split into chunks whose claims are extracted in parallel, and long claim
+        # lists are evaluated in parallel shards, so latency stays flat as articles grow
+        self.extract_chunk_tokens = int(os.environ.get("INFOFACT_EXTRACT_CHUNK_TOKENS", "1500"))
+        self.evaluate_shard_size = int(os.environ.get("INFOFACT_EVALUATE_SHARD_SIZE", "15"))
+        max_llm_calls = int(os.environ.get("INFOFACT_FACTCHECK_LLM_CONCURRENCY", "8"))
+        self.llm_pool = ThreadPoolExecutor(max_workers=max_llm_calls, thread_name_prefix="factcheck-llm")
 
-    def log_and_accumulate(self, message):
+        # Claims are attributed to the paragraph they come from, so when an edited article is
+        # resubmitted in the same session only its changed paragraphs are sent to the LLM
+        self.paragraph_claims = LRUCache(
+            max_entries=int(os.environ.get("INFOFACT_PARAGRAPH_CLAIMS_CACHE_SIZE", "4096")),
+            ttl=float(os.environ.get("INFOFACT_PARAGRAPH_CLAIMS_TTL", "3600")),
+        )
+
+        # Verdicts are shared across articles, so republished claims are only sent to the LLM once
+        self.verdict_store = ClaimVerdictStore(model_version=f"{self.OPENAI_MODEL}:{self.PROMPT_VERSION}")
+
+        # In bulk runs the claims of concurrently processed articles are evaluated in shared requests
+        self.claim_batcher = ClaimBatcher(
+            partial(self.evaluate_shard, priority=PRIORITY_BATCH), self.llm_pool, model=self.OPENAI_MODEL
+        )
+
+    def log_and_accumulate(self, context, message):
         """
-        Print the message to the console and accumulate it in the output log.
+        Print the message to the console and accumulate it in the run's output log.
+        :param context: The RunContext of the current call.
         :param message: The message to log.
         """
         print(message)  # Print to backend console
-        self.output_log.append(message)  # Accumulate for Gradio
+        context.log(message)  # Accumulate for Gradio and report progress
+
+    @property
+    def google_client(self):
+        """
+        The Google Fact Check Tools API client, built on first use to keep agent construction fast.
+        """
+        if self.google_client_instance is None:
+            with self.google_client_lock:
+                if self.google_client_instance is None:
+                    client_options = {"api_endpoint": self.google_api_endpoint} if self.google_api_endpoint else None
+                    self.google_client_instance = build(
+                        "factchecktools", "v1alpha1", developerKey=self.google_api_key, client_options=client_options
+                    )
+        return self.google_client_instance
+
+    def health_check(self):
+        """
+        Probe the external services this agent depends on. Called by the opt-in health-check endpoint.
+        :return: A dictionary with the service names as keys and True if the service works.
+        """
+        return {"google_fact_check": self.test_google_api()}
 
     def test_google_api(self):
-        # Test Google API with a known false claim
+        """
+        Test Google API with a known false claim.
+        :return: True if the API returned a 'False' rating for the claim.
+        """
         query = "The Earth is flat"
         try:
-            response = self.google_client.claims().search(query=query).execute()
+            response = self.google_client.claims().search(query=query).execute(http=self.thread_http())
 
             # Check for textualRating indicating "False"
             if "claims" in response:
@@ -50,51 +196,154 @@ class FactualConsistencyAgent:
                         textual_rating = review.get("textualRating", "").lower()
                         if "false" in textual_rating:
                             print(f"✅ Google API check works: Found 'False' textualRating for query '{query}'.")
-                            return
+                            return True
             print(f"⚠️ Google API check did not find any 'False' textualRating for query '{query}'.")
         except Exception as e:
             print(f"Error: {e}")
+        return False
 
-    def search_evidence(self, claim):
+    def thread_http(self):
         """
-        Search for evidence supporting or refuting a claim using Google Fact Check Tools API.
+        Return the HTTP connection of the current thread, creating it on first use.
+        """
+        http = getattr(self.http_local, "http", None)
+        if http is None:
+            http = self.http_local.http = build_http()
+            http.timeout = self.factcheck_timeout
+        return http
+
+    def search_evidence(self, claim, context=None):
+        """
+        Search for evidence supporting or refuting a claim, in the local evidence index first and
+        with the Google Fact Check Tools API if no near-duplicate of the claim was reviewed before.
+        API results are cached per normalized query; index matches are not, as the lookup is local.
         :param claim: The claim to search for.
+        :param context: Optional RunContext receiving the timing of the API call.
         :return: A list of evidence summaries.
         """
-        try:
-            # Call the Google Fact Check Tools API
-            response = self.google_client.claims().search(query=claim).execute()
+        query_key = " ".join(claim.split()).casefold()
+        evidence = self.evidence_cache.get(query_key)
+        record_cache_lookup("evidence", evidence is not None, evidence is None)
+        if evidence is not None:
+            return evidence
 
-            # Extract evidence from the response
-            evidence = []
-            if "claims" in response:
-                for item in response["claims"]:
-                    text = item.get("text", "No claim text available")
-                    claimant = item.get("claimant", "Unknown claimant")
-                    review = item.get("claimReview", [])
-                    for rev in review:
-                        publisher = rev.get("publisher", {}).get("name", "Unknown publisher")
-                        title = rev.get("title", "No title available")
-                        url = rev.get("url", "No URL available")
-                        textual_rating = rev.get("textualRating", "No rating available")
-                        evidence.append(
-                            f"Claim: {text}\n"
-                            f"  - Claimant: {claimant}\n"
-                            f"  - Publisher: {publisher}\n"
-                            f"  - Title: {title}\n"
-                            f"  - URL: {url}\n"
-                            f"  - Rating: {textual_rating}"
-                        )
-            return evidence if evidence else ["No evidence found."]
+        evidence = self.search_evidence_index(claim, context)
+        if evidence is not None:
+            return evidence
+
+        started = time.perf_counter()
+        evidence = self.fetch_evidence(claim)
+        seconds = time.perf_counter() - started
+        FACTCHECK_SECONDS.observe(seconds)
+        if context is not None:
+            context.record_call("factcheck:search", seconds)
+        if evidence == ["No evidence found."]:
+            self.evidence_cache.set(query_key, evidence, ttl=self.negative_evidence_ttl)
+        elif not evidence[0].startswith("Error during evidence search"):
+            self.evidence_cache.set(query_key, evidence)
+        return evidence
+
+    def search_evidence_for_claims(self, claims, context=None):
+        """
+        Search evidence for several claims concurrently, until the context's deadline.
+        :param claims: The claims to search for.
+        :param context: Optional RunContext receiving the timings of the API calls.
+        :return: A dictionary with claims as keys and their evidence as values; claims whose lookup
+            missed the deadline are left out.
+        """
+        futures = [self.evidence_pool.submit(self.search_evidence, claim, context) for claim in claims]
+        return {claim: evidence for claim, evidence in zip(claims, collect_by_deadline(futures, context)) if evidence is not None}
+
+    async def asearch_evidence_for_claims(self, claims, context=None):
+        """
+        Asynchronous variant of search_evidence_for_claims. The Google client is blocking, so the
+        lookups run on the bounded lookup pool.
+        """
+        loop = asyncio.get_running_loop()
+        evidence = await acollect_by_deadline(
+            [loop.run_in_executor(self.evidence_pool, self.search_evidence, claim, context) for claim in claims], context
+        )
+        return {claim: found for claim, found in zip(claims, evidence) if found is not None}
+
+    def search_evidence_index(self, claim, context=None):
+        """
+        Look up evidence in the local index of the claim reviews seen before.
+        :param claim: The claim to search for.
+        :param context: Optional RunContext receiving the timing of the lookup.
+        :return: A list of evidence summaries, or None if no stored claim is a near-duplicate.
+        """
+        if self.evidence_index is None:
+            return None
+        started = time.perf_counter()
+        matches = self.evidence_index.search(claim, self.evidence_similarity, self.evidence_index_results)
+        if context is not None:
+            context.record_call("evidence_index:search", time.perf_counter() - started)
+        record_cache_lookup("evidence_index", bool(matches), not matches)
+        return [self.format_review(review) for _, review in matches] or None
+
+    def fetch_claim_reviews(self, claim):
+        """
+        Query the Google Fact Check Tools API for a claim.
+        :param claim: The claim to search for.
+        :return: A list of review dictionaries with the reviewed claim's "text" and "claimant", and
+            the review's "publisher", "title", "url" and "rating".
+        """
+        # Call the Google Fact Check Tools API
+        response = self.google_client.claims().search(query=claim).execute(http=self.thread_http())
+
+        # Extract the reviews from the response
+        reviews = []
+        for item in response.get("claims", []):
+            for rev in item.get("claimReview", []):
+                reviews.append({
+                    "text": item.get("text", "No claim text available"),
+                    "claimant": item.get("claimant", "Unknown claimant"),
+                    "publisher": rev.get("publisher", {}).get("name", "Unknown publisher"),
+                    "title": rev.get("title", "No title available"),
+                    "url": rev.get("url", "No URL available"),
+                    "rating": rev.get("textualRating", "No rating available"),
+                })
+        return reviews
+
+    def format_review(self, review):
+        """
+        Format a claim review as an evidence summary.
+        """
+        return (
+            f"Claim: {review['text']}\n"
+            f"  - Claimant: {review['claimant']}\n"
+            f"  - Publisher: {review['publisher']}\n"
+            f"  - Title: {review['title']}\n"
+            f"  - URL: {review['url']}\n"
+            f"  - Rating: {review['rating']}"
+        )
+
+    def fetch_evidence(self, claim):
+        """
+        Query the Google Fact Check Tools API for a claim, bypassing the cache, and add the reviews
+        found to the evidence index.
+        :param claim: The claim to search for.
+        :return: A list of evidence summaries.
+        """
+        try:
+            reviews = self.fetch_claim_reviews(claim)
         except Exception as e:
+            FACTCHECK_ERRORS.inc()
             return [f"Error during evidence search: {str(e)}"]
 
-    # Define function to extract claims from the article
-    def extract_claims(self, article_text):
+        if reviews and self.evidence_index is not None:
+            try:
+                self.evidence_index.add(reviews)
+            except Exception as e:
+                print(f"Could not add Fact Check reviews to the evidence index: {e}")
+        return [self.format_review(review) for review in reviews] or ["No evidence found."]
+
+    def build_extract_messages(self, paragraphs):
         """
-        Extract claims from the article.
-        :param article_text: The text of the article to analyze.
-        :return: A list of extracted claims.
+        Build the chat messages for extracting claims from the article. The paragraphs are numbered
+        and each claim refers to the paragraph it comes from.
+        :param paragraphs: The paragraphs of the article or chunk to analyze.
+        :return: A list of chat messages for the OpenAI API.
         """
 
         # Example output added to the system prompt
@@ -102,121 +351,526 @@ class FactualConsistencyAgent:
             "You are an expert in analyzing text and extracting factual claims in an article. "
             "Your task is to extract claims exactly as they appear in the text without making corrections or assumptions. "
             "Ensure each claim is self-contained and includes all necessary context for a fact-checker service. "
-            "Write each claim on a new line as plain text, without adding any numbers, bullets, or other formatting. "
+            "The paragraphs of the article are numbered in square brackets. "
+            "Write each claim on a new line as plain text, starting with the number of the paragraph it comes from "
+            "in square brackets, without adding any other numbers, bullets, or formatting. "
             "For example:\n\n"
             "Input:\n"
-            "The Eiffel Tower, a global icon of France, is located in Tampere Finland and was constructed in 1889 by Gustave Eiffel. "
+            "[1] The Eiffel Tower, a global icon of France, is located in Tampere Finland. "
+            "[2] It was constructed in 1889 by Gustave Eiffel. "
             "Output:\n"
-            "The Eiffel Tower is located in Tampere, Finland.\n"
-            "The Eiffel Tower was constructed in 1889 by Gustave Eiffel.\n"
+            "[1] The Eiffel Tower is located in Tampere, Finland.\n"
+            "[2] The Eiffel Tower was constructed in 1889 by Gustave Eiffel.\n"
         )
 
         # Prepare the article text as a prompt for the AI
+        numbered_text = "\n\n".join(f"[{number}] {paragraph}" for number, paragraph in enumerate(paragraphs, 1))
         user_prompt_extract_facts = (
             f"Carefully read the following article and extract main factual claims:\n\n"
-            f"{article_text}\n\n"
+            f"{numbered_text}\n\n"
         )
 
+        return [
+            {"role": "system", "content": system_prompt_extract_facts},
+            {"role": "user", "content": user_prompt_extract_facts},
+        ]
+
+    def parse_extracted_claims(self, chatgpt_reply, paragraph_count):
+        """
+        Parse the extraction reply into claims attributed to the paragraphs of the chunk.
+        :param chatgpt_reply: The raw reply of the LLM, one claim per line.
+        :param paragraph_count: The number of paragraphs the chunk was numbered with.
+        :return: A list of (index, claim) tuples, with the zero-based paragraph index or None if the
+            line does not refer to a paragraph of the chunk.
+        """
+        claims = []
+        for line in chatgpt_reply.split("\n"):
+            tagged = TAGGED_CLAIM.match(line)
+            if tagged and 1 <= int(tagged.group(1)) <= paragraph_count:
+                claims.append((int(tagged.group(1)) - 1, tagged.group(2)))
+            elif line.strip():
+                claims.append((None, line))
+        return claims
+
+    def chunk_paragraphs(self, paragraphs, article=None):
+        """
+        Group paragraphs into chunks that fit the extraction token budget. Paragraphs that do not fit
+        are split on sentence boundaries, and their pieces keep the paragraph's hash.
+        :param paragraphs: A list of (paragraph_hash, paragraph) tuples, in the order of the article.
+        :param article: Optional ArticleContext of the whole article; its token count spares counting
+            articles that fit in one chunk.
+        :return: A list of chunks, each a list of (paragraph_hash, text) tuples.
+        """
+        if not paragraphs:
+            return []
+        if article is not None and article.token_count <= self.extract_chunk_tokens:
+            return [paragraphs]
+
+        chunks = []
+        current, current_tokens = [], 0
+        for paragraph_hash, paragraph in paragraphs:
+            tokens = count_tokens(paragraph, self.OPENAI_MODEL)
+            if tokens > self.extract_chunk_tokens:
+                pieces = split_into_chunks(paragraph, self.extract_chunk_tokens, self.OPENAI_MODEL)
+            else:
+                pieces = [paragraph]
+            for piece in pieces:
+                if len(pieces) > 1:
+                    tokens = count_tokens(piece, self.OPENAI_MODEL)
+                if current and current_tokens + tokens > self.extract_chunk_tokens:
+                    chunks.append(current)
+                    current, current_tokens = [], 0
+                current.append((paragraph_hash, piece))
+                current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def plan_extraction(self, article_text, context=None):
+        """
+        Decide which paragraphs need claim extraction. Paragraphs that were already in the session's
+        previous input reuse the claims extracted then; the others are grouped into chunks.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext carrying the ArticleContext and the unchanged paragraphs.
+        :return: A tuple (article, reused, chunks): the ArticleContext, a dictionary of reused claims
+            by paragraph hash, and the chunks to extract.
+        """
+        article = context.article if context is not None and context.article is not None else ArticleContext(article_text)
+        unchanged = context.unchanged_paragraphs if context is not None else frozenset()
+
+        reused, pending, seen = {}, [], set()
+        for paragraph_hash, paragraph in zip(article.paragraph_hashes, article.paragraphs):
+            if paragraph_hash in seen:
+                continue
+            seen.add(paragraph_hash)
+            claims = self.paragraph_claims.get(paragraph_hash) if paragraph_hash in unchanged else None
+            if claims is not None:
+                reused[paragraph_hash] = claims
+            else:
+                pending.append((paragraph_hash, paragraph))
+
+        if unchanged:
+            record_cache_lookup("paragraph_claims", len(reused), len(pending))
+            self.log_and_accumulate(
+                context, f"♻️ Reusing the claims of {len(reused)} unchanged paragraphs, extracting {len(pending)} changed paragraphs.\n"
+            )
+        return article, reused, self.chunk_paragraphs(pending, article)
+
+    def merge_extraction(self, article, reused, chunks, chunk_claims):
+        """
+        Merge reused and freshly extracted claims in the order of the article, and remember the
+        claims of each fully extracted paragraph for the next edit of the article.
+        :param article: The ArticleContext of the article.
+        :param reused: A dictionary of reused claims by paragraph hash.
+        :param chunks: The chunks that were extracted.
+        :param chunk_claims: The (index, claim) tuples of each chunk, or None for chunks that missed the deadline.
+        :return: A list of claims without duplicates.
+        """
+        claims_by_paragraph = dict(reused)
+        unattributed, incomplete = [], set()
+        for chunk, claims in zip(chunks, chunk_claims):
+            paragraph_hashes = [paragraph_hash for paragraph_hash, _ in chunk]
+            for paragraph_hash in paragraph_hashes:
+                claims_by_paragraph.setdefault(paragraph_hash, [])
+            if claims is None:
+                incomplete.update(paragraph_hashes)
+                continue
+            for index, claim in claims:
+                if index is None:
+                    # Cannot be attributed, so no paragraph of this chunk is remembered
+                    unattributed.append(claim)
+                    incomplete.update(paragraph_hashes)
+                else:
+                    claims_by_paragraph[paragraph_hashes[index]].append(claim)
+
+        for chunk in chunks:
+            for paragraph_hash, _ in chunk:
+                if paragraph_hash not in incomplete:
+                    self.paragraph_claims.set(paragraph_hash, dedupe_claims(claims_by_paragraph[paragraph_hash]))
+
+        ordered = [claim for paragraph_hash in article.paragraph_hashes for claim in claims_by_paragraph.get(paragraph_hash, ())]
+        return dedupe_claims(ordered + unattributed)
+
+    def shard_claims(self, claims):
+        """
+        Split the claims into shards of at most evaluate_shard_size claims.
+        :param claims: A list of claims to evaluate.
+        :return: A list of claim lists.
+        """
+        size = max(self.evaluate_shard_size, 1)
+        return [claims[i:i + size] for i in range(0, len(claims), size)]
+
+    # Define function to extract claims from the article
+    def extract_claims(self, article_text, context=None):
+        """
+        Extract claims from the article. Long articles are split into chunks whose claims are
+        extracted in parallel and merged without duplicates. Chunks not done by the context's
+        deadline are skipped. Paragraphs unchanged since the session's previous input are not
+        extracted again.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext receiving the timings of the LLM calls.
+        :return: A list of extracted claims.
+        """
+        article, reused, chunks = self.plan_extraction(article_text, context)
+        if len(chunks) == 1:
+            chunk_claims = [self.extract_chunk_claims(chunks[0], context)]
+        else:
+            futures = [self.llm_pool.submit(self.extract_chunk_claims, chunk, context) for chunk in chunks]
+            chunk_claims = collect_by_deadline(futures, context)
+        return self.merge_extraction(article, reused, chunks, chunk_claims)
+
+    async def aextract_claims(self, article_text, context=None):
+        """
+        Asynchronous variant of extract_claims.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext receiving the timings of the LLM calls.
+        :return: A list of extracted claims.
+        """
+        article, reused, chunks = self.plan_extraction(article_text, context)
+        if len(chunks) == 1:
+            chunk_claims = [await self.aextract_chunk_claims(chunks[0], context)]
+        else:
+            chunk_claims = await acollect_by_deadline([self.aextract_chunk_claims(chunk, context) for chunk in chunks], context)
+        return self.merge_extraction(article, reused, chunks, chunk_claims)
+
+    def extract_chunk_claims(self, chunk, context=None):
+        """
+        Extract claims from a single article chunk with one LLM call.
+        :param chunk: A list of (paragraph_hash, text) tuples to analyze.
+        :param context: Optional RunContext receiving the timing of the LLM call.
+        :return: A list of (index, claim) tuples, see parse_extracted_claims.
+        """
         # Use OpenAI to extract claims
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt_extract_facts},
-                {"role": "user", "content": user_prompt_extract_facts},
-            ],
+        chat_completion = create_chat_completion(
+            self.client, "extract_claims", context,
+            messages=self.build_extract_messages([text for _, text in chunk]),
+            model=self.OPENAI_MODEL,
+        )
+        return self.parse_extracted_claims(chat_completion.choices[0].message.content, len(chunk))
+
+    async def aextract_chunk_claims(self, chunk, context=None):
+        """
+        Asynchronous variant of extract_chunk_claims.
+        :param chunk: A list of (paragraph_hash, text) tuples to analyze.
+        :param context: Optional RunContext receiving the timing of the LLM call.
+        :return: A list of (index, claim) tuples, see parse_extracted_claims.
+        """
+        chat_completion = await acreate_chat_completion(
+            self.async_client, "extract_claims", context,
+            messages=self.build_extract_messages([text for _, text in chunk]),
             model=self.OPENAI_MODEL,
         )
-        chatgpt_reply = chat_completion.choices[0].message.content
-        return chatgpt_reply.split("\n")  # Split into a list of claims
+        return self.parse_extracted_claims(chat_completion.choices[0].message.content, len(chunk))
 
-    def evaluate_claims(self, claims):
+    def build_evaluate_messages(self, claims):
         """
-        Evaluate claims based on LLM knowledge.
+        Build the chat messages for evaluating claims. Each claim is tagged with an ID that the
+        reply refers to, so verdicts are matched to claims without parsing the claim text.
         :param claims: A list of claims to evaluate.
-        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        :return: A list of chat messages for the OpenAI API.
         """
-        # Updated system prompt with syntax example
         system_prompt_evaluate = (
             "You are an expert in evaluating factual claims. "
             "Your task is to assess each claim as either 'True' or 'False' based on your knowledge and reasoning. "
-            "Provide only the evaluation ('True' or 'False') for each claim in the specified format. "
             "Focus on factual accuracy and avoid subjective or opinion-based judgments. "
-            "Write each evaluation on a new line in the format '<Claim>: <True/False>'. "
+            "The claims are given as a JSON object with an ID for each claim. "
+            "Reply with a JSON object that gives the evaluation of every claim by its ID, in the format "
+            '{"verdicts": [{"id": "<ID>", "verdict": "<True/False>"}]}. '
             "For example:\n\n"
-            "Roses are black: False\n"
-            "The Eiffel Tower is in Paris: True\n"
+            "Input:\n"
+            '{"claims": [{"id": "1", "claim": "Roses are black"}, {"id": "2", "claim": "The Eiffel Tower is in Paris"}]}\n'
+            "Output:\n"
+            '{"verdicts": [{"id": "1", "verdict": "False"}, {"id": "2", "verdict": "True"}]}\n'
         )
 
-        # Updated user prompt
         user_prompt_evaluate = (
             "Evaluate the following claims as 'True' or 'False' based on your knowledge:\n\n"
-            + "\n".join(f"{claim}" for claim in claims)
+            + json.dumps({"claims": [{"id": str(i), "claim": claim} for i, claim in enumerate(claims, 1)]}, ensure_ascii=False)
         )
 
-        # Use OpenAI to evaluate the claims
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt_evaluate},
-                {"role": "user", "content": user_prompt_evaluate},
-            ],
-            model=self.OPENAI_MODEL,
-        )
-        chatgpt_reply = chat_completion.choices[0].message.content
+        return [
+            {"role": "system", "content": system_prompt_evaluate},
+            {"role": "user", "content": user_prompt_evaluate},
+        ]
+
+    def parse_evaluations(self, chatgpt_reply, claims):
+        """
+        Parse the ID-tagged JSON reply of the LLM into a dictionary of claim evaluations.
+        :param chatgpt_reply: The raw evaluation JSON from OpenAI.
+        :param claims: The claims in the order they were tagged with IDs.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        try:
+            verdicts = json.loads(chatgpt_reply).get("verdicts", [])
+        except (ValueError, AttributeError):
+            return {}
 
-        # Parse the response into a dictionary of claim evaluations
+        claims_by_id = {str(i): claim for i, claim in enumerate(claims, 1)}
         evaluations = {}
-        for line in chatgpt_reply.split("\n"):
-            if ": " in line:
-                claim, result = line.rsplit(": ", 1)
-                evaluations[claim.strip()] = result.strip()
+        for item in verdicts:
+            if not isinstance(item, dict):
+                continue
+            claim = claims_by_id.get(str(item.get("id")))
+            verdict = str(item.get("verdict", "")).strip().capitalize()
+            if claim is not None and verdict in ("True", "False"):
+                evaluations[claim] = verdict
         return evaluations
 
-    def process_article(self, article_text):
+    def cache_stats(self):
         """
-        Process the article by extracting claims, evaluating them, and verifying false claims.
-        :param article_text: The text of the article to process.
-        :return: A formatted text block containing the results of the analysis.
+        Return the statistics of the claim verdict store, the claim batcher and the evidence index.
+        Reported by the cache_stats command.
         """
-        self.output_log = []  # Reset the log for each new article
+        stats = self.verdict_store.stats()
+        stats.update({f"batched_{name}": value for name, value in self.claim_batcher.stats().items()})
+        if self.evidence_index is not None:
+            stats.update({f"evidence_index_{name}": value for name, value in self.evidence_index.stats().items()})
+        return stats
 
-        base_score = 100  # Start with a perfect score
-        penalty_per_false_claim = 10
-        additional_penalty_with_evidence = 5
+    def merge_evaluations(self, claims, stored, evaluated):
+        """
+        Merge stored verdicts with fresh LLM evaluations in the order of the claims, and store the
+        fresh verdicts for later articles.
+        :param claims: The claims that were evaluated.
+        :param stored: A dictionary of verdicts found in the verdict store.
+        :param evaluated: A dictionary of verdicts returned by the LLM for the other claims.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        self.verdict_store.set_many(evaluated)
+        return {claim: stored.get(claim, evaluated.get(claim)) for claim in claims if claim in stored or claim in evaluated}
 
-        self.log_and_accumulate("Processing article for factual consistency...\n")
+    def evaluate_claims(self, claims, context=None):
+        """
+        Evaluate claims based on LLM knowledge. Claims with a stored verdict are not sent to the LLM.
+        :param claims: A list of claims to evaluate.
+        :param context: Optional RunContext; in batch runs the claims share requests with other articles.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        stored = self.verdict_store.get_many(claims)
+        misses = [claim for claim in claims if claim not in stored]
+        if context is not None and context.batch:
+            evaluated = self.claim_batcher.submit(misses).result()
+        else:
+            evaluated = self.evaluate_uncached_claims(misses, context)
+        return self.merge_evaluations(claims, stored, evaluated)
 
-        # Step 1: Extract claims
-        claims = self.extract_claims(article_text)
-        self.log_and_accumulate("\nClaims Extracted by LLM:")
+    async def aevaluate_claims(self, claims, context=None):
+        """
+        Asynchronous variant of evaluate_claims.
+        :param claims: A list of claims to evaluate.
+        :param context: Optional RunContext; in batch runs the claims share requests with other articles.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        stored = self.verdict_store.get_many(claims)
+        misses = [claim for claim in claims if claim not in stored]
+        if context is not None and context.batch:
+            evaluated = await asyncio.wrap_future(self.claim_batcher.submit(misses))
+        else:
+            evaluated = await self.aevaluate_uncached_claims(misses, context)
+        return self.merge_evaluations(claims, stored, evaluated)
+
+    def evaluate_uncached_claims(self, claims, context=None):
+        """
+        Evaluate claims with the LLM. Long claim lists are evaluated in parallel shards. Shards not
+        done by the context's deadline are left out, so their claims stay unverified.
+        :param claims: A list of claims to evaluate.
+        :param context: Optional RunContext receiving the timings of the LLM calls.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        shards = self.shard_claims(claims)
+        if len(shards) <= 1 and (context is None or context.deadline is None):
+            return self.evaluate_shard(shards[0], context) if shards else {}
+        evaluations = {}
+        futures = [self.llm_pool.submit(self.evaluate_shard, shard, context) for shard in shards]
+        for shard_evaluations in collect_by_deadline(futures, context):
+            evaluations.update(shard_evaluations or {})
+        return evaluations
+
+    async def aevaluate_uncached_claims(self, claims, context=None):
+        """
+        Asynchronous variant of evaluate_uncached_claims.
+        :param claims: A list of claims to evaluate.
+        :param context: Optional RunContext receiving the timings of the LLM calls.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        evaluations = {}
+        shard_results = await acollect_by_deadline([self.aevaluate_shard(shard, context) for shard in self.shard_claims(claims)],
+                                                   context)
+        for shard_evaluations in shard_results:
+            evaluations.update(shard_evaluations or {})
+        return evaluations
+
+    def evaluate_shard(self, claims, context=None, priority=None):
+        """
+        Evaluate a shard of claims with one LLM call.
+        :param claims: A list of claims to evaluate.
+        :param context: Optional RunContext receiving the timing of the LLM call.
+        :param priority: Optional scheduling priority overriding the one derived from the context.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        # Use OpenAI to evaluate the claims
+        chat_completion = create_chat_completion(
+            self.client, "evaluate_claims", context, priority,
+            messages=self.build_evaluate_messages(claims),
+            model=self.OPENAI_MODEL,
+            response_format={"type": "json_object"},
+        )
+        return self.parse_evaluations(chat_completion.choices[0].message.content, claims)
+
+    async def aevaluate_shard(self, claims, context=None):
+        """
+        Asynchronous variant of evaluate_shard.
+        :param claims: A list of claims to evaluate.
+        :param context: Optional RunContext receiving the timing of the LLM call.
+        :return: A dictionary with claims as keys and their evaluation ('True' or 'False') as values.
+        """
+        chat_completion = await acreate_chat_completion(
+            self.async_client, "evaluate_claims", context,
+            messages=self.build_evaluate_messages(claims),
+            model=self.OPENAI_MODEL,
+            response_format={"type": "json_object"},
+        )
+        return self.parse_evaluations(chat_completion.choices[0].message.content, claims)
+
+    def log_extracted_claims(self, claims, context):
+        """
+        Log the claims extracted by the LLM.
+        :param claims: The extracted claims.
+        :param context: The RunContext of the current call.
+        """
+        self.log_and_accumulate(context, "\nClaims Extracted by LLM:")
         for claim in claims:
-            self.log_and_accumulate(f"- {claim}")
+            self.log_and_accumulate(context, f"- {claim}")
 
-        # Step 2: Evaluate claims
-        evaluations = self.evaluate_claims(claims)
-        self.log_and_accumulate("\n\nClaims Evaluated by LLM:")
+    def log_evaluations(self, evaluations, context):
+        """
+        Log the claim evaluations returned by the LLM.
+        :param evaluations: The claim evaluations returned by the LLM.
+        :param context: The RunContext of the current call.
+        """
+        self.log_and_accumulate(context, "\n\nClaims Evaluated by LLM:")
         for claim, result in evaluations.items():
             symbol = "✅" if result == "True" else "❌"
-            self.log_and_accumulate(f"{symbol} {claim}: {result}")
+            self.log_and_accumulate(context, f"{symbol} {claim}: {result}")
 
-        # Step 3: Verify false claims with Google Fact Check Tools API
-        self.log_and_accumulate("\n\nFalse Claims Verified by Google Fact Check API:")
+    def score_false_claims(self, evaluations, evidence_by_claim, context, claims=None):
+        """
+        Score the article based on the false claims and the evidence found for them. If the deadline
+        cut the run short, the score covers only the claims verified until then and is marked partial.
+        :param evaluations: The claim evaluations returned by the LLM.
+        :param evidence_by_claim: A dictionary with false claims as keys and their evidence as values.
+        :param context: The RunContext of the current call.
+        :param claims: Optional list of all extracted claims, for reporting how many were verified.
+        :return: The final trustworthiness score and a dictionary with the false claims as keys and
+            the evidence found for them as values.
+        """
+        base_score = 100  # Start with a perfect score
+        penalty_per_false_claim = 10
+        additional_penalty_with_evidence = 5
+
+        cited = {}
+        self.log_and_accumulate(context, "\n\nFalse Claims Verified by Google Fact Check API:")
         for claim, result in evaluations.items():
             if result == "False":
                 base_score -= penalty_per_false_claim
-                evidence = self.search_evidence(claim)
-                if evidence and evidence[0] != "No evidence found.":
+                evidence = evidence_by_claim.get(claim)
+                if evidence is None and context.partial:
+                    self.log_and_accumulate(context, f"⏱️ Fact Check lookup for False claim '{claim}' missed the deadline.")
+                elif evidence and evidence[0] != "No evidence found.":
                     base_score -= additional_penalty_with_evidence
-                    self.log_and_accumulate(f"❌ Evidence for False claim: '{claim}':")
+                    cited[claim] = list(evidence)
+                    self.log_and_accumulate(context, f"❌ Evidence for False claim: '{claim}':")
                     for ev in evidence:
-                        self.log_and_accumulate(f"  - {ev}")
+                        self.log_and_accumulate(context, f"  - {ev}")
                 else:
-                    self.log_and_accumulate(f"⚠️ No evidence found to backup False claim: '{claim}'.")
+                    self.log_and_accumulate(context, f"⚠️ No evidence found to backup False claim: '{claim}'.")
 
         # Ensure the score is not negative
         final_score = max(base_score, 0)
-        self.log_and_accumulate(f"\n\nFinal Trustworthiness Score: {final_score}")
+        if context.partial:
+            total = len(claims) if claims is not None else len(evaluations)
+            self.log_and_accumulate(
+                context, f"\n\n⏱️ Deadline reached: {len(evaluations)} of {total} claims verified, the score covers only those."
+            )
+            self.log_and_accumulate(context, f"\n\nFinal Trustworthiness Score: {final_score} (partial)")
+        else:
+            self.log_and_accumulate(context, f"\n\nFinal Trustworthiness Score: {final_score}")
+        return final_score, cited
 
-        # Return the accumulated log as a single text block
-        return "\n".join(self.output_log)
+    def build_report(self, evaluations, evidence_by_claim, context, claims):
+        """
+        Score the article and return the run's log together with its findings.
+        :param evaluations: The claim evaluations returned by the LLM.
+        :param evidence_by_claim: A dictionary with false claims as keys and their evidence as values.
+        :param context: The RunContext of the current call.
+        :param claims: The extracted claims.
+        :return: An AgentReport scoring the article's trustworthiness.
+        """
+        score, cited = self.score_false_claims(evaluations, evidence_by_claim, context, claims)
+        return AgentReport(
+            context.output(), score=score, score_label="trustworthiness",
+            verdicts=[{"claim": claim, "verdict": verdict} for claim, verdict in evaluations.items()],
+            evidence=cited, partial=context.partial,
+        )
+
+    def check_claims(self, claims, context):
+        """
+        Raise DeadlineExceeded if the deadline passed before any claims could be extracted, as there
+        is no partial score to report then.
+        """
+        if context.partial and not claims:
+            raise DeadlineExceeded("Deadline passed before any claims were extracted")
+
+    def process_article(self, article_text, context=None):
+        """
+        Process the article by extracting claims, evaluating them, and verifying false claims.
+        :param article_text: The text of the article to process.
+        :param context: Optional RunContext holding this call's log and progress callback.
+        :return: An AgentReport: the formatted text block of the analysis and its findings.
+        """
+        # All per-article state lives in the context, so concurrent calls do not interleave
+        context = context or RunContext()
+
+        self.log_and_accumulate(context, "Processing article for factual consistency...\n")
+
+        # Step 1: Extract claims
+        claims = self.extract_claims(article_text, context)
+        self.check_claims(claims, context)
+        self.log_extracted_claims(claims, context)
+
+        # Step 2: Evaluate claims
+        evaluations = self.evaluate_claims(claims, context)
+        self.log_evaluations(evaluations, context)
+
+        # Step 3: Verify false claims with Google Fact Check Tools API
+        false_claims = [claim for claim, result in evaluations.items() if result == "False"]
+        evidence_by_claim = self.search_evidence_for_claims(false_claims, context)
+
+        # Return the accumulated log as a single text block, with the findings it reports
+        return self.build_report(evaluations, evidence_by_claim, context, claims)
+
+    async def aprocess_article(self, article_text, context=None):
+        """
+        Asynchronous variant of process_article.
+        :param article_text: The text of the article to process.
+        :param context: Optional RunContext holding this call's log and progress callback.
+        :return: An AgentReport: the formatted text block of the analysis and its findings.
+        """
+        context = context or RunContext()
+
+        self.log_and_accumulate(context, "Processing article for factual consistency...\n")
+
+        # Step 1 and 2: Extract and evaluate claims without blocking the event loop
+        claims = await self.aextract_claims(article_text, context)
+        self.check_claims(claims, context)
+        self.log_extracted_claims(claims, context)
+        evaluations = await self.aevaluate_claims(claims, context)
+        self.log_evaluations(evaluations, context)
+
+        # Step 3: Verify false claims with Google Fact Check Tools API
+        false_claims = [claim for claim, result in evaluations.items() if result == "False"]
+        evidence_by_claim = await self.asearch_evidence_for_claims(false_claims, context)
+        return self.build_report(evaluations, evidence_by_claim, context, claims)
 
 if __name__ == "__main__":
     # Example usage
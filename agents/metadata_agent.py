@@ -1,9 +1,49 @@
 import os
-import re
-from openai import OpenAI
+import json
+from urllib.parse import urlsplit
+from llm import create_openai_clients, create_chat_completion, acreate_chat_completion
+from cache import LRUCache
+from metrics import record_cache_lookup
+from context import URL_PATTERN, PERSON_PATTERN, content_hash
+from agent_report import AgentReport
+
+# Second-level suffixes under which the registrable domain has three labels, e.g. bbc.co.uk
+MULTI_LABEL_SUFFIXES = {
+    "co.uk", "org.uk", "gov.uk", "ac.uk", "com.au", "net.au", "org.au", "gov.au", "co.nz", "co.jp",
+    "co.in", "com.br", "com.cn", "com.mx", "co.za", "com.tr", "europa.eu",
+}
+
+def registrable_domain(url):
+    """
+    Reduces a URL to its registrable domain, e.g. https://www.bbc.co.uk/news to bbc.co.uk.
+    Returns None if the URL has no host name or cannot be parsed, e.g. https://[abc, so it is skipped.
+    """
+    try:
+        host = (urlsplit(url.rstrip(".,;:!?)\"'")).hostname or "").rstrip(".")
+    except ValueError:
+        return None
+    labels = host.split(".")
+    if len(labels) < 2:
+        return None
+    keep = 3 if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES and len(labels) > 2 else 2
+    return ".".join(labels[-keep:])
+
+def load_reputation_index(path):
+    """
+    Loads the precomputed reputation table of domains and public figures, keyed by normalized entity.
+    """
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    index = {}
+    for domain, verdict in table.get("domains", {}).items():
+        index[("URL", domain.lower())] = verdict
+    for person, verdict in table.get("persons", {}).items():
+        index[("Person", person.casefold())] = verdict
+    return index
 
 class MetadataAgent:
     description = "Analyzes the credibility of URLs and persons mentioned within the article."
+    PROMPT_VERSION = "2"  # Bump when the prompt changes to invalidate cached results
 
     def __init__(self):
         # Ensure the API key is set
@@ -11,24 +51,81 @@ class MetadataAgent:
         if api_key is None:
             raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
 
-        # Initialize the OpenAI client
-        self.client = OpenAI(api_key=api_key)
+        # Initialize the pooled OpenAI clients (blocking and asyncio-based), shared by all requests
+        self.client, self.async_client = create_openai_clients(api_key)
+
+        # Well-known domains and public figures are answered from a local table without the LLM
+        index_path = os.environ.get(
+            "INFOFACT_REPUTATION_INDEX",
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "reputation_index.json"),
+        )
+        self.reputation_index = load_reputation_index(index_path)
+
+        # Previous LLM verdicts per entity, so each unknown entity is only sent to the LLM once
+        self.reputation_cache = LRUCache(
+            max_entries=int(os.environ.get("INFOFACT_REPUTATION_CACHE_SIZE", "4096")),
+            ttl=float(os.environ.get("INFOFACT_REPUTATION_TTL", str(7 * 86400))),
+        )
 
-    def extract_urls_and_persons(self, article_text):
+    def extract_urls_and_persons(self, article_text, article=None):
         """
         Extract all URLs and names of persons from the article text.
         :param article_text: The text of the article.
+        :param article: Optional ArticleContext that already holds the URLs and persons.
         :return: A tuple containing a list of URLs and a list of persons.
         """
-        # Extract URLs using a regex pattern
-        url_pattern = r"https?://[^\s]+"
-        urls = re.findall(url_pattern, article_text)
+        if article is not None:
+            return list(article.urls), list(article.persons)
+        urls = URL_PATTERN.findall(article_text)
+        persons = PERSON_PATTERN.findall(article_text)
+        return urls, persons
 
-        # Extract potential names of persons using a simple heuristic (capitalized words)
-        person_pattern = r"\b[A-Z][a-z]+ [A-Z][a-z]+\b"
-        persons = re.findall(person_pattern, article_text)
+    def extract_entities(self, article_text, article=None):
+        """
+        Extract the distinct entities to evaluate: registrable domains of the URLs and persons.
+        :param article_text: The text of the article.
+        :param article: Optional ArticleContext that already holds the URLs and persons.
+        :return: A list of (kind, name) tuples, where kind is "URL" or "Person", in order of appearance.
+        """
+        urls, persons = self.extract_urls_and_persons(article_text, article)
+        domains = [registrable_domain(url) for url in urls]
+        entities = [("URL", domain) for domain in domains if domain] + [("Person", person) for person in persons]
+        return list(dict.fromkeys(entities))
 
-        return urls, persons
+    def input_signature(self, article):
+        """
+        Identify the agent's input: the analysis depends only on the entities of the article, so
+        edits that keep its URLs and persons reuse the cached result.
+        :param article: The ArticleContext of the article.
+        :return: A hash of the entities in order of appearance.
+        """
+        entities = self.extract_entities(article.text, article)
+        return "entities-" + content_hash("\n".join(f"{kind}:{name}" for kind, name in entities))
+
+    def entity_key(self, entity):
+        """
+        Return the normalized lookup key of an entity.
+        """
+        kind, name = entity
+        return kind, name.lower() if kind == "URL" else name.casefold()
+
+    def lookup_entities(self, entities):
+        """
+        Look up entities in the reputation index and in the cache of previous LLM verdicts.
+        :param entities: A list of (kind, name) tuples.
+        :return: A dictionary of the known entities' verdicts and a list of the unknown entities.
+        """
+        verdicts = {}
+        unknown = []
+        for entity in entities:
+            key = self.entity_key(entity)
+            verdict = self.reputation_index.get(key) or self.reputation_cache.get(key)
+            if verdict is not None:
+                verdicts[entity] = verdict
+            else:
+                unknown.append(entity)
+        record_cache_lookup("reputation", len(verdicts), len(unknown))
+        return verdicts, unknown
 
     def add_icons_to_analysis(self, analysis_text):
         """
@@ -57,53 +154,153 @@ class MetadataAgent:
                 updated_lines.append(line)
         return "\n".join(updated_lines)
 
-    def process_article(self, article_text):
+    def build_messages(self, entities):
         """
-        Analyze the credibility of URLs and persons mentioned within the article.
-        :param article_text: The text of the article to analyze.
-        :return: A formatted string summarizing the metadata analysis.
+        Build the chat messages evaluating the entities that are not in the index, in a single request.
+        Each entity is tagged with an ID that the reply refers to.
+        :param entities: A list of (kind, name) tuples.
+        :return: A list of chat messages for the OpenAI API.
         """
-        # Extract URLs and persons from the article
-        urls, persons = self.extract_urls_and_persons(article_text)
-
         # Prepare the system prompt with an example output format
         system_prompt = (
             "You are an expert in evaluating the credibility of online sources and individuals. "
-            "Your task is to analyze the credibility of the provided URLs and persons mentioned in the article. "
+            "Your task is to analyze the credibility of the provided website domains and persons mentioned in an article. "
             "For each entity, provide a brief analysis of its reliability, potential bias, and trustworthiness. "
-            "Follow the format below:\n\n"
-            "URLs:\n"
-            "- <URL 1>: Reliability: <High/Medium/Low>. Bias: <Neutral/Biased>. Trustworthiness: <Description>.\n"
-            "- <URL 2>: Reliability: <High/Medium/Low>. Bias: <Neutral/Biased>. Trustworthiness: <Description>.\n\n"
-            "Persons:\n"
-            "- <Person 1>: Reliability: <High/Medium/Low>. Bias: <Neutral/Biased>. Trustworthiness: <Description>.\n"
-            "- <Person 2>: Reliability: <High/Medium/Low>. Bias: <Neutral/Biased>. Trustworthiness: <Description>.\n"
+            "The entities are given as a JSON object with an ID for each entity. "
+            "Reply with a JSON object in the format below, with one verdict per ID:\n\n"
+            '{"verdicts": [{"id": "<ID>", "reliability": "<High/Medium/Low>", '
+            '"bias": "<Neutral/Slightly biased/Strongly biased>", "trustworthiness": "<Description>"}]}\n'
         )
 
-        # Prepare the user prompt with the extracted URLs and persons
+        # Prepare the user prompt with the entities to evaluate
         metadata_prompt = (
-            f"Evaluate the credibility of the following entities mentioned in the article:\n\n"
-            f"URLs:\n" + ("\n".join(urls) if urls else "None") + "\n\n"
-            f"Persons:\n" + ("\n".join(persons) if persons else "None") + "\n\n"
-            f"Provide your evaluation in the specified format."
+            "Evaluate the credibility of the following entities mentioned in the article:\n\n"
+            + json.dumps({"entities": [
+                {"id": str(i), "type": "domain" if kind == "URL" else "person", "name": name}
+                for i, (kind, name) in enumerate(entities, 1)
+            ]}, ensure_ascii=False)
         )
 
-        # Use OpenAI to analyze the metadata
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": metadata_prompt},
-            ],
-            model="gpt-3.5-turbo",
-        )
-        chatgpt_reply = chat_completion.choices[0].message.content
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": metadata_prompt},
+        ]
 
+    def parse_verdicts(self, chatgpt_reply, entities):
+        """
+        Parse the ID-tagged JSON reply of the LLM and cache each entity's verdict.
+        :param chatgpt_reply: The raw JSON reply from OpenAI.
+        :param entities: The entities in the order they were tagged with IDs.
+        :return: A dictionary with the entities as keys and their verdicts as values.
+        """
+        try:
+            items = json.loads(chatgpt_reply).get("verdicts", [])
+        except (ValueError, AttributeError):
+            return {}
+
+        entities_by_id = {str(i): entity for i, entity in enumerate(entities, 1)}
+        verdicts = {}
+        for item in items:
+            entity = entities_by_id.get(str(item.get("id"))) if isinstance(item, dict) else None
+            if entity is None:
+                continue
+            verdict = {field: str(item.get(field, "Unknown")) for field in ("reliability", "bias", "trustworthiness")}
+            verdicts[entity] = verdict
+            self.reputation_cache.set(self.entity_key(entity), verdict)
+        return verdicts
+
+    def render_analysis(self, entities, verdicts):
+        """
+        Render the verdicts in the agent's text format, grouped into URLs and persons.
+        :param entities: The entities in order of appearance.
+        :param verdicts: A dictionary with the entities as keys and their verdicts as values.
+        :return: The analysis text.
+        """
+        sections = []
+        for kind, title in (("URL", "URLs"), ("Person", "Persons")):
+            lines = []
+            for entity in entities:
+                if entity[0] != kind:
+                    continue
+                verdict = verdicts.get(entity)
+                if verdict is None:
+                    lines.append(f"- {entity[1]}: No evaluation available.")
+                else:
+                    lines.append(
+                        f"- {entity[1]}: Reliability: {verdict['reliability']}. Bias: {verdict['bias']}. "
+                        f"Trustworthiness: {verdict['trustworthiness'].rstrip('.')}."
+                    )
+            sections.append(f"{title}:\n" + ("\n".join(lines) if lines else "- None"))
+        return "\n\n".join(sections)
+
+    def format_reply(self, chatgpt_reply):
+        """
+        Format the raw LLM reply into the agent's markdown output.
+        :param chatgpt_reply: The raw analysis text from OpenAI.
+        :return: A formatted string summarizing the metadata analysis.
+        """
         # Add icons to the analysis
         analysis_with_icons = self.add_icons_to_analysis(chatgpt_reply)
 
         # Return the formatted response
         return f"### Metadata Analysis\n\n{analysis_with_icons}"
 
+    def build_report(self, entities, verdicts):
+        """
+        Render the verdicts into the agent's markdown output and return it with the verdicts.
+        :param entities: The entities in order of appearance.
+        :param verdicts: A dictionary with the entities as keys and their verdicts as values.
+        :return: An AgentReport; the metadata agent reports verdicts but no score.
+        """
+        return AgentReport(
+            self.format_reply(self.render_analysis(entities, verdicts)),
+            verdicts=[{"entity": entity[1], **verdicts[entity]} for entity in entities if entity in verdicts],
+        )
+
+    def process_article(self, article_text, context=None):
+        """
+        Analyze the credibility of URLs and persons mentioned within the article. Known entities are
+        answered from the reputation index and cache, the others are evaluated in a single LLM call.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext providing the ArticleContext and receiving the timing of the LLM call.
+        :return: An AgentReport summarizing the metadata analysis.
+        """
+        entities = self.extract_entities(article_text, context.article if context is not None else None)
+        verdicts, unknown = self.lookup_entities(entities)
+
+        if unknown:
+            # Use OpenAI to analyze the entities that are not known yet
+            chat_completion = create_chat_completion(
+                self.client, "metadata", context,
+                messages=self.build_messages(unknown),
+                model="gpt-3.5-turbo",
+                response_format={"type": "json_object"},
+            )
+            verdicts.update(self.parse_verdicts(chat_completion.choices[0].message.content, unknown))
+
+        return self.build_report(entities, verdicts)
+
+    async def aprocess_article(self, article_text, context=None):
+        """
+        Asynchronous variant of process_article that does not block while waiting on the LLM.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext providing the ArticleContext and receiving the timing of the LLM call.
+        :return: An AgentReport summarizing the metadata analysis.
+        """
+        entities = self.extract_entities(article_text, context.article if context is not None else None)
+        verdicts, unknown = self.lookup_entities(entities)
+
+        if unknown:
+            chat_completion = await acreate_chat_completion(
+                self.async_client, "metadata", context,
+                messages=self.build_messages(unknown),
+                model="gpt-3.5-turbo",
+                response_format={"type": "json_object"},
+            )
+            verdicts.update(self.parse_verdicts(chat_completion.choices[0].message.content, unknown))
+
+        return self.build_report(entities, verdicts)
+
 if __name__ == "__main__":
     # Example usage
     agent = MetadataAgent()
@@ -1,9 +1,16 @@
 # agents/sentiment_analysis_agent.py
 import os
-from openai import OpenAI
+import json
+import time
+from llm import create_openai_clients, create_chat_completion, acreate_chat_completion
+from cache import LRUCache, content_hash
+from metrics import SENTIMENT_ARTICLES
+from sentiment_scorer import LexiconScorer, render_sentiment
+from agent_report import AgentReport
 
 class SentimentAnalysisAgent:
     description = "Analyzes the sentiment of the article, providing a quick overview of sentiment bias and emotional tone."
+    PROMPT_VERSION = "3"  # Bump when the prompt changes to invalidate cached results
 
     def __init__(self):
         # Ensure the API key is set
@@ -11,8 +18,19 @@ class SentimentAnalysisAgent:
         if api_key is None:
             raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
 
-        # Initialize the OpenAI client
-        self.client = OpenAI(api_key=api_key)
+        # Initialize the pooled OpenAI clients (blocking and asyncio-based), shared by all requests
+        self.client, self.async_client = create_openai_clients(api_key)
+
+        # Articles are scored locally first and only sent to the LLM when the local verdict is uncertain
+        lexicon_path = os.environ.get(
+            "INFOFACT_SENTIMENT_LEXICON",
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sentiment_lexicon.json"),
+        )
+        self.scorer = LexiconScorer(lexicon_path)
+        self.escalation_threshold = float(os.environ.get("INFOFACT_SENTIMENT_CONFIDENCE", "0.6"))
+
+        # Scores computed ahead for the articles of a bulk run, by content hash
+        self.prescored = LRUCache(max_entries=4096, ttl=600)
 
     def add_icons_to_analysis(self, analysis_text):
         """
@@ -43,24 +61,21 @@ class SentimentAnalysisAgent:
                 updated_lines.append(line)
         return "\n".join(updated_lines)
 
-    def process_article(self, article_text):
+    def build_messages(self, article_text):
         """
-        Analyze the sentiment of the article and provide a structured output.
+        Build the chat messages for the sentiment analysis request.
         :param article_text: The text of the article to analyze.
-        :return: A formatted string summarizing the sentiment analysis.
+        :return: A list of chat messages for the OpenAI API.
         """
         # Updated system prompt
         system_prompt_sentiment = (
             "You are an expert in sentiment analysis. "
             "Your task is to evaluate the tone of the provided article and provide a structured summary. "
             "Focus on identifying the overall sentiment (positive, negative, or neutral), sentiment bias, and emotional tone. "
-            "Provide the output in the following format:\n\n"
-            "Overall Tone: <Positive/Negative/Neutral>\n"
-            "Sentiment Bias Score: <0-100>\n"
-            "Key Highlights:\n"
-            "- <Highlight 1>\n"
-            "- <Highlight 2>\n"
-            "Impact: <Brief description of how the sentiment might influence readers>\n"
+            "Reply with a JSON object in the format below:\n\n"
+            '{"tone": "<Positive/Negative/Neutral>", "bias_score": <0-100>, '
+            '"highlights": ["<Highlight 1>", "<Highlight 2>"], '
+            '"impact": "<Brief description of how the sentiment might influence readers>"}\n'
         )
 
         # Updated user prompt
@@ -70,22 +85,137 @@ class SentimentAnalysisAgent:
             f"Provide your evaluation in the specified format."
         )
 
-        # Use OpenAI to analyze sentiment
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt_sentiment},
-                {"role": "user", "content": user_prompt_sentiment},
-            ],
-            model="gpt-3.5-turbo",
+        return [
+            {"role": "system", "content": system_prompt_sentiment},
+            {"role": "user", "content": user_prompt_sentiment},
+        ]
+
+    def parse_reply(self, chatgpt_reply):
+        """
+        Parse the JSON reply of the LLM into the fields of a sentiment reading.
+        :param chatgpt_reply: The raw JSON reply from OpenAI.
+        :return: A (tone, bias_score, highlights, impact) tuple, or None if the reply is malformed.
+        """
+        try:
+            reading = json.loads(chatgpt_reply)
+            tone = str(reading["tone"]).capitalize()
+            bias_score = min(max(int(reading["bias_score"]), 0), 100)
+        except (ValueError, TypeError, KeyError):
+            return None
+        highlights = reading.get("highlights")
+        highlights = [str(highlight) for highlight in highlights] if isinstance(highlights, list) else []
+        return tone, bias_score, highlights, str(reading.get("impact", ""))
+
+    def build_report(self, tone, bias_score, highlights, impact):
+        """
+        Render a sentiment reading into the agent's markdown output and return it with the reading.
+        :return: An AgentReport whose score is the sentiment bias (higher is more biased).
+        """
+        return AgentReport(
+            self.format_reply(render_sentiment(tone, bias_score, highlights, impact)),
+            score=bias_score, score_label="bias", verdicts=[{"tone": tone}],
         )
-        chatgpt_reply = chat_completion.choices[0].message.content
 
+    def local_report(self, score):
+        """
+        Return the report of the local scorer's verdict.
+        :param score: A SentimentScore.
+        """
+        return self.build_report(score.tone, score.bias_score, score.highlights(), score.impact())
+
+    def llm_report(self, chatgpt_reply, score):
+        """
+        Return the report of the LLM's reading, or of the local verdict if the reply is malformed.
+        :param chatgpt_reply: The raw JSON reply from OpenAI.
+        :param score: The local scorer's SentimentScore.
+        """
+        reading = self.parse_reply(chatgpt_reply)
+        return self.build_report(*reading) if reading is not None else self.local_report(score)
+
+    def format_reply(self, chatgpt_reply):
+        """
+        Format a rendered sentiment reading into the agent's markdown output.
+        :param chatgpt_reply: The reading in the text format of render_sentiment.
+        :return: A formatted string summarizing the sentiment analysis.
+        """
         # Add icons to the analysis
         analysis_with_icons = self.add_icons_to_analysis(chatgpt_reply)
 
         # Return the formatted response
         return f"### Sentiment Analysis\n\n{analysis_with_icons}"
 
+    def prepare_batch(self, texts):
+        """
+        Score many articles of a bulk run at once, ahead of their process_article calls.
+        :param texts: The article texts.
+        """
+        for text, score in zip(texts, self.scorer.score(texts)):
+            self.prescored.set(content_hash(text), score)
+
+    def local_score(self, article_text, context=None):
+        """
+        Return the local scorer's verdict on the article, computed ahead in bulk runs.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext providing the content hash and receiving the timing.
+        :return: A SentimentScore.
+        """
+        started = time.perf_counter()
+        article = context.article if context is not None else None
+        score = self.prescored.get(article.content_hash if article is not None else content_hash(article_text))
+        if score is None:
+            score = self.scorer.score([article_text])[0]
+        if context is not None:
+            context.record_call("sentiment:lexicon", time.perf_counter() - started, confidence=score.confidence)
+        return score
+
+    def confident(self, score):
+        """
+        Return True if the local score is confident enough to skip the LLM, and count the outcome.
+        """
+        confident = score.confidence >= self.escalation_threshold
+        SENTIMENT_ARTICLES.labels("local" if confident else "llm").inc()
+        return confident
+
+    def process_article(self, article_text, context=None):
+        """
+        Analyze the sentiment of the article and provide a structured output. The local scorer
+        answers unless its confidence is below INFOFACT_SENTIMENT_CONFIDENCE, then the LLM does.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext receiving the timings of the local scorer and the LLM call.
+        :return: An AgentReport summarizing the sentiment analysis.
+        """
+        score = self.local_score(article_text, context)
+        if self.confident(score):
+            return self.local_report(score)
+
+        # Use OpenAI to analyze sentiment
+        chat_completion = create_chat_completion(
+            self.client, "sentiment", context,
+            messages=self.build_messages(article_text),
+            model="gpt-3.5-turbo",
+            response_format={"type": "json_object"},
+        )
+        return self.llm_report(chat_completion.choices[0].message.content, score)
+
+    async def aprocess_article(self, article_text, context=None):
+        """
+        Asynchronous variant of process_article that does not block while waiting on the LLM.
+        :param article_text: The text of the article to analyze.
+        :param context: Optional RunContext receiving the timings of the local scorer and the LLM call.
+        :return: An AgentReport summarizing the sentiment analysis.
+        """
+        score = self.local_score(article_text, context)
+        if self.confident(score):
+            return self.local_report(score)
+
+        chat_completion = await acreate_chat_completion(
+            self.async_client, "sentiment", context,
+            messages=self.build_messages(article_text),
+            model="gpt-3.5-turbo",
+            response_format={"type": "json_object"},
+        )
+        return self.llm_report(chat_completion.choices[0].message.content, score)
+
 if __name__ == "__main__":
     # Example usage
     agent = SentimentAnalysisAgent()
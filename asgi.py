@@ -0,0 +1,98 @@
+# ASGI entry point: uvicorn asgi:app --host 0.0.0.0 --port 5000
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware, DEFAULT_EXCLUDED_CONTENT_TYPES
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from backend import (
+    app as flask_app, executor, GZIP_MIN_BYTES, GZIP_LEVEL, parse_request, handle_command, resolve_article, render_response, error_response,
+    unchanged_paragraphs, wants_sse, encode_event, stream_payload, ordered_results,
+)
+from context import ArticleContext
+from metrics import REQUESTS_IN_FLIGHT, REQUEST_SECONDS
+
+async def stream_analysis(session_id, incoming_msg, selected_agents, options, sse, article=None):
+    """
+    Asynchronous variant of backend.stream_analysis.
+    """
+    article = article or ArticleContext(incoming_msg)
+    yield encode_event({"event": "session", "SessionID": session_id}, sse)
+
+    results = {}
+    timed_out = []
+    with REQUESTS_IN_FLIGHT.track_inprogress(), REQUEST_SECONDS.labels("stream").time():
+        try:
+            async for event in executor.arun_iter(selected_agents, incoming_msg, use_cache=options["use_cache"], article=article,
+                                                  deadline=options["deadline"], timed_out=timed_out,
+                                                  unchanged_paragraphs=unchanged_paragraphs(session_id, article, options)):
+                if event[0] == "result":
+                    results[event[1]] = event[2]
+                yield encode_event(stream_payload(event), sse)
+            response = render_response(session_id, article, ordered_results(selected_agents, results), options, timed_out)
+
+        except Exception as e:
+            response = error_response(session_id, options, e)
+
+    yield encode_event({"event": "done", **response}, sse)
+
+async def process_prompt(request: Request):
+    """
+    Asynchronous version of the /infofactagents route. Agents that implement aprocess_article
+    wait on the LLM without holding a thread, so one process can serve many analyses at once.
+    """
+    form = await request.form()
+    session_id, incoming_msg, selected_agents, options = parse_request(form)
+
+    command_response = handle_command(session_id, incoming_msg, selected_agents)
+    if command_response is not None:
+        payload, status = command_response
+        return JSONResponse(payload, status_code=status)
+
+    # Fetching a URL blocks on the network, so it runs in the thread pool
+    incoming_msg, error_response = await run_in_threadpool(resolve_article, session_id, form, incoming_msg, options["deadline"])
+    if error_response is not None:
+        payload, status = error_response
+        return JSONResponse(payload, status_code=status)
+
+    # Pre-process the article once for all agents: hash, token count, sentences, URLs and persons
+    article = ArticleContext(incoming_msg)
+
+    # Stream each agent's section as soon as it is ready
+    if options["stream"]:
+        sse = wants_sse(form, request.headers)
+        events = stream_analysis(session_id, incoming_msg, selected_agents, options, sse, article)
+        return StreamingResponse(events, media_type="text/event-stream" if sse else "application/x-ndjson")
+
+    timings = {} if options["timings"] else None
+    timed_out = []
+    with REQUESTS_IN_FLIGHT.track_inprogress(), REQUEST_SECONDS.labels("analyze").time():
+        try:
+            results = await executor.arun(selected_agents, incoming_msg, use_cache=options["use_cache"], timings=timings,
+                                          article=article, deadline=options["deadline"], timed_out=timed_out,
+                                          unchanged_paragraphs=unchanged_paragraphs(session_id, article, options))
+            response = render_response(session_id, article, results, options, timed_out)
+
+        except Exception as e:
+            response = error_response(session_id, options, e)
+
+    if timings is not None:
+        response["Timings"] = timings
+    return JSONResponse(response)
+
+# The async route takes precedence, every other route is served by the Flask app. Large responses
+# are gzip-compressed as in the Flask app; JSON-lines streams are sent uncompressed like SSE, so
+# each event reaches the client as soon as it is produced.
+app = Starlette(
+    routes=[
+        Route("/infofactagents", process_prompt, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        Middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL,
+                   exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/x-ndjson",)),
+    ],
+)
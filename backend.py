@@ -1,58 +1,35 @@
-from flask import Flask, request
+import time
+startup_started = time.perf_counter()  # Measures cold start, reported by the health-check endpoint
+
+from flask import Flask, Response, request
 import os
-import importlib
-import inspect
+import sys
 import json
-import uuid  # For generating unique session IDs
+import gzip
+import math
+from manager import Manager
+from executor import AgentExecutor
+from cache import ResultCache
+from batch import BatchManager
+from session_store import create_session_store
+from context import ArticleContext, Deadline
+from fetcher import ArticleFetcher, FetchError, is_url
+from response_format import build_response, history_entry
+from metrics import REQUESTS_IN_FLIGHT, REQUEST_SECONDS, render_metrics
 
-# In-memory session store
-sessions = {}
+# Session store with LRU and idle-TTL eviction, in memory or shared through SQLite
+sessions = create_session_store()
 
 app = Flask(__name__)
 
-class Manager:
-    def __init__(self):
-        # Dictionary to hold dynamically loaded agents by filename
-        self.agents = {}
-        self.load_agents()
-
-    def load_agents(self):
-        """
-        Dynamically loads all agents in the agents folder using the filename as the key,
-        and populates the agents dictionary with the agent instances and their descriptions.
-        """
-        agents_path = os.path.join(os.path.dirname(__file__), 'agents')
-        for filename in os.listdir(agents_path):
-            if filename.endswith('.py') and filename != '__init__.py':
-                agent_name = filename[:-3]  # Remove the '.py' extension
-                module_name = f'agents.{agent_name}'
-                module = importlib.import_module(module_name)
-
-                # Find the first class in the module to use as the agent
-                for _, obj in inspect.getmembers(module, inspect.isclass):
-                    if obj.__module__ == module_name:
-                        agent_instance = obj()
-                        description = getattr(agent_instance, "description", "No description provided")
-                        self.agents[agent_name] = {
-                            "instance": agent_instance,
-                            "description": description
-                        }
-                        break
-
-    def get_agents_list(self):
-        """
-        Returns a list of all loaded agents with their descriptions.
-        """
-        return [{"name": name, "description": data["description"]} for name, data in self.agents.items()]
-
-    def get_agent_by_name(self, name):
-        """
-        Retrieves an agent instance by filename-based name if it exists in the loaded agents.
-        """
-        return self.agents.get(name, {}).get("instance")
-
-
 manager = Manager()
+executor = AgentExecutor(manager, cache=ResultCache())
+batch_manager = BatchManager(executor)
+fetcher = ArticleFetcher()
+
+# Responses larger than this are gzip-compressed for clients that accept it
+GZIP_MIN_BYTES = int(os.environ.get("INFOFACT_GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("INFOFACT_GZIP_LEVEL", "6"))
 
 # System-prompt definition: instructs the AI to interpret user prompts
 def generate_system_prompt():
@@ -73,21 +50,59 @@ Always ensure the analysis is comprehensive and includes metadata evaluation, fa
 
 SYSTEM_PROMPT = generate_system_prompt()
 
-@app.route("/infofactagents", methods=["POST"])
-def process_prompt():
-    session_id = request.form.get('SessionID', '').strip()
-    incoming_msg = request.form.get('Body', '').strip()
-    selected_agents = request.form.get('Agents', '').split(',')  # Get selected agents from the request
-    response_text = ""
+def get_session(session_id):
+    """
+    Returns the SessionID of an existing session, or of a new session if it does not exist.
+    """
+    return sessions.get_or_create(session_id)
+
+def form_flag(form, name):
+    """
+    Returns True if the named form field is set to a truthy value such as "1" or "true".
+    """
+    return form.get(name, '').strip().lower() in ("1", "true", "yes", "on")
 
-    # Create a new session if no SessionID is provided
-    if not session_id or session_id not in sessions:
-        session_id = str(uuid.uuid4())
-        sessions[session_id] = {"history": []}  # Example: Store session-specific data like history
+def request_deadline(form):
+    """
+    Returns the Deadline of a request: the "Deadline" form field in seconds, capped at
+    INFOFACT_MAX_DEADLINE (300), or else INFOFACT_DEFAULT_DEADLINE (60), also for values that are not
+    positive finite numbers. None if the default is 0.
+    """
+    default = float(os.environ.get("INFOFACT_DEFAULT_DEADLINE", "60"))
+    try:
+        seconds = float(form.get('Deadline', '').strip() or default)
+    except ValueError:
+        seconds = default
+    # "nan" and "inf" parse as floats; nan would slip past both comparisons and disable the deadline
+    if not math.isfinite(seconds) or seconds <= 0:
+        seconds = default
+    else:
+        seconds = min(seconds, float(os.environ.get("INFOFACT_MAX_DEADLINE", "300")))
+    return Deadline(seconds) if seconds > 0 else None
 
-    # Retrieve session data
-    session_data = sessions[session_id]
+def parse_request(form):
+    """
+    Reads the request form and resolves the session.
+    Returns the SessionID, incoming message, selected agents and request options.
+    """
+    session_id = get_session(form.get('SessionID', '').strip())
+    incoming_msg = form.get('Body', '').strip()
+    selected_agents = form.get('Agents', '').split(',')  # Get selected agents from the request
+    options = {
+        "use_cache": not form_flag(form, 'BypassCache'),  # Force the agents to run even if a cached result exists
+        "stream": form_flag(form, 'Stream') or form.get('Stream', '').strip().lower() == "sse",
+        "timings": form_flag(form, 'Timings'),  # Add a per-agent timing breakdown to the response
+        "deadline": request_deadline(form),  # Agents still running at the deadline are reported as timed out
+        # Structured JSON by default, the markdown report only for clients that render it
+        "format": "markdown" if form.get('Format', '').strip().lower() in ("markdown", "md") else "json",
+    }
+    return session_id, incoming_msg, selected_agents, options
 
+def handle_command(session_id, incoming_msg, selected_agents):
+    """
+    Answers the requests that do not need any agent to run.
+    Returns a response tuple, or None when the article should be analyzed.
+    """
     if incoming_msg == "list_agents":
         agents_list = manager.get_agents_list()
         response_text = "Available agents:\n" + "\n".join([f"{agent['name']} - {agent['description']}" for agent in agents_list])
@@ -96,41 +111,313 @@ def process_prompt():
     elif incoming_msg == "system_prompt":
         return {"SessionID": session_id, "Response": SYSTEM_PROMPT}, 200
 
+    elif incoming_msg == "cache_stats":
+        stats = executor.cache.stats()
+        response_text = "Result cache statistics:\n" + "\n".join([f"{name}: {value}" for name, value in stats.items()])
+
+        # Agents may keep caches of their own, e.g. the claim verdict store of the factual agent
+        agent_stats = {}
+        for agent_name in manager.agents:
+            agent_instance = manager.get_agent_by_name(agent_name) if manager.is_loaded(agent_name) else None
+            if hasattr(agent_instance, "cache_stats"):
+                agent_stats[agent_name] = agent_instance.cache_stats()
+                response_text += f"\n\n{agent_name} cache statistics:\n" + "\n".join(
+                    [f"{name}: {value}" for name, value in agent_stats[agent_name].items()]
+                )
+        fetch_stats = fetcher.stats()
+        response_text += "\n\nURL fetch cache statistics:\n" + "\n".join([f"{name}: {value}" for name, value in fetch_stats.items()])
+        flight_stats = executor.flights.stats()
+        response_text += "\n\nCoalesced agent runs:\n" + "\n".join([f"{name}: {value}" for name, value in flight_stats.items()])
+        return {"SessionID": session_id, "Response": response_text, "Stats": stats, "AgentStats": agent_stats,
+                "FetchStats": fetch_stats, "FlightStats": flight_stats}, 200
+
+    # Check if no agents were selected
+    elif not selected_agents or selected_agents == ['']:
+        return {"SessionID": session_id, "Error": "No agents selected. Please select at least one agent."}, 400
+
+    return None
+
+def resolve_article(session_id, form, incoming_msg, deadline=None):
+    """
+    Fetches the article when the request names a URL, in the "URL" field or as the whole message,
+    so the agents see the extracted text instead of the page markup. The fetch counts against the
+    request's deadline.
+    Returns the article text and None, or None and an error response tuple.
+    """
+    url = form.get('URL', '').strip() or (incoming_msg if is_url(incoming_msg) else '')
+    if not url:
+        return incoming_msg, None
+    try:
+        return fetcher.fetch(url, deadline), None
+    except FetchError as e:
+        return None, ({"SessionID": session_id, "Error": str(e)}, e.status)
+
+def unchanged_paragraphs(session_id, article, options):
+    """
+    Diffs the article against the session's previous input by paragraph. Agents may reuse their
+    earlier analysis of the paragraphs that did not change, unless the request bypasses the cache.
+    :return: The hashes of the article's paragraphs that were already in the previous input.
+    """
+    if not options["use_cache"]:
+        return frozenset()
+    history = sessions.get_history(session_id)
+    previous = history[-1].get("paragraphs", ()) if history else ()
+    return frozenset(previous).intersection(article.paragraph_hashes)
+
+def format_results(incoming_msg, results):
+    """
+    Formats the agent results as markdown.
+    """
+    formatted_output = []
+    formatted_output.append(f"📰 **Article**\n\n{incoming_msg}\n")
+
+    for agent_name, result in results:
+        formatted_output.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n**{agent_name}**\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n{result}\n")
+
+    # Combine formatted output
+    return "\n".join(formatted_output)
+
+def render_response(session_id, article, results, options, timed_out=()):
+    """
+    Stores a compact entry of the analysis in the session history and builds the response: the
+    structured JSON by default, or the markdown report for Format=markdown.
+    :param article: The ArticleContext of the analyzed text.
+    :param results: A list of (agent_name, result) tuples in the requested order.
+    :param timed_out: The names of the agents that missed the deadline.
+    """
+    sessions.append_history(session_id, history_entry(article, results))
+    if options["format"] == "markdown":
+        response = {"SessionID": session_id, "Response": format_results(article.text, results)}
     else:
+        response = build_response(session_id, article, results, timed_out)
+    if timed_out:
+        response["TimedOut"] = list(timed_out)
+    return response
+
+def error_response(session_id, options, error):
+    """
+    Builds the response of an analysis that failed as a whole, in the requested format.
+    """
+    message = f"Error processing your prompt: {str(error)}"
+    if options["format"] == "markdown":
+        return {"SessionID": session_id, "Response": message}
+    return {"SessionID": session_id, "Error": message}
+
+def wants_sse(form, headers):
+    """
+    Returns True if a streaming client asked for Server-Sent Events instead of JSON lines.
+    """
+    return form.get('Stream', '').strip().lower() == "sse" or "text/event-stream" in headers.get("Accept", "")
+
+def encode_event(payload, sse):
+    """
+    Encodes a streaming event as a Server-Sent Event or as a JSON line.
+    """
+    data = json.dumps(payload, ensure_ascii=False)
+    if sse:
+        return f"event: {payload['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+def stream_payload(event):
+    """
+    Converts an executor event into the object sent to streaming clients.
+    """
+    kind, agent_name, value = event
+    if kind == "progress":
+        return {"event": "progress", "agent": agent_name, "message": value}
+    return {"event": "result", "agent": agent_name, "result": value}
+
+def ordered_results(selected_agents, results):
+    """
+    Puts results collected in completion order back into the requested order.
+    """
+    return [(agent_name, results[agent_name]) for agent_name in selected_agents if agent_name in results]
+
+def stream_analysis(session_id, incoming_msg, selected_agents, options, sse, article=None):
+    """
+    Yields the session, each agent's progress steps and result as soon as they are produced,
+    and finally the combined response in the requested format.
+    """
+    article = article or ArticleContext(incoming_msg)
+    yield encode_event({"event": "session", "SessionID": session_id}, sse)
+
+    results = {}
+    timed_out = []
+    with REQUESTS_IN_FLIGHT.track_inprogress(), REQUEST_SECONDS.labels("stream").time():
         try:
-            # Check if no agents were selected
-            if not selected_agents or selected_agents == ['']:
-                return {"SessionID": session_id, "Error": "No agents selected. Please select at least one agent."}, 400
+            for event in executor.run_iter(selected_agents, incoming_msg, use_cache=options["use_cache"], article=article,
+                                           deadline=options["deadline"], timed_out=timed_out,
+                                           unchanged_paragraphs=unchanged_paragraphs(session_id, article, options)):
+                if event[0] == "result":
+                    results[event[1]] = event[2]
+                yield encode_event(stream_payload(event), sse)
+            response = render_response(session_id, article, ordered_results(selected_agents, results), options, timed_out)
 
-            # Process the article with selected agents
-            formatted_output = []
-            formatted_output.append(f"📰 **Article**\n\n{incoming_msg}\n")
+        except Exception as e:
+            response = error_response(session_id, options, e)
 
-            for agent_name in selected_agents:
-                agent_data = manager.agents.get(agent_name)
-                if agent_data and hasattr(agent_data["instance"], "process_article"):
-                    result = agent_data["instance"].process_article(incoming_msg)
-                    formatted_output.append(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n**{agent_name}**\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n{result}\n")
+    yield encode_event({"event": "done", **response}, sse)
 
-            # Combine formatted output
-            response_text = "\n".join(formatted_output)
+@app.route("/infofactagents", methods=["POST"])
+def process_prompt():
+    session_id, incoming_msg, selected_agents, options = parse_request(request.form)
+
+    command_response = handle_command(session_id, incoming_msg, selected_agents)
+    if command_response is not None:
+        return command_response
+
+    incoming_msg, error_response = resolve_article(session_id, request.form, incoming_msg, options["deadline"])
+    if error_response is not None:
+        return error_response
+
+    # Pre-process the article once for all agents: hash, token count, sentences, URLs and persons
+    article = ArticleContext(incoming_msg)
 
-            # Optionally store the response in the session history
-            session_data["history"].append({"input": incoming_msg, "output": response_text})
+    # Stream each agent's section as soon as it is ready
+    if options["stream"]:
+        sse = wants_sse(request.form, request.headers)
+        events = stream_analysis(session_id, incoming_msg, selected_agents, options, sse, article)
+        return Response(events, mimetype="text/event-stream" if sse else "application/x-ndjson")
+
+    timings = {} if options["timings"] else None
+    timed_out = []
+    with REQUESTS_IN_FLIGHT.track_inprogress(), REQUEST_SECONDS.labels("analyze").time():
+        try:
+            # Run all selected agents concurrently, results come back in the requested order
+            results = executor.run(selected_agents, incoming_msg, use_cache=options["use_cache"], timings=timings, article=article,
+                                   deadline=options["deadline"], timed_out=timed_out,
+                                   unchanged_paragraphs=unchanged_paragraphs(session_id, article, options))
+            response = render_response(session_id, article, results, options, timed_out)
 
         except Exception as e:
-            response_text = f"Error processing your prompt: {str(e)}"
+            response = error_response(session_id, options, e)
 
-        return {"SessionID": session_id, "Response": response_text}, 200
+    if timings is not None:
+        response["Timings"] = timings
+    return response, 200
+
+@app.route("/infofactagents/batch", methods=["POST"])
+def create_batch():
+    """
+    Queues a batch analysis job. The articles come from a JSONL upload in the "File" field or from
+    a server-side "Path" under INFOFACT_BATCH_INPUT_DIR, one {"id": ..., "text": ...} object per line.
+    """
+    selected_agents = request.form.get('Agents', '').split(',')
+    if not selected_agents or selected_agents == ['']:
+        return {"Error": "No agents selected. Please select at least one agent."}, 400
 
-import requests
-if __name__ == "__main__":
     try:
-        # Fetch and display the public IP address
-        public_ip = requests.get("https://api.ipify.org").text
-        print(f"Backend is accessible at public IP address: {public_ip}")
-    except requests.RequestException as e:
-        print(f"Failed to fetch public IP address: {e}")
+        job = batch_manager.create_job(
+            selected_agents,
+            concurrency=request.form.get('Concurrency'),
+            use_cache=not form_flag(request.form, 'BypassCache'),
+            upload=request.files.get('File'),
+            path=request.form.get('Path', '').strip(),
+        )
+    except ValueError as e:
+        return {"Error": str(e)}, 400
+
+    return job.status(), 202
+
+@app.route("/infofactagents/batch/<job_id>", methods=["GET"])
+def batch_status(job_id):
+    job = batch_manager.get_job(job_id)
+    if job is None:
+        return {"Error": f"Unknown job: {job_id}"}, 404
+    return job.status(), 200
+
+@app.route("/infofactagents/batch/<job_id>/results", methods=["GET"])
+def batch_results(job_id):
+    """
+    Streams the job's JSONL result records. "offset" skips records already received and
+    "follow=1" keeps the stream open until the job finishes.
+    """
+    job = batch_manager.get_job(job_id)
+    if job is None:
+        return {"Error": f"Unknown job: {job_id}"}, 404
+    offset = request.args.get('offset', 0, type=int)
+    follow = form_flag(request.args, 'follow')
+    return Response(job.stream_results(offset=offset, follow=follow), mimetype="application/x-ndjson")
+
+@app.route("/infofactagents/batch/<job_id>/resume", methods=["POST"])
+def batch_resume(job_id):
+    job = batch_manager.resume(job_id)
+    if job is None:
+        return {"Error": f"Unknown job: {job_id}"}, 404
+    return job.status(), 202
+
+@app.route("/infofactagents/health", methods=["GET"])
+def health():
+    """
+    Reports the startup time and which agents are loaded. With probe=1 every agent is instantiated
+    and its optional health_check method probes the external services it depends on.
+    """
+    report = {"Status": "ok", "StartupSeconds": round(STARTUP_SECONDS, 4), "Sessions": sessions.stats(), "Agents": {}}
+
+    # The LLM client stack is imported with the first agent, so its scheduler is only reported once loaded
+    llm = sys.modules.get("llm")
+    if llm is not None:
+        report["LLM"] = llm.scheduler.stats()
+    probe = form_flag(request.args, 'probe')
+
+    for agent in manager.get_agents_list():
+        agent_name = agent["name"]
+        if not probe:
+            report["Agents"][agent_name] = {"loaded": manager.is_loaded(agent_name)}
+            continue
+
+        try:
+            agent_instance = manager.get_agent_by_name(agent_name)
+            checks = agent_instance.health_check() if hasattr(agent_instance, "health_check") else {}
+            report["Agents"][agent_name] = {"loaded": True, "checks": checks}
+            if not all(checks.values()):
+                report["Status"] = "degraded"
+        except Exception as e:
+            report["Agents"][agent_name] = {"loaded": False, "error": str(e)}
+            report["Status"] = "degraded"
+
+    return report, 200 if report["Status"] == "ok" else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Exposes latency, token usage, estimated cost, cache and error metrics in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.after_request
+def compress_response(response):
+    """
+    Gzip-compresses large buffered responses for clients that send Accept-Encoding: gzip.
+    Streams and files are sent as they are.
+    """
+    response.vary.add("Accept-Encoding")
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or "Content-Encoding" in response.headers or "gzip" not in request.headers.get("Accept-Encoding", "")):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+# Agents are instantiated on first use, so startup covers only imports and agent discovery
+STARTUP_SECONDS = time.perf_counter() - startup_started
+
+if __name__ == "__main__":
+    print(f"Backend started in {STARTUP_SECONDS:.3f} seconds")
+
+    # Fetching the public IP address needs network access, so it is opt-in
+    if os.environ.get("INFOFACT_SHOW_PUBLIC_IP"):
+        import requests
+        try:
+            # Fetch and display the public IP address
+            public_ip = requests.get("https://api.ipify.org", timeout=5).text
+            print(f"Backend is accessible at public IP address: {public_ip}")
+        except requests.RequestException as e:
+            print(f"Failed to fetch public IP address: {e}")
 
     # Start the Flask application
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
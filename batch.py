@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from agent_report import result_score
+
+# Articles read ahead and handed to the agents' prepare_batch together
+PREPARE_BLOCK = 32
+
+
+class BatchJob:
+    """
+    A batch analysis job persisted in its own directory:
+    manifest.json describes the job and results.jsonl receives one record per finished article.
+    Because results are appended as they complete, an interrupted job can be resumed by skipping
+    the indices already present in results.jsonl.
+    """
+
+    def __init__(self, job_dir, manifest):
+        self.job_dir = job_dir
+        self.manifest = manifest
+        self.job_id = manifest["job_id"]
+        self.results_path = os.path.join(job_dir, "results.jsonl")
+        self.write_lock = threading.Lock()
+        self.running = False
+        self.completed = 0
+        self.failed = 0
+
+    def save_manifest(self):
+        """
+        Writes the manifest atomically so a crash never leaves it half written.
+        """
+        temp_path = os.path.join(self.job_dir, "manifest.json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, os.path.join(self.job_dir, "manifest.json"))
+
+    def scan_results(self):
+        """
+        Reads results.jsonl once.
+        :return: The indices of the articles that already have a result record, and the number of
+            those records that are errors.
+        """
+        indices = set()
+        failed = 0
+        if not os.path.exists(self.results_path):
+            return indices, failed
+        with open(self.results_path, encoding="utf-8") as f:
+            for line in f:
+                # A torn final line from a crash is ignored and the article is processed again
+                try:
+                    record = json.loads(line)
+                    indices.add(record["index"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                failed += "error" in record
+        return indices, failed
+
+    def completed_indices(self):
+        """
+        Returns the indices of the articles that already have a result record.
+        """
+        return self.scan_results()[0]
+
+    def terminate_torn_line(self):
+        """
+        Ends a partial record left by a crash with a newline so the next record starts on its own line.
+        """
+        if not os.path.exists(self.results_path):
+            return
+        with open(self.results_path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def read_articles(self):
+        """
+        Yields (index, record_id, text, agent_names, error) for each article in the input JSONL file.
+        Each line is an object with "text" (or "Body"), and optionally "id" and "agents". A line
+        that is not such an object yields the reason in error, and None for the other fields.
+        """
+        with open(self.manifest["input_path"], encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield index, index, None, None, f"Invalid JSON: {e}"
+                    continue
+                if not isinstance(record, dict):
+                    yield index, index, None, None, "The line is not a JSON object"
+                    continue
+                text = record.get("text", record.get("Body", ""))
+                agents = record.get("agents") or self.manifest["agents"]
+                if isinstance(agents, str):
+                    agents = agents.split(",")
+                if not isinstance(text, str) or not isinstance(agents, list):
+                    yield index, record.get("id", index), None, None, "\"text\" must be a string and \"agents\" a list"
+                    continue
+                yield index, record.get("id", index), text, agents, None
+
+    def status(self):
+        """
+        Returns the job status for polling clients.
+        """
+        status = self.manifest["status"]
+        if status == "running" and not self.running:
+            status = "interrupted"  # The process that ran the job stopped before it finished
+        if self.running:
+            completed, failed = self.completed, self.failed
+        else:
+            # Counted from results.jsonl, so the counts survive a restart
+            done, failed = self.scan_results()
+            completed = len(done)
+        return {
+            "JobID": self.job_id,
+            "Status": status,
+            "Total": self.manifest.get("total"),
+            "Completed": completed,
+            "Failed": failed,
+            "Agents": self.manifest["agents"],
+            "Concurrency": self.manifest["concurrency"],
+        }
+
+    def append_result(self, record):
+        """
+        Appends a finished article's record to results.jsonl.
+        """
+        with self.write_lock:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+            self.completed += 1
+            if "error" in record:
+                self.failed += 1
+
+    def process_article(self, executor, index, record_id, text, agent_names):
+        """
+        Runs the agents on a single article and records the outcome.
+        """
+        started = time.time()
+        try:
+            # Batch runs let agents pack work from several articles into shared LLM requests
+            results = executor.run(agent_names, text, use_cache=self.manifest["use_cache"], batch=True)
+            record = {
+                "index": index,
+                "id": record_id,
+                "agents": {agent_name: result for agent_name, result in results},
+                "scores": {agent_name: result_score(result) for agent_name, result in results},
+            }
+        except Exception as e:
+            record = {"index": index, "id": record_id, "error": str(e)}
+        record["seconds"] = round(time.time() - started, 3)
+        self.append_result(record)
+
+    def submit_block(self, executor, pool, slots, block):
+        """
+        Prepares a block of articles in one pass and submits them for processing.
+        :param block: A list of (index, record_id, text, agent_names) tuples.
+        """
+        if not block:
+            return
+        agent_names = list(dict.fromkeys(agent_name for _, _, _, names in block for agent_name in names))
+        executor.prepare_batch(agent_names, [text for _, _, text, _ in block])
+        for index, record_id, text, names in block:
+            slots.acquire()
+            future = pool.submit(self.process_article, executor, index, record_id, text, names)
+            future.add_done_callback(lambda _: slots.release())
+
+    def run(self, executor):
+        """
+        Processes every article not yet in results.jsonl with at most `concurrency` articles in flight.
+        """
+        self.running = True
+        self.manifest["status"] = "running"
+        self.save_manifest()
+
+        try:
+            self.terminate_torn_line()
+            done, self.failed = self.scan_results()
+            self.completed = len(done)
+            concurrency = self.manifest["concurrency"]
+            slots = threading.BoundedSemaphore(concurrency * 2)  # Keep the input from being read far ahead
+            total = 0
+
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"batch-{self.job_id[:8]}") as pool:
+                block = []
+                for index, record_id, text, agent_names, error in self.read_articles():
+                    total += 1
+                    if index in done:
+                        continue
+                    if error is not None:
+                        # A malformed line fails on its own, the other articles are still processed
+                        self.append_result({"index": index, "id": record_id, "error": error, "seconds": 0})
+                        continue
+                    block.append((index, record_id, text, agent_names))
+                    if len(block) >= PREPARE_BLOCK:
+                        self.submit_block(executor, pool, slots, block)
+                        block = []
+                self.submit_block(executor, pool, slots, block)
+
+            self.manifest["total"] = total
+            self.manifest["status"] = "finished"
+        except Exception as e:
+            self.manifest["status"] = "failed"
+            self.manifest["error"] = str(e)
+        finally:
+            self.running = False
+            self.save_manifest()
+
+    def stream_results(self, offset=0, follow=False, poll_interval=0.5):
+        """
+        Yields result lines from results.jsonl starting at the given line offset.
+        With follow=True, keeps yielding new lines until the job stops running.
+        """
+        position = 0
+        lines_seen = 0
+        while True:
+            # Check before reading so the records written just before the job finished are not missed
+            still_running = self.running
+            if os.path.exists(self.results_path):
+                with open(self.results_path, encoding="utf-8") as f:
+                    f.seek(position)
+                    while True:
+                        line = f.readline()
+                        if not line.endswith("\n"):
+                            break  # Partial line still being written
+                        position = f.tell()
+                        lines_seen += 1
+                        if lines_seen > offset:
+                            yield line
+            if not (follow and still_running):
+                return
+            time.sleep(poll_interval)
+
+
+class BatchManager:
+    """
+    Creates, tracks and resumes batch jobs. Jobs are stored under INFOFACT_BATCH_DIR, and server-side
+    input files must be located under INFOFACT_BATCH_INPUT_DIR.
+    """
+
+    def __init__(self, executor, jobs_dir=None, input_dir=None):
+        self.executor = executor
+        self.jobs_dir = jobs_dir or os.environ.get("INFOFACT_BATCH_DIR", os.path.join(os.path.dirname(__file__), "batch_jobs"))
+        self.input_dir = input_dir or os.environ.get("INFOFACT_BATCH_INPUT_DIR")
+        self.default_concurrency = int(os.environ.get("INFOFACT_BATCH_CONCURRENCY", "4"))
+        self.max_concurrency = int(os.environ.get("INFOFACT_BATCH_MAX_CONCURRENCY", "16"))
+        self.jobs = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def resolve_input_path(self, path):
+        """
+        Validates a server-side input path against INFOFACT_BATCH_INPUT_DIR.
+        """
+        if not self.input_dir:
+            raise ValueError("Server-side input files are disabled. Set INFOFACT_BATCH_INPUT_DIR to enable them.")
+        input_dir = os.path.realpath(self.input_dir)
+        resolved = os.path.realpath(os.path.join(input_dir, path))
+        if os.path.commonpath([input_dir, resolved]) != input_dir or not os.path.isfile(resolved):
+            raise ValueError(f"Input file not found: {path}")
+        return resolved
+
+    def create_job(self, agent_names, concurrency=None, use_cache=True, upload=None, path=None):
+        """
+        Creates and starts a job from an uploaded JSONL file or a server-side path.
+        :param upload: A file storage object with a save(path) method.
+        :param path: A path relative to INFOFACT_BATCH_INPUT_DIR.
+        :return: The started BatchJob.
+        """
+        concurrency = min(max(int(concurrency or self.default_concurrency), 1), self.max_concurrency)
+        job_id = str(uuid.uuid4())
+        job_dir = os.path.join(self.jobs_dir, job_id)
+
+        if upload is not None:
+            os.makedirs(job_dir)
+            input_path = os.path.join(job_dir, "input.jsonl")
+            upload.save(input_path)
+        elif path:
+            input_path = self.resolve_input_path(path)
+            os.makedirs(job_dir)
+        else:
+            raise ValueError("Provide a JSONL file upload or a server-side Path.")
+
+        manifest = {
+            "job_id": job_id,
+            "input_path": input_path,
+            "agents": agent_names,
+            "concurrency": concurrency,
+            "use_cache": use_cache,
+            "status": "queued",
+            "total": None,
+            "created_at": time.time(),
+        }
+        job = BatchJob(job_dir, manifest)
+        job.save_manifest()
+        with self.lock:
+            self.jobs[job_id] = job
+        self.start(job)
+        return job
+
+    def get_job(self, job_id):
+        """
+        Returns the job with the given ID, loading it from disk if it was created by an earlier process.
+        """
+        try:
+            job_id = str(uuid.UUID(job_id))  # Also rejects anything that could escape the jobs directory
+        except ValueError:
+            return None
+
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                manifest_path = os.path.join(self.jobs_dir, job_id, "manifest.json")
+                if not os.path.exists(manifest_path):
+                    return None
+                with open(manifest_path, encoding="utf-8") as f:
+                    job = BatchJob(os.path.dirname(manifest_path), json.load(f))
+                self.jobs[job_id] = job
+            return job
+
+    def start(self, job):
+        """
+        Runs the job in a background thread.
+        """
+        job.running = True
+        threading.Thread(target=job.run, args=(self.executor,), name=f"batch-{job.job_id[:8]}", daemon=True).start()
+
+    def resume(self, job_id):
+        """
+        Restarts an interrupted job from the last completed record.
+        """
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        # Checked and claimed under the lock, so concurrent resumes start a single runner
+        with self.lock:
+            if job.running or job.manifest["status"] == "finished":
+                return job
+            job.running = True
+        self.start(job)
+        return job
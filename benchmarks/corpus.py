@@ -0,0 +1,33 @@
+import random
+
+# Paragraph counts of the article sizes; a paragraph is about 120 tokens
+SIZES = {"small": 2, "medium": 10, "large": 60}
+
+CITIES = ["Tampere", "Lyon", "Porto", "Graz", "Bergen", "Utrecht", "Brno", "Aarhus", "Gdansk", "Turku"]
+TOPICS = ["public transport", "housing", "the city budget", "school funding", "the harbour", "air quality"]
+
+def make_paragraph(rng, serial):
+    """
+    Returns a news-style paragraph with a few numeric claims, unique to the serial number.
+    """
+    city = rng.choice(CITIES)
+    topic = rng.choice(TOPICS)
+    return (
+        f"The council of {city} voted {rng.randint(20, 60)} to {rng.randint(1, 19)} on a new plan for {topic} "
+        f"in session {serial}. "
+        f"Officials said the plan will cost {rng.randint(2, 900)} million euros over {rng.randint(2, 10)} years. "
+        f"Critics argued that the proposal ignores the concerns raised by residents during the consultation. "
+        f"According to the statistics office, {rng.randint(5, 95)} percent of residents use {topic} every week. "
+        f"Mayor Jane Doe told https://news.example.com that the first results are expected in {rng.randint(2025, 2030)}."
+    )
+
+def make_article(size, serial, seed=0):
+    """
+    Returns a synthetic article of the given size. Different serial numbers give different claims,
+    so repeated requests do not just measure the caches.
+    :param size: "small", "medium" or "large".
+    :param serial: A number making the article unique.
+    :param seed: Seed of the random generator.
+    """
+    rng = random.Random(f"{seed}:{size}:{serial}")
+    return "\n\n".join(make_paragraph(rng, f"{serial}.{i}") for i in range(SIZES[size]))
@@ -0,0 +1,224 @@
+"""
+Offline benchmark of the /infofactagents endpoint.
+
+Starts local stand-ins for the OpenAI and Google Fact Check APIs, launches the backend against them
+and drives it at several concurrency levels with small, medium and large articles. Reports
+throughput, p50/p95/p99 latency and the server's peak memory. Run from the repository root:
+
+    python -m benchmarks.run --server asgi --concurrency 1,8,32 --requests 40
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.corpus import SIZES, make_article
+from benchmarks.stubs import Latency, OpenAIStubHandler, FactCheckStubHandler, start_stub
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENTS = "factual_consistency_agent,sentiment_analysis_agent,metadata_agent"
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def rss_megabytes(pid):
+    """
+    Returns the resident memory of a process in MB, or None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """
+    Samples the resident memory of the server process in the background and keeps the peak.
+    """
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = rss_megabytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def start_backend(server, port, env):
+    """
+    Launches the backend in a subprocess and waits until its health check answers.
+    :param server: "flask" for the threaded Flask server or "asgi" for uvicorn.
+    """
+    if server == "flask":
+        command = [sys.executable, "-m", "flask", "--app", "backend", "run", "--port", str(port), "--with-threads"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/infofactagents/health", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Backend did not start within 30 seconds")
+
+
+class Driver:
+    """
+    Sends analysis requests with one keep-alive session per worker thread.
+    """
+
+    def __init__(self, url, agents):
+        self.url = url
+        self.agents = agents
+        self.local = threading.local()
+        self.serial = 0
+        self.lock = threading.Lock()
+
+    def next_serial(self):
+        with self.lock:
+            self.serial += 1
+            return self.serial
+
+    def send(self, size):
+        """
+        Analyzes one fresh article and returns (seconds, ok).
+        """
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        article = make_article(size, self.next_serial())
+        started = time.perf_counter()
+        try:
+            response = session.post(self.url, data={"Body": article, "Agents": self.agents, "BypassCache": "1"}, timeout=300)
+            body = response.json()
+            ok = response.status_code == 200 and "Error" not in body and all(
+                agent["status"] == "ok" for agent in body.get("Agents", [])
+            )
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+
+def run_level(driver, size, concurrency, count, pid, stubs):
+    """
+    Sends `count` requests of one article size with `concurrency` requests in flight.
+    :return: A dictionary of the measured results.
+    """
+    llm_before, factcheck_before = stubs[0].requests, stubs[1].requests
+    with MemorySampler(pid) as memory, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        outcomes = list(pool.map(lambda _: driver.send(size), range(count)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [seconds for seconds, _ in outcomes]
+    return {
+        "size": size,
+        "concurrency": concurrency,
+        "requests": count,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "throughput": round(count / elapsed, 2),
+        "p50": round(percentile(latencies, 0.50), 3),
+        "p95": round(percentile(latencies, 0.95), 3),
+        "p99": round(percentile(latencies, 0.99), 3),
+        "peak_rss_mb": round(memory.peak, 1) if memory.peak else None,
+        "llm_calls": stubs[0].requests - llm_before,
+        "factcheck_calls": stubs[1].requests - factcheck_before,
+    }
+
+def print_table(rows):
+    """
+    Prints the results as an aligned text table.
+    """
+    columns = ["size", "concurrency", "requests", "errors", "throughput", "p50", "p95", "p99", "peak_rss_mb", "llm_calls", "factcheck_calls"]
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.rjust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the InfoFactAgents backend.")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="asgi")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--sizes", default="small,medium,large", help=f"Comma-separated article sizes: {', '.join(SIZES)}")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per size and concurrency level")
+    parser.add_argument("--agents", default=AGENTS)
+    parser.add_argument("--llm-latency", default="lognormal:0.6,0.3", help="fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--factcheck-latency", default="lognormal:0.15,0.3")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    stubs = (
+        start_stub(OpenAIStubHandler, Latency(args.llm_latency)),
+        start_stub(FactCheckStubHandler, Latency(args.factcheck_latency)),
+    )
+    state_dir = tempfile.mkdtemp(prefix="infofact-bench-")
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="stub",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{stubs[0].server_port}/v1",
+        GOOGLE_API_KEY="stub",
+        INFOFACT_FACTCHECK_ENDPOINT=f"http://127.0.0.1:{stubs[1].server_port}/",
+        INFOFACT_VERDICT_DB=os.path.join(state_dir, "claim_verdicts.db"),
+        INFOFACT_EVIDENCE_INDEX=os.path.join(state_dir, "evidence_index"),
+        INFOFACT_BATCH_DIR=os.path.join(state_dir, "batch_jobs"),
+        INFOFACT_LLM_LIMITS="gpt-4o=0:0,gpt-3.5-turbo=0:0",  # The stubs do not rate-limit
+        PYTHONUNBUFFERED="1",
+    )
+
+    backend = start_backend(args.server, args.port, env)
+    try:
+        driver = Driver(f"http://127.0.0.1:{args.port}/infofactagents", args.agents)
+        driver.send("small")  # Warm up: agents are instantiated on first use
+
+        rows = []
+        for size in args.sizes.split(","):
+            for concurrency in (int(level) for level in args.concurrency.split(",")):
+                rows.append(run_level(driver, size, concurrency, args.requests, backend.pid, stubs))
+                print(f"{size} x {concurrency}: {rows[-1]['throughput']} req/s, p95 {rows[-1]['p95']} s", file=sys.stderr)
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"server": args.server, "llm_latency": args.llm_latency,
+                       "factcheck_latency": args.factcheck_latency, "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Sentences with a digit are treated as factual claims by the stub extractor
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+class Latency:
+    """
+    A latency distribution parsed from a spec such as "fixed:0.5", "uniform:0.2,0.8" or
+    "lognormal:0.6,0.4" (median and sigma), in seconds.
+    """
+
+    def __init__(self, spec):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        """
+        Returns a random delay in seconds.
+        """
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return random.uniform(*self.params)
+        median, sigma = self.params
+        return random.lognormvariate(0, sigma) * median
+
+
+def is_false(text):
+    """
+    Deterministically marks about a quarter of the claims as false.
+    """
+    return zlib.crc32(text.encode("utf-8")) % 4 == 0
+
+def canned_reply(messages):
+    """
+    Returns a plausible reply for each of the agents' prompts.
+    """
+    system_prompt = messages[0]["content"]
+    user_prompt = messages[-1]["content"]
+    if "sentiment" in system_prompt:
+        return json.dumps({
+            "tone": "Neutral", "bias_score": 25, "highlights": ["Mostly factual reporting", "Few loaded words"],
+            "impact": "Readers are unlikely to be swayed.",
+        })
+    if "credibility" in system_prompt:
+        entities = json.loads(user_prompt.split("\n\n", 1)[1])["entities"]
+        verdicts = [
+            {"id": entity["id"], "reliability": "Medium", "bias": "Neutral", "trustworthiness": "No known issues"}
+            for entity in entities
+        ]
+        return json.dumps({"verdicts": verdicts})
+    if "extracting" in system_prompt:
+        article = user_prompt.split(":\n\n", 1)[-1]
+        return "\n".join(sentence.strip() for sentence in SENTENCE_BREAK.split(article) if re.search(r"\d", sentence))
+    if "evaluating" in system_prompt:
+        claims = json.loads(user_prompt.split("\n\n", 1)[1])["claims"]
+        verdicts = [{"id": claim["id"], "verdict": "False" if is_false(claim["claim"]) else "True"} for claim in claims]
+        return json.dumps({"verdicts": verdicts})
+    return "OK"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Base handler that delays every response by the server's latency distribution.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        time.sleep(self.server.latency.sample())
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.requests += 1
+
+
+class OpenAIStubHandler(StubHandler):
+    """
+    Answers POST /v1/chat/completions like the OpenAI API, with canned replies.
+    """
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+            return
+
+        reply = canned_reply(request["messages"])
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        completion_tokens = len(reply) // 4
+        self.send_json({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class FactCheckStubHandler(StubHandler):
+    """
+    Answers GET /v1alpha1/claims:search like the Google Fact Check Tools API. About half of the
+    queries find a fact check rating the claim false.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith("/claims:search"):
+            self.send_json({"error": {"message": f"Unknown path {url.path}"}}, 404)
+            return
+
+        query = parse_qs(url.query).get("query", [""])[0]
+        if zlib.crc32(query.encode("utf-8")) % 2:
+            self.send_json({})
+            return
+        self.send_json({"claims": [{
+            "text": query,
+            "claimant": "Stub claimant",
+            "claimReview": [{
+                "publisher": {"name": "Stub Fact Checker"},
+                "title": f"Fact check: {query[:60]}",
+                "url": "https://factcheck.example.com/review",
+                "textualRating": "False",
+            }],
+        }]})
+
+
+def start_stub(handler, latency, port=0):
+    """
+    Starts a stub server in a background thread.
+    :param handler: The request handler class.
+    :param latency: A Latency distribution applied to every response.
+    :param port: The port to listen on, 0 for any free port.
+    :return: The server; its URL is http://127.0.0.1:<server.server_port>.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+    return server
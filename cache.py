@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from metrics import record_cache_lookup
+from agent_report import AgentReport, as_report
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache where every entry expires after a time-to-live.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for the key, or the default if it is missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.time():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores the value, evicting the least recently used entries when the cache is full.
+        :param ttl: Optional time-to-live in seconds overriding the cache default.
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the current number of entries.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+def normalize_text(text):
+    """
+    Normalizes article text so that whitespace-only differences map to the same cache key.
+    """
+    return " ".join(text.split())
+
+
+# Punctuation is ignored when comparing claims, so "The Earth is flat." and "the earth is flat" match
+CLAIM_PUNCTUATION = re.compile(r"[^\w\s]")
+
+def normalize_claim(claim):
+    """
+    Returns the comparison key of a claim: casefolded, without punctuation and with collapsed whitespace.
+    """
+    return " ".join(CLAIM_PUNCTUATION.sub(" ", claim).split()).casefold()
+
+
+def content_hash(text):
+    """
+    Returns the SHA-256 hex digest of the normalized text.
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def result_key(agent_name, agent_instance, article_text, digest=None):
+    """
+    Identifies an agent's result for an article: the agent name, its model and prompt version and
+    the hash of the normalized text. Used by the result cache and to coalesce identical runs.
+    :param digest: The content_hash of the text when it is already known.
+    """
+    model = getattr(agent_instance, "OPENAI_MODEL", "gpt-3.5-turbo")
+    prompt_version = getattr(agent_instance, "PROMPT_VERSION", "1")
+    return f"{agent_name}:{model}:{prompt_version}:{digest or content_hash(article_text)}"
+
+
+class ResultCache:
+    """
+    Content-addressed cache for agent results with an in-memory LRU tier and an optional
+    SQLite tier that survives restarts. Configured through environment variables:
+    INFOFACT_CACHE_SIZE, INFOFACT_CACHE_TTL and INFOFACT_CACHE_DB.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, db_path=None):
+        if max_entries is None:
+            max_entries = int(os.environ.get("INFOFACT_CACHE_SIZE", "1024"))
+        if ttl is None:
+            ttl = float(os.environ.get("INFOFACT_CACHE_TTL", "86400"))
+        if db_path is None:
+            db_path = os.environ.get("INFOFACT_CACHE_DB")
+
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.lock = threading.Lock()
+        self.disk_hits = 0
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.db.commit()
+
+    def make_key(self, agent_name, agent_instance, article_text, digest=None):
+        """
+        Builds the cache key from the normalized article text, the agent name, its model and prompt version.
+        :param digest: The content_hash of the text when it is already known, e.g. from the ArticleContext.
+        """
+        return result_key(agent_name, agent_instance, article_text, digest)
+
+    def get(self, key):
+        """
+        Returns the cached result for the key, or None on a miss.
+        """
+        value = self.memory.get(key)
+        if value is not None or self.db is None:
+            return value
+
+        with self.lock:
+            row = self.db.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            # Entries written before results carried their findings are not reports, and are misses
+            value = AgentReport.from_json(value)
+            if value is None or expires_at <= time.time():
+                self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+            self.disk_hits += 1
+
+        # Promote the entry back into memory for the time it has left
+        self.memory.set(key, value, ttl=expires_at - time.time())
+        return value
+
+    def set(self, key, value):
+        """
+        Stores a result in both tiers. The SQLite tier keeps the findings of the report next to its text.
+        """
+        self.memory.set(key, value)
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, as_report(value).to_json(), time.time() + self.ttl),
+            )
+            self.db.commit()
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of the cache.
+        """
+        stats = self.memory.stats()
+        # Memory misses that were answered from disk are hits overall
+        stats["disk_hits"] = self.disk_hits
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        return stats
+
+
+class ClaimVerdictStore:
+    """
+    Persistent store of claim verdicts shared across articles, so a claim republished by many outlets
+    is judged by the LLM only once. Entries are keyed by the normalized claim and the model version
+    that produced them, so changing the model or prompt invalidates them. Configured through
+    INFOFACT_VERDICT_DB, INFOFACT_VERDICT_TTL and INFOFACT_VERDICT_CACHE_SIZE.
+    """
+
+    def __init__(self, model_version, db_path=None, ttl=None, max_entries=None):
+        if db_path is None:
+            db_path = os.environ.get("INFOFACT_VERDICT_DB", os.path.join(os.path.dirname(__file__), "claim_verdicts.db"))
+        if ttl is None:
+            ttl = float(os.environ.get("INFOFACT_VERDICT_TTL", str(7 * 86400)))
+        if max_entries is None:
+            max_entries = int(os.environ.get("INFOFACT_VERDICT_CACHE_SIZE", "10000"))
+
+        self.model_version = model_version
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (claim_key TEXT NOT NULL, model_version TEXT NOT NULL, "
+            "verdict TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (claim_key, model_version))"
+        )
+        # Verdicts of other model versions and expired ones are never read again
+        self.db.execute(
+            "DELETE FROM verdicts WHERE model_version != ? OR expires_at <= ?", (model_version, time.time())
+        )
+        self.db.commit()
+
+    def get_many(self, claims):
+        """
+        Looks up the verdicts of several claims.
+        :param claims: The claims to look up.
+        :return: A dictionary with the claims that have a stored verdict as keys and the verdicts as values.
+        """
+        verdicts = {}
+        missing = {}
+        for claim in claims:
+            key = normalize_claim(claim)
+            verdict = self.memory.get(key)
+            if verdict is not None:
+                verdicts[claim] = verdict
+            elif key:
+                missing.setdefault(key, []).append(claim)
+
+        if missing:
+            now = time.time()
+            keys = list(missing)
+            rows = []
+            with self.lock:
+                # Stay well below SQLite's limit on query parameters
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    rows += self.db.execute(
+                        f"SELECT claim_key, verdict, expires_at FROM verdicts WHERE model_version = ? "
+                        f"AND expires_at > ? AND claim_key IN ({', '.join('?' * len(batch))})",
+                        [self.model_version, now, *batch],
+                    ).fetchall()
+            for key, verdict, expires_at in rows:
+                # Promote the entry back into memory for the time it has left
+                self.memory.set(key, verdict, ttl=expires_at - now)
+                for claim in missing[key]:
+                    verdicts[claim] = verdict
+
+        with self.lock:
+            self.hits += len(verdicts)
+            self.misses += len(claims) - len(verdicts)
+        record_cache_lookup("verdict", len(verdicts), len(claims) - len(verdicts))
+        return verdicts
+
+    def set_many(self, verdicts):
+        """
+        Stores the verdicts of several claims.
+        :param verdicts: A dictionary with claims as keys and their verdicts as values.
+        """
+        expires_at = time.time() + self.ttl
+        rows = []
+        for claim, verdict in verdicts.items():
+            key = normalize_claim(claim)
+            if key:
+                self.memory.set(key, verdict)
+                rows.append((key, self.model_version, verdict, expires_at))
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO verdicts (claim_key, model_version, verdict, expires_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self.db.commit()
+
+    def stats(self):
+        """
+        Returns the hit and miss counters, the hit rate and the number of stored verdicts.
+        """
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM verdicts WHERE model_version = ?", (self.model_version,)).fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": entries,
+            }
@@ -0,0 +1,138 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from context import count_tokens
+
+class ClaimRequest:
+    """
+    The claims one article submitted to the batcher, and the future receiving their verdicts.
+    """
+
+    def __init__(self, claims):
+        self.future = Future()
+        self.remaining = set(claims)
+        self.verdicts = {}
+        self.lock = threading.Lock()  # Claims of one article may be resolved by several packed requests
+
+    def resolve(self, claim, verdict):
+        """
+        Records the verdict of one claim and completes the future when all claims are resolved.
+        """
+        with self.lock:
+            if verdict is not None:
+                self.verdicts[claim] = verdict
+            self.remaining.discard(claim)
+            if not self.remaining and not self.future.done():
+                self.future.set_result(self.verdicts)
+
+
+class ClaimBatcher:
+    """
+    Packs the claims of several concurrently processed articles into shared evaluation requests,
+    so bulk runs need far fewer LLM round trips. A request is sent once its claims reach the token
+    budget (INFOFACT_CLAIM_BATCH_TOKENS), or when the oldest waiting claim has waited max_wait
+    seconds (INFOFACT_CLAIM_BATCH_WAIT). Verdicts are routed back to each submitting article.
+    """
+
+    def __init__(self, evaluate, pool, model="gpt-4o", max_tokens=None, max_wait=None):
+        """
+        :param evaluate: A function taking a list of claims and returning a dictionary of verdicts.
+        :param pool: The executor the packed evaluation requests run on.
+        :param model: The model whose tokenizer measures the claims.
+        """
+        if max_tokens is None:
+            max_tokens = int(os.environ.get("INFOFACT_CLAIM_BATCH_TOKENS", "2000"))
+        if max_wait is None:
+            max_wait = float(os.environ.get("INFOFACT_CLAIM_BATCH_WAIT", "0.5"))
+
+        self.evaluate = evaluate
+        self.pool = pool
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self.pending = deque()  # (claim, tokens, request, submitted_at) in submission order
+        self.pending_tokens = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.requests_sent = 0
+        self.claims_sent = 0
+
+    def submit(self, claims):
+        """
+        Queues the claims of one article for evaluation.
+        :param claims: The claims to evaluate.
+        :return: A Future resolving to a dictionary with the claims as keys and their verdicts as values.
+        """
+        request = ClaimRequest(claims)
+        if not claims:
+            request.future.set_result({})
+            return request.future
+
+        now = time.time()
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.flush_loop, name="claim-batcher", daemon=True)
+                self.thread.start()
+            for claim in dict.fromkeys(claims):
+                tokens = count_tokens(claim, self.model)
+                self.pending.append((claim, tokens, request, now))
+                self.pending_tokens += tokens
+            self.condition.notify()
+        return request.future
+
+    def flush_loop(self):
+        """
+        Sends a packed request whenever the token budget is reached or the oldest claim has waited long enough.
+        """
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                deadline = self.pending[0][3] + self.max_wait
+                while self.pending_tokens < self.max_tokens and time.time() < deadline:
+                    self.condition.wait(deadline - time.time())
+                batch = self.take_batch()
+            self.pool.submit(self.send_batch, batch)
+
+    def take_batch(self):
+        """
+        Removes claims from the queue up to the token budget. Must be called with the lock held.
+        :return: A list of (claim, request) tuples.
+        """
+        batch = []
+        tokens = 0
+        while self.pending and (not batch or tokens + self.pending[0][1] <= self.max_tokens):
+            claim, claim_tokens, request, _ = self.pending.popleft()
+            batch.append((claim, request))
+            tokens += claim_tokens
+            self.pending_tokens -= claim_tokens
+        return batch
+
+    def send_batch(self, batch):
+        """
+        Evaluates a packed batch with one request and routes the verdicts back to the articles.
+        """
+        claims = list(dict.fromkeys(claim for claim, _ in batch))  # Articles often share claims
+        try:
+            verdicts = self.evaluate(claims)
+        except Exception as e:
+            for _, request in batch:
+                with request.lock:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            return
+
+        with self.condition:
+            self.requests_sent += 1
+            self.claims_sent += len(claims)
+        for claim, request in batch:
+            request.resolve(claim, verdicts.get(claim))
+
+    def stats(self):
+        """
+        Returns the number of packed requests sent and the claims they contained.
+        """
+        with self.condition:
+            return {"requests": self.requests_sent, "claims": self.claims_sent, "pending": len(self.pending)}
@@ -0,0 +1,189 @@
+import re
+import time
+import threading
+from functools import lru_cache
+from cache import normalize_text, content_hash
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate of four characters per token
+    tiktoken = None
+
+# Paragraphs are separated by blank lines, sentences end in ., ! or ? followed by whitespace
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+# URLs, and potential names of persons using a simple heuristic (capitalized words)
+URL_PATTERN = re.compile(r"https?://[^\s]+")
+PERSON_PATTERN = re.compile(r"\b[A-Z][a-z]+ [A-Z][a-z]+\b")
+
+@lru_cache(maxsize=None)
+def token_encoding(model):
+    """
+    Returns the tiktoken encoding for a model, or None if tiktoken or the encoding is unavailable.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+def count_tokens(text, model="gpt-4o"):
+    """
+    Counts the tokens of a text for the given model, estimating len/4 when tiktoken is not installed.
+    """
+    encoding = token_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class ArticleContext:
+    """
+    Pre-processed view of one article, built once per request before the agents are dispatched
+    and shared read-only by all of them through RunContext.article. The content hash doubles as
+    the article's key for caches, and the token count lets agents size their prompts up front.
+    """
+    __slots__ = ("text", "normalized_text", "content_hash", "token_count", "paragraphs", "paragraph_hashes", "sentences",
+                 "urls", "persons")
+
+    def __init__(self, text, model="gpt-4o"):
+        """
+        :param text: The article text as the agents receive it.
+        :param model: The model whose tokenizer is used for the token count.
+        """
+        paragraphs = tuple(paragraph.strip() for paragraph in PARAGRAPH_BREAK.split(text.strip()) if paragraph.strip())
+        values = {
+            "text": text,
+            "normalized_text": normalize_text(text),
+            "content_hash": content_hash(text),
+            "token_count": count_tokens(text, model),
+            "paragraphs": paragraphs,
+            # Short content hashes identifying each paragraph, to diff edited versions of an article
+            "paragraph_hashes": tuple(content_hash(paragraph)[:16] for paragraph in paragraphs),
+            "sentences": tuple(
+                sentence for paragraph in paragraphs for sentence in SENTENCE_BREAK.split(paragraph) if sentence
+            ),
+            # Distinct, in order of appearance
+            "urls": tuple(dict.fromkeys(URL_PATTERN.findall(text))),
+            "persons": tuple(dict.fromkeys(PERSON_PATTERN.findall(text))),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ArticleContext is immutable")
+
+    def __repr__(self):
+        return f"ArticleContext(hash={self.content_hash[:12]}, tokens={self.token_count}, sentences={len(self.sentences)})"
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a request's deadline passes before an outbound call could be made or completed.
+    """
+
+
+class Deadline:
+    """
+    The point in time by which a request must be answered, created when the request arrives and
+    shared by every agent and outbound call made for it through RunContext.deadline.
+    """
+
+    def __init__(self, seconds):
+        """
+        :param seconds: The budget of the whole request, in seconds from now.
+        """
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """
+        Returns the seconds left until the deadline, 0 once it has passed.
+        """
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, default=None):
+        """
+        Returns the timeout of an outbound call: its own default, capped by the time left.
+        """
+        remaining = self.remaining()
+        return remaining if default is None else min(default, remaining)
+
+    def check(self, what="the call"):
+        """
+        Raises DeadlineExceeded if the deadline has passed.
+        :param what: What could not be done anymore, for the error message.
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g} seconds passed before {what}")
+
+    def __repr__(self):
+        return f"Deadline(seconds={self.seconds:g}, remaining={self.remaining():.3f})"
+
+
+class RunContext:
+    """
+    Per-call state for one agent run on one article. Agents that accept a `context` argument keep
+    everything request-specific here instead of on the shared agent instance, so a single instance
+    can serve many concurrent analyses.
+    """
+
+    def __init__(self, on_progress=None, batch=False, article=None, deadline=None, unchanged_paragraphs=frozenset()):
+        self.output_log = []  # Accumulated output lines for this run
+        self.on_progress = on_progress  # Optional callback receiving each step as it is logged
+        self.batch = batch  # Bulk run: agents may trade latency for fewer, larger LLM requests
+        self.article = article  # ArticleContext shared by all agents analyzing the same article
+        self.deadline = deadline  # Optional Deadline of the request, bounding every outbound call
+        # Hashes of the paragraphs that were already in the session's previous input, whose earlier
+        # analysis agents may reuse
+        self.unchanged_paragraphs = unchanged_paragraphs
+        self.calls = []  # Timed outbound calls, see record_call
+        self.calls_lock = threading.Lock()  # Agents may make calls for one run from several threads
+        self.seconds = None  # Wall time of the whole agent run, set by the executor
+        self.cached = False  # Whether the result came from the result cache
+        self.partial = False  # Whether the agent returned a partial result because the deadline passed
+        self.timed_out = False  # Whether the agent missed the deadline, set by the executor
+        self.coalesced = False  # Whether the run shared the result of an identical run already in flight
+
+    def log(self, message):
+        """
+        Accumulates a message in this run's output log and reports it as progress.
+        :param message: The message to log.
+        """
+        self.output_log.append(message)
+        if self.on_progress:
+            self.on_progress(message)
+
+    def output(self):
+        """
+        Returns the accumulated log as a single text block.
+        """
+        return "\n".join(self.output_log)
+
+    def record_call(self, name, seconds, **details):
+        """
+        Records an outbound call (LLM or external API) made for this run.
+        :param name: What was called, e.g. "llm:extract_claims".
+        :param seconds: The wall time of the call.
+        :param details: Extra fields such as the model and token counts.
+        """
+        with self.calls_lock:
+            self.calls.append({"name": name, "seconds": round(seconds, 4), **details})
+
+    def timings(self):
+        """
+        Returns the timing breakdown of this run for the Timings response field.
+        """
+        with self.calls_lock:
+            calls = list(self.calls)
+        timings = {"seconds": round(self.seconds or 0, 4), "cached": self.cached, "calls": calls}
+        if self.coalesced:
+            timings["coalesced"] = True
+        if self.timed_out:
+            timings["timed_out"] = True
+            timings["partial"] = self.partial
+        return timings
@@ -0,0 +1,371 @@
+import os
+import re
+import json
+import zlib
+import threading
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Lower-cased words and numbers, with contractions such as "don't" kept whole
+TERM_PATTERN = re.compile(r"\w+(?:'\w+)?")
+# Function words that make unrelated claims look alike ("The Earth is ..." / "The Eiffel Tower is ...")
+STOPWORDS = frozenset(
+    "a an the is are was were be been being am of in on at to for by with from into onto about as "
+    "through via and or but if then than so that this these those it its there their they them he she his her "
+    "we our you your i me my which who whom whose what when where why how all any some such also "
+    "very just only up out over has have had having do does did will would shall should can could "
+    "may might must said says say".split()
+)
+# Words that reverse a claim; they are kept and folded into "not" so "never" and "no" match "not"
+NEGATIONS = frozenset("not no never nor none nobody nothing neither without cannot".split())
+# Vector file of the current term extraction; an index written by an older one is re-vectorized
+VECTORS_FILE = "vectors-v2.npy"
+# Rows reserved when the vector file is created; it doubles whenever it is full
+INITIAL_CAPACITY = 1024
+# Rows scored at a time, bounding the temporary arrays of a search over a large corpus
+SEARCH_BLOCK_ROWS = 8192
+
+def stem(word):
+    """
+    Strips common English suffixes so "hides", "hiding" and "hide" give the same term.
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix) and not word.endswith("ss"):
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 3 and word.endswith("e") else word
+
+def claim_terms(text):
+    """
+    Returns the content words of a claim, stemmed, without stopwords and with every negation as "not".
+    Word pairs were tried too, but they lowered the similarity of paraphrases more than that of
+    unrelated claims.
+    """
+    terms = []
+    for word in TERM_PATTERN.findall(text.casefold().replace("\u2019", "'")):
+        if word.endswith("n't"):
+            terms.append("not")
+            word = word[:-3]
+        elif "'" in word:
+            word = word.split("'")[0]
+        if word in NEGATIONS:
+            terms.append("not")
+        elif word and word not in STOPWORDS:
+            terms.append(stem(word))
+    return terms
+
+def confirms(claim, text):
+    """
+    Checks that a stored claim found by similarity says the same thing as the claim looked up:
+    both are negated or neither is, and they mention the same numbers.
+    :param claim: The claim looked up.
+    :param text: The claim of a stored review.
+    :return: True if the stored review can stand in for a review of the claim.
+    """
+    looked_up, stored = set(claim_terms(claim)), set(claim_terms(text))
+    if ("not" in looked_up) != ("not" in stored):
+        return False
+    return {term for term in looked_up if any(c.isdigit() for c in term)} == \
+        {term for term in stored if any(c.isdigit() for c in term)}
+
+def review_key(record):
+    """
+    Identifies a stored review: the normalized claim text and the review URL.
+    """
+    return " ".join(record.get("text", "").split()).casefold(), record.get("url", "")
+
+
+class EvidenceIndex:
+    """
+    Local corpus of the claim reviews returned by the Fact Check API, searchable by similarity, so
+    a paraphrase of a claim checked before finds its evidence in milliseconds without a remote call.
+
+    Each review's claim text is vectorized into hashed term frequencies (log-scaled word counts
+    in `dimensions` buckets) and weighted by inverse document frequency at query time, so
+    the weights follow the corpus as it grows. Similarity is the cosine of the TF-IDF vectors.
+
+    Only near-duplicates are meant to match: stopwords are ignored, so claims sharing only
+    function words score low, and a match must agree on negation and numbers (see `confirms`).
+
+    On disk the index is a directory holding records.jsonl, one review per line, and vectors-v2.npy,
+    whose rows are memory-mapped so a large corpus is not read into memory at startup. A vector
+    is written before its record, and only rows with a record are loaded. Several worker processes
+    may share a directory: appends hold a file lock (fcntl), and each process reads the reviews
+    the others appended before its next append or search.
+    """
+
+    def __init__(self, path, dimensions=None):
+        """
+        :param path: The index directory, created if missing, or ":memory:" for an index that is not persisted.
+        :param dimensions: Hash buckets per vector, default INFOFACT_EVIDENCE_INDEX_DIMENSIONS or 1024.
+            Changing it requires a new directory.
+        """
+        self.path = None if path == ":memory:" else path
+        self.dimensions = int(dimensions or os.environ.get("INFOFACT_EVIDENCE_INDEX_DIMENSIONS", "1024"))
+        self.lock = threading.Lock()
+        self.records = []
+        self.keys = set()
+        self.count = 0
+        self.records_end = 0  # Offset in records.jsonl after the last record read
+        self.hits = 0
+        self.misses = 0
+        # Number of reviews containing each bucket, for the IDF weights
+        self.document_frequency = np.zeros(self.dimensions, dtype=np.float32)
+
+        if self.path is None:
+            self.vectors = np.zeros((INITIAL_CAPACITY, self.dimensions), dtype=np.float32)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            with self.lock, self.file_lock():
+                self.load()
+
+    def records_path(self):
+        """
+        The file holding one JSON record per stored review.
+        """
+        return os.path.join(self.path, "records.jsonl")
+
+    def vectors_path(self):
+        """
+        The .npy file holding one vector row per stored review, plus unused capacity.
+        """
+        return os.path.join(self.path, VECTORS_FILE)
+
+    @contextmanager
+    def file_lock(self):
+        """
+        Holds an exclusive lock on the index directory, shared by every process using it, so worker
+        processes append reviews and grow the vector file one at a time. Without fcntl (Windows)
+        only the threads of one process are serialized, see the README.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, "index.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_records(self):
+        """
+        Reads the complete records appended to records.jsonl since the last read.
+        :return: The records and the offset after each of them.
+        """
+        records, ends = [], []
+        if not os.path.exists(self.records_path()):
+            return records, ends
+        with open(self.records_path(), "rb") as f:
+            f.seek(self.records_end)
+            end = self.records_end
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                end += len(line)
+                records.append(record)
+                ends.append(end)
+        return records, ends
+
+    def load(self):
+        """
+        Reads the records and memory-maps the vector file, creating both when missing. A record
+        cut short by a crash, and any record without a vector, is dropped from the file. Without a
+        vector file, the vectors of the records are computed again. Called with the file lock held.
+        """
+        records, ends = self.read_records()
+        if os.path.exists(self.vectors_path()):
+            self.vectors = np.load(self.vectors_path(), mmap_mode="r+")
+            if self.vectors.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"Evidence index {self.path} has {self.vectors.shape[1]} dimensions, not {self.dimensions}"
+                )
+        else:
+            capacity = INITIAL_CAPACITY
+            while capacity < len(records):
+                capacity *= 2
+            self.vectors = np.lib.format.open_memmap(
+                self.vectors_path(), mode="w+", dtype=np.float32, shape=(capacity, self.dimensions)
+            )
+            # Records kept by an older version, or whose vector file was lost, are vectorized again
+            for row, record in enumerate(records):
+                self.vectors[row] = self.vectorize(record.get("text", ""))
+            self.vectors.flush()
+
+        del records[self.vectors.shape[0]:]
+        self.accept(records, ends)
+        self.truncate_torn_records()
+
+    def truncate_torn_records(self):
+        """
+        Drops what follows the last complete record: with the file lock held no other process is
+        writing, so it was left by a writer that crashed.
+        """
+        if os.path.exists(self.records_path()) and os.path.getsize(self.records_path()) != self.records_end:
+            with open(self.records_path(), "r+b") as f:
+                f.truncate(self.records_end)
+
+    def accept(self, records, ends):
+        """
+        Takes records read from the file, whose vectors are already in the vector file, into the index.
+        """
+        if not records:
+            return
+        rows = self.vectors[self.count:self.count + len(records)]
+        self.document_frequency += np.count_nonzero(rows, axis=0)
+        self.records.extend(records)
+        self.keys.update(review_key(record) for record in records)
+        self.count += len(records)
+        self.records_end = ends[len(records) - 1]
+
+    def sync(self):
+        """
+        Takes in the reviews other processes appended to the directory, remapping the vector file as
+        they may have grown it. Called with both locks held, and without fcntl only for this process.
+        """
+        records, ends = self.read_records()
+        if records:
+            self.vectors = np.load(self.vectors_path(), mmap_mode="r+")
+            self.accept(records[:self.vectors.shape[0] - self.count], ends)
+        self.truncate_torn_records()
+
+    def changed_on_disk(self):
+        """
+        Returns True if another process appended reviews since the last read.
+        """
+        try:
+            return os.path.getsize(self.records_path()) != self.records_end
+        except OSError:
+            return False
+
+    def vectorize(self, text):
+        """
+        Returns the log-scaled hashed term frequencies of a text.
+        """
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        buckets = [zlib.crc32(term.encode("utf-8")) % self.dimensions for term in claim_terms(text)]
+        if buckets:
+            counts = np.bincount(buckets, minlength=self.dimensions).astype(np.float32)
+            vector = np.log1p(counts, out=vector)
+        return vector
+
+    def grow(self):
+        """
+        Doubles the capacity of the vector file. Searches in progress keep reading the old mapping.
+        """
+        capacity = self.vectors.shape[0] * 2
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            vectors[:self.count] = self.vectors[:self.count]
+        else:
+            temporary = self.vectors_path() + ".tmp"
+            vectors = np.lib.format.open_memmap(temporary, mode="w+", dtype=np.float32, shape=(capacity, self.dimensions))
+            vectors[:self.count] = self.vectors[:self.count]
+            vectors.flush()
+            del vectors
+            os.replace(temporary, self.vectors_path())
+            vectors = np.load(self.vectors_path(), mmap_mode="r+")
+        self.vectors = vectors
+
+    def add(self, records):
+        """
+        Stores claim reviews that are not in the index yet. Reviews other processes added meanwhile
+        are read first, so the rows of the vector file stay aligned with the lines of records.jsonl.
+        :param records: Dictionaries with the text of the reviewed claim ("text") and the review's
+            "claimant", "publisher", "title", "url" and "rating".
+        :return: The number of reviews added.
+        """
+        with self.lock, (self.file_lock() if self.path is not None else nullcontext()):
+            if self.path is not None:
+                self.sync()
+            added = []
+            for record in records:
+                key = review_key(record)
+                if not key[0] or key in self.keys:
+                    continue
+                if self.count == self.vectors.shape[0]:
+                    self.grow()
+                vector = self.vectorize(record["text"])
+                self.vectors[self.count] = vector
+                self.document_frequency += vector > 0
+                self.records.append(record)
+                self.keys.add(key)
+                self.count += 1
+                added.append(record)
+
+            if added and self.path is not None:
+                self.vectors.flush()
+                lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in added).encode("utf-8")
+                with open(self.records_path(), "ab") as f:
+                    f.write(lines)
+                self.records_end += len(lines)
+            return len(added)
+
+    def search(self, claim, threshold, limit=5):
+        """
+        Finds the stored reviews of near-duplicates of a claim: the most similar claims that pass `confirms`.
+        :param claim: The claim to look up.
+        :param threshold: The lowest cosine similarity (0..1) accepted as a match.
+        :param limit: The largest number of reviews returned.
+        :return: A list of (similarity, record) tuples, most similar first; empty if none reaches the threshold.
+        """
+        if self.path is not None and self.changed_on_disk():
+            with self.lock, self.file_lock():
+                self.sync()
+        with self.lock:
+            count = self.count
+            vectors = self.vectors
+            records = self.records[:count]
+            document_frequency = self.document_frequency.copy()
+
+        query = self.vectorize(claim)
+        if not count or not query.any():
+            self.record_lookup(False)
+            return []
+
+        idf = np.log((1 + count) / (1 + document_frequency)) + 1
+        weights = idf * idf
+        weighted_query = query * weights
+        query_norm = np.sqrt(np.dot(query * query, weights))
+        # Cosine of the IDF-weighted vectors: (d * idf) . (q * idf) / (|d * idf| |q * idf|)
+        scores = np.zeros(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            rows = vectors[start:start + SEARCH_BLOCK_ROWS if start + SEARCH_BLOCK_ROWS < count else count]
+            norms = np.sqrt((rows * rows) @ weights) * query_norm
+            np.divide(rows @ weighted_query, norms, out=scores[start:start + len(rows)], where=norms > 0)
+
+        best = np.argsort(-scores)[:limit]
+        matches = [
+            (float(scores[i]), records[i]) for i in best
+            if scores[i] >= threshold and confirms(claim, records[i].get("text", ""))
+        ]
+        self.record_lookup(bool(matches))
+        return matches
+
+    def record_lookup(self, hit):
+        """
+        Counts a search that did or did not find a match.
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """
+        Returns the number of stored reviews and the searches that did or did not find a match.
+        """
+        with self.lock:
+            return {"reviews": self.count, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,517 @@
+import os
+import time
+import queue
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from context import RunContext, ArticleContext, DeadlineExceeded
+from cache import result_key
+from single_flight import SingleFlight
+from metrics import AGENT_SECONDS, AGENT_ERRORS, AGENT_TIMEOUTS, AGENT_COALESCED, record_cache_lookup
+
+class UnavailableAgent:
+    """
+    Stands in for an agent that could not be instantiated and raises the original error when run.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+    def process_article(self, article_text):
+        raise self.error
+
+
+class AgentExecutor:
+    """
+    Fans an article out to the selected agents concurrently and collects their results
+    in the order the agents were requested.
+    """
+
+    def __init__(self, manager, max_workers=None, cache=None):
+        self.manager = manager
+        self.cache = cache  # Optional ResultCache shared by all requests
+
+        # Bound the number of agents running at once across all requests
+        if max_workers is None:
+            max_workers = int(os.environ.get("INFOFACT_MAX_AGENT_WORKERS", "8"))
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+
+        # Extra seconds granted after a request's deadline for agents to return their partial results
+        self.deadline_grace = float(os.environ.get("INFOFACT_DEADLINE_GRACE", "0.5"))
+
+        # Identical agent runs requested while one is in flight wait for it instead of starting again
+        self.flights = SingleFlight()
+
+    def resolve_agents(self, agent_names):
+        """
+        Look up the requested agents, skipping unknown names and objects without process_article.
+        :param agent_names: The agent names in the order requested by the client.
+        :return: A list of (agent_name, agent_instance) tuples in the requested order.
+        """
+        selected = []
+        for agent_name in agent_names:
+            try:
+                agent_instance = self.manager.get_agent_by_name(agent_name)
+            except Exception as e:
+                # Agents are built on first use, so a construction error is reported like any agent error
+                agent_instance = UnavailableAgent(e)
+            if agent_instance and hasattr(agent_instance, "process_article"):
+                selected.append((agent_name, agent_instance))
+        return selected
+
+    def prepare_batch(self, agent_names, texts):
+        """
+        Let agents that implement prepare_batch process the next articles of a bulk run together,
+        e.g. with one vectorized pass instead of one pass per article. Failures are ignored, the
+        agents then process each article on its own.
+        :param agent_names: The agents the articles will be dispatched to.
+        :param texts: The article texts.
+        """
+        for agent_name, agent_instance in self.resolve_agents(agent_names):
+            if hasattr(agent_instance, "prepare_batch"):
+                try:
+                    agent_instance.prepare_batch(texts)
+                except Exception as e:
+                    print(f"Batch preparation failed in {agent_name}: {e}")
+
+    def input_digest(self, agent_instance, article):
+        """
+        Returns the digest of the agent's input for result keys: the agent's input_signature of the
+        article if it has one, e.g. only the URLs and persons for the metadata agent, so edits that
+        leave its inputs alone reuse its result; the content hash otherwise.
+        :param article: Optional ArticleContext; without one the key hashes the text.
+        """
+        if article is None:
+            return None
+        if hasattr(agent_instance, "input_signature"):
+            return agent_instance.input_signature(article)
+        return article.content_hash
+
+    def cached_result(self, agent_name, agent_instance, article_text, use_cache, article=None):
+        """
+        Look up a previous result for this agent and article.
+        :param article: Optional ArticleContext whose hashes are reused for the key, see input_digest.
+        :return: The cache key (or None without a cache) and the cached result (or None on a miss).
+        """
+        if self.cache is None:
+            return None, None
+        key = self.cache.make_key(agent_name, agent_instance, article_text,
+                                  digest=self.input_digest(agent_instance, article))
+        # Bypassing the cache skips the lookup, the fresh result still replaces the stored one
+        if not use_cache:
+            return key, None
+        result = self.cache.get(key)
+        record_cache_lookup("result", result is not None, result is None)
+        return key, result
+
+    def new_context(self, agent_name, on_progress=None, batch=False, article=None, deadline=None,
+                    unchanged_paragraphs=frozenset()):
+        """
+        Create the RunContext of one agent call.
+        :param on_progress: Optional callback taking (agent_name, message).
+        :param batch: Whether the call is part of a bulk run.
+        :param article: The ArticleContext shared by the agents analyzing the article.
+        :param deadline: Optional Deadline of the request.
+        :param unchanged_paragraphs: Hashes of the paragraphs already in the session's previous input.
+        """
+        return RunContext(on_progress=partial(on_progress, agent_name) if on_progress else None, batch=batch,
+                          article=article, deadline=deadline, unchanged_paragraphs=unchanged_paragraphs)
+
+    def wait_timeout(self, deadline):
+        """
+        Returns the seconds to wait for agents before reporting them as timed out, None without a deadline.
+        """
+        return None if deadline is None else deadline.remaining() + self.deadline_grace
+
+    def mark_timed_out(self, agent_name, context):
+        """
+        Records that an agent run missed the deadline, once per run.
+        """
+        if not context.timed_out:
+            context.timed_out = True
+            AGENT_TIMEOUTS.labels(agent_name, str(context.partial).lower()).inc()
+
+    def timed_out_result(self, agent_name, context):
+        """
+        Reports an agent that missed the deadline without a result of its own, with the steps it completed.
+        """
+        self.mark_timed_out(agent_name, context)
+        budget = f" within the {context.deadline.seconds:g} second deadline" if context.deadline is not None else ""
+        message = f"⏱️ {agent_name} did not finish{budget}."
+        completed = context.output()
+        return f"{message}\n\nCompleted steps:\n{completed}" if completed else message
+
+    def error_result(self, agent_name, error):
+        """
+        Reports an agent run that failed, without affecting the other agents.
+        """
+        AGENT_ERRORS.labels(agent_name).inc()
+        return f"Error in {agent_name}: {str(error)}"
+
+    def finish(self, agent_name, context, key, result):
+        """
+        Caches a successful result. Partial results of runs cut short by the deadline are reported
+        as timed out and never cached.
+        """
+        if context.partial:
+            self.mark_timed_out(agent_name, context)
+        elif key is not None:
+            self.cache.set(key, result)
+        return result
+
+    def context_kwargs(self, agent_name, context):
+        """
+        Build the keyword arguments passing the RunContext to agents that accept one.
+        """
+        return {"context": context} if self.manager.supports_context(agent_name) else {}
+
+    def flight_key(self, agent_name, agent_instance, article_text, context):
+        """
+        Identifies identical agent runs: same agent, model and prompt version, and the same article
+        or, for agents with an input_signature, the same inputs.
+        """
+        return result_key(agent_name, agent_instance, article_text, digest=self.input_digest(agent_instance, context.article))
+
+    def join(self, agent_name, context, shared):
+        """
+        Attaches a run to the identical run in flight and returns the Future of the shared result.
+        """
+        context.coalesced = True
+        AGENT_COALESCED.labels(agent_name).inc()
+        shared.add_done_callback(partial(self.record_wait, context, time.perf_counter()))
+        return shared
+
+    def record_wait(self, context, started, future):
+        context.seconds = time.perf_counter() - started
+
+    def shared_outcome(self, context, result):
+        """
+        Returns the keyword arguments handing a leader's result to the runs that joined it. Results
+        of runs that timed out or were cut short are not shared; the followers, whose deadlines are
+        not later than the leader's (see SingleFlight.begin), report themselves as timed out.
+        """
+        if context.timed_out or context.partial:
+            return {"error": DeadlineExceeded("The shared run did not finish within its deadline")}
+        return {"result": result}
+
+    def settle_flight(self, key, shared, context, future):
+        """
+        Hands the outcome of a leader's pool future to the runs that joined it. The flight is always
+        finished, also when the run failed outside the agent, e.g. in the result cache, so that
+        followers are released and later runs do not join a dead flight.
+        """
+        if future.cancelled():
+            self.flights.finish(key, shared, error=DeadlineExceeded("The shared run was cancelled at its deadline"))
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            self.flights.finish(key, shared, error=e)
+        else:
+            self.flights.finish(key, shared, **self.shared_outcome(context, result))
+
+    def begin_flight(self, key, use_cache, context):
+        """
+        Registers a run with the coalescer, joining the identical run in flight if it has the time
+        to finish within this run's deadline. Runs bypassing the cache never join.
+        """
+        expires_at = None if context.deadline is None else context.deadline.expires_at
+        return self.flights.begin(key, join=use_cache, expires_at=expires_at)
+
+    def submit(self, agent_name, agent_instance, article_text, use_cache, context):
+        """
+        Start an agent run on the pool, or join the identical run already in flight. Runs that join
+        share the leader's result but not its progress events, and do not occupy a worker. Runs
+        bypassing the cache, or with a later deadline than the run in flight, never join.
+        :return: A Future of the agent's result.
+        """
+        key = self.flight_key(agent_name, agent_instance, article_text, context)
+        shared, leader = self.begin_flight(key, use_cache, context)
+        if shared is not None and not leader:
+            return self.join(agent_name, context, shared)
+        future = self.pool.submit(self.call_agent, agent_name, agent_instance, article_text, use_cache, context)
+        if leader:
+            future.add_done_callback(partial(self.settle_flight, key, shared, context))
+        return future
+
+    def outcome(self, agent_name, context, future):
+        """
+        Returns the result of a finished run, reporting a shared run that ended without one as timed
+        out and a run that failed outside the agent, e.g. in the result cache, as an error.
+        """
+        try:
+            return future.result()
+        except DeadlineExceeded:
+            return self.timed_out_result(agent_name, context)
+        except Exception as e:
+            return self.error_result(agent_name, e)
+
+    def call_agent(self, agent_name, agent_instance, article_text, use_cache=True, context=None):
+        """
+        Run a single agent, isolating any error it raises from the other agents.
+        :param agent_name: The filename-based name of the agent.
+        :param agent_instance: The agent instance to run.
+        :param article_text: The text of the article to analyze.
+        :param use_cache: Whether a cached result may be returned instead of running the agent.
+        :param context: The RunContext of this call, receiving progress and timings.
+        :return: The agent's result, or an error message if the agent failed.
+        """
+        context = context or RunContext()
+        started = time.perf_counter()
+        try:
+            key, result = self.cached_result(agent_name, agent_instance, article_text, use_cache, context.article)
+            if result is not None:
+                context.cached = True
+                return result
+
+            try:
+                result = agent_instance.process_article(article_text, **self.context_kwargs(agent_name, context))
+            except DeadlineExceeded:
+                return self.timed_out_result(agent_name, context)
+            except Exception as e:
+                return self.error_result(agent_name, e)
+
+            # Only successful results are cached
+            return self.finish(agent_name, context, key, result)
+        finally:
+            context.seconds = time.perf_counter() - started
+            AGENT_SECONDS.labels(agent_name).observe(context.seconds)
+
+    async def acall_agent(self, agent_name, agent_instance, article_text, use_cache=True, context=None):
+        """
+        Run a single agent on the event loop, using its aprocess_article coroutine when available.
+        :param agent_name: The filename-based name of the agent.
+        :param agent_instance: The agent instance to run.
+        :param article_text: The text of the article to analyze.
+        :param use_cache: Whether a cached result may be returned instead of running the agent.
+        :param context: The RunContext of this call, receiving progress and timings.
+        :return: The agent's result, or an error message if the agent failed.
+        """
+        context = context or RunContext()
+        if not self.manager.supports_async(agent_name):
+            # Blocking agents run on the bounded thread pool so they do not stall the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.pool, self.call_agent, agent_name, agent_instance, article_text, use_cache, context
+            )
+
+        started = time.perf_counter()
+        try:
+            key, result = self.cached_result(agent_name, agent_instance, article_text, use_cache, context.article)
+            if result is not None:
+                context.cached = True
+                return result
+
+            try:
+                result = await agent_instance.aprocess_article(article_text, **self.context_kwargs(agent_name, context))
+            except DeadlineExceeded:
+                return self.timed_out_result(agent_name, context)
+            except Exception as e:
+                return self.error_result(agent_name, e)
+
+            return self.finish(agent_name, context, key, result)
+        finally:
+            context.seconds = time.perf_counter() - started
+            AGENT_SECONDS.labels(agent_name).observe(context.seconds)
+
+    async def acall_shared(self, agent_name, agent_instance, article_text, use_cache, context):
+        """
+        Asynchronous variant of submit: joins the identical run in flight, or runs acall_agent and
+        hands its outcome to the runs that join it meanwhile.
+        """
+        key = self.flight_key(agent_name, agent_instance, article_text, context)
+        shared, leader = self.begin_flight(key, use_cache, context)
+        if shared is not None and not leader:
+            # Shielded, so a follower cancelled at its own deadline leaves the shared run alone
+            return await asyncio.shield(asyncio.wrap_future(self.join(agent_name, context, shared)))
+        if not leader:
+            return await self.acall_agent(agent_name, agent_instance, article_text, use_cache, context)
+
+        try:
+            result = await self.acall_agent(agent_name, agent_instance, article_text, use_cache, context)
+        except asyncio.CancelledError:
+            self.flights.finish(key, shared, error=DeadlineExceeded("The shared run was cancelled at its deadline"))
+            raise
+        except BaseException as e:
+            self.flights.finish(key, shared, error=e)
+            raise
+        self.flights.finish(key, shared, **self.shared_outcome(context, result))
+        return result
+
+    async def acall_agent_bounded(self, agent_name, agent_instance, article_text, use_cache, context):
+        """
+        Run acall_shared, cancelling the agent if it has not finished shortly after the context's deadline.
+        """
+        try:
+            return await asyncio.wait_for(
+                self.acall_shared(agent_name, agent_instance, article_text, use_cache, context),
+                self.wait_timeout(context.deadline),
+            )
+        except asyncio.TimeoutError:
+            # Also DeadlineExceeded, raised when a shared run ended at its leader's deadline
+            return self.timed_out_result(agent_name, context)
+
+    def run(self, agent_names, article_text, use_cache=True, batch=False, timings=None, article=None,
+            deadline=None, timed_out=None, unchanged_paragraphs=frozenset()):
+        """
+        Dispatch the article to all requested agents at once.
+        :param agent_names: The agent names in the order requested by the client.
+        :param article_text: The text of the article to analyze.
+        :param use_cache: Whether cached results may be returned instead of running the agents.
+        :param batch: Whether the article is part of a bulk run, see RunContext.batch.
+        :param timings: Optional dictionary receiving each agent's timing breakdown.
+        :param article: The ArticleContext of the text, built here if the caller has none.
+        :param deadline: Optional Deadline of the request. Agents still running shortly after it are
+            reported as timed out; their threads stop at their next bounded outbound call.
+        :param timed_out: Optional list receiving the names of the agents that missed the deadline.
+        :param unchanged_paragraphs: Hashes of the paragraphs that were already in the session's previous
+            input; agents may reuse their earlier analysis of these.
+        :return: A list of (agent_name, result) tuples in the requested order.
+        """
+        article = article or ArticleContext(article_text)
+        futures = []
+        for agent_name, agent_instance in self.resolve_agents(agent_names):
+            context = self.new_context(agent_name, batch=batch, article=article, deadline=deadline,
+                                       unchanged_paragraphs=unchanged_paragraphs)
+            future = self.submit(agent_name, agent_instance, article_text, use_cache, context)
+            futures.append((agent_name, future, context))
+
+        # Reassemble results in the requested order
+        results = []
+        for agent_name, future, context in futures:
+            try:
+                result = future.result(timeout=self.wait_timeout(deadline))
+            except TimeoutError:
+                # Also DeadlineExceeded from a shared run; shared futures cannot be cancelled
+                future.cancel()
+                result = self.timed_out_result(agent_name, context)
+            except Exception as e:
+                result = self.error_result(agent_name, e)
+            results.append((agent_name, result))
+        if timings is not None:
+            timings.update({agent_name: context.timings() for agent_name, _, context in futures})
+        if timed_out is not None:
+            timed_out.extend(agent_name for agent_name, _, context in futures if context.timed_out)
+        return results
+
+    def run_iter(self, agent_names, article_text, use_cache=True, article=None, deadline=None, timed_out=None,
+                 unchanged_paragraphs=frozenset()):
+        """
+        Dispatch the article to all requested agents at once and yield events as they happen:
+        ("progress", agent_name, message) for intermediate steps and ("result", agent_name, result)
+        as soon as each agent finishes, in completion order.
+        :param agent_names: The agent names in the order requested by the client.
+        :param article_text: The text of the article to analyze.
+        :param use_cache: Whether cached results may be returned instead of running the agents.
+        :param article: The ArticleContext of the text, built here if the caller has none.
+        :param deadline: Optional Deadline of the request, see run.
+        :param timed_out: Optional list receiving the names of the agents that missed the deadline.
+        :param unchanged_paragraphs: Hashes of the paragraphs already in the session's previous input, see run.
+        """
+        article = article or ArticleContext(article_text)
+        events = queue.Queue()
+
+        def on_progress(agent_name, message):
+            events.put(("progress", agent_name, message))
+
+        def on_done(index, agent_name, context, future):
+            if not future.cancelled():
+                events.put(("result", agent_name, self.outcome(agent_name, context, future), index))
+
+        started = []
+        for index, (agent_name, agent_instance) in enumerate(self.resolve_agents(agent_names)):
+            context = self.new_context(agent_name, on_progress, article=article, deadline=deadline,
+                                       unchanged_paragraphs=unchanged_paragraphs)
+            future = self.submit(agent_name, agent_instance, article_text, use_cache, context)
+            future.add_done_callback(partial(on_done, index, agent_name, context))
+            started.append((agent_name, future, context))
+
+        pending = set(range(len(started)))
+        while pending:
+            try:
+                event = events.get(timeout=self.wait_timeout(deadline))
+            except queue.Empty:
+                # Report the agents that are still running as timed out, in the requested order
+                for index in sorted(pending):
+                    agent_name, future, context = started[index]
+                    future.cancel()
+                    yield ("result", agent_name, self.timed_out_result(agent_name, context))
+                break
+            if event[0] == "result":
+                pending.discard(event[3])
+                event = event[:3]
+            yield event
+
+        if timed_out is not None:
+            timed_out.extend(agent_name for agent_name, _, context in started if context.timed_out)
+
+    async def arun(self, agent_names, article_text, use_cache=True, timings=None, article=None, deadline=None,
+                   timed_out=None, unchanged_paragraphs=frozenset()):
+        """
+        Asynchronous variant of run for ASGI servers. Agents still running shortly after the deadline are cancelled.
+        :param agent_names: The agent names in the order requested by the client.
+        :param article_text: The text of the article to analyze.
+        :param use_cache: Whether cached results may be returned instead of running the agents.
+        :param timings: Optional dictionary receiving each agent's timing breakdown.
+        :param article: The ArticleContext of the text, built here if the caller has none.
+        :param deadline: Optional Deadline of the request.
+        :param timed_out: Optional list receiving the names of the agents that missed the deadline.
+        :param unchanged_paragraphs: Hashes of the paragraphs already in the session's previous input, see run.
+        :return: A list of (agent_name, result) tuples in the requested order.
+        """
+        article = article or ArticleContext(article_text)
+        selected = [
+            (agent_name, agent_instance,
+             self.new_context(agent_name, article=article, deadline=deadline, unchanged_paragraphs=unchanged_paragraphs))
+            for agent_name, agent_instance in self.resolve_agents(agent_names)
+        ]
+        results = await asyncio.gather(
+            *(self.acall_agent_bounded(agent_name, agent_instance, article_text, use_cache, context)
+              for agent_name, agent_instance, context in selected)
+        )
+        if timings is not None:
+            timings.update({agent_name: context.timings() for agent_name, _, context in selected})
+        if timed_out is not None:
+            timed_out.extend(agent_name for agent_name, _, context in selected if context.timed_out)
+        return [(agent_name, result) for (agent_name, _, _), result in zip(selected, results)]
+
+    async def arun_iter(self, agent_names, article_text, use_cache=True, article=None, deadline=None, timed_out=None,
+                        unchanged_paragraphs=frozenset()):
+        """
+        Asynchronous variant of run_iter for ASGI servers.
+        :param agent_names: The agent names in the order requested by the client.
+        :param article_text: The text of the article to analyze.
+        :param use_cache: Whether cached results may be returned instead of running the agents.
+        :param article: The ArticleContext of the text, built here if the caller has none.
+        :param deadline: Optional Deadline of the request, see arun.
+        :param timed_out: Optional list receiving the names of the agents that missed the deadline.
+        :param unchanged_paragraphs: Hashes of the paragraphs already in the session's previous input, see run.
+        """
+        article = article or ArticleContext(article_text)
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def on_progress(agent_name, message):
+            # Blocking agents report from pool threads, so hand events over to the loop thread-safely
+            loop.call_soon_threadsafe(events.put_nowait, ("progress", agent_name, message))
+
+        def on_done(agent_name, task):
+            events.put_nowait(("result", agent_name, task.result()))
+
+        contexts = []
+        for agent_name, agent_instance in self.resolve_agents(agent_names):
+            context = self.new_context(agent_name, on_progress, article=article, deadline=deadline,
+                                       unchanged_paragraphs=unchanged_paragraphs)
+            task = asyncio.ensure_future(self.acall_agent_bounded(agent_name, agent_instance, article_text, use_cache, context))
+            task.add_done_callback(partial(on_done, agent_name))
+            contexts.append((agent_name, context))
+
+        remaining = len(contexts)
+        while remaining:
+            event = await events.get()
+            if event[0] == "result":
+                remaining -= 1
+            yield event
+
+        if timed_out is not None:
+            timed_out.extend(agent_name for agent_name, context in contexts if context.timed_out)
@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import socket
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from cache import LRUCache
+from metrics import FETCH_SECONDS, FETCH_ERRORS, record_cache_lookup
+
+# A request body that is nothing but a single http(s) URL is fetched instead of analyzed as text
+URL_BODY = re.compile(r"^https?://\S+$", re.IGNORECASE)
+
+# Answers worth another attempt, like connection errors
+RETRY_STATUSES = (502, 503, 504)
+# Redirects followed before giving up
+MAX_REDIRECTS = 5
+# Default ports, for checking the address a URL without an explicit port connects to
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Elements that never hold article text
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "header", "footer", "aside"]
+# Elements whose text is kept, in document order
+TEXT_TAGS = ["h1", "h2", "h3", "h4", "p", "li", "blockquote", "pre"]
+
+def is_url(text):
+    """
+    Returns True if the text is a single http(s) URL.
+    """
+    return bool(URL_BODY.match(text))
+
+def extract_text(html, url=None):
+    """
+    Extracts the readable article text from an HTML page. Scripts, styles and navigation are
+    dropped, and the <article> or <main> element is preferred over the whole body.
+    :param html: The page as bytes or text; bytes are decoded by the charset the page declares.
+    :param url: The address of the page, appended as the source so the metadata agent can rate it.
+    :return: The title and the text blocks separated by blank lines.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+
+    container = soup.find("article") or soup.find("main") or soup.body or soup
+    blocks = []
+    for element in container.find_all(TEXT_TAGS):
+        # Nested matches such as <li><p>...</p></li> are collected once, from the outermost element
+        if element.find_parent(TEXT_TAGS) is not None:
+            continue
+        block = " ".join(element.get_text(" ", strip=True).split())
+        if block and (not blocks or block != blocks[-1]):
+            blocks.append(block)
+    if not blocks:
+        blocks = [line for line in (" ".join(line.split()) for line in container.get_text("\n").splitlines()) if line]
+
+    if title and (not blocks or blocks[0] != title):
+        blocks.insert(0, title)
+    if url:
+        blocks.append(f"Source: {url}")
+    return "\n\n".join(blocks)
+
+
+class FetchError(Exception):
+    """
+    Raised when a URL cannot be fetched or does not contain an article.
+    :param status: The HTTP status the backend should answer with.
+    """
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+class ArticleFetcher:
+    """
+    Fetches articles for the backend through one pooled HTTP session. Responses are capped in size,
+    and the extracted text is cached with the page's ETag and Last-Modified validators, so
+    fetching a known page again costs a conditional request that usually answers 304 Not Modified.
+    """
+
+    def __init__(self, timeout=None, max_bytes=None, cache_size=None, fresh_for=None):
+        """
+        :param timeout: Seconds to wait for the connection and for each read, default INFOFACT_FETCH_TIMEOUT or 10.
+        :param max_bytes: Largest response body accepted, default INFOFACT_FETCH_MAX_BYTES or 5 MB.
+        :param cache_size: Number of pages kept, default INFOFACT_FETCH_CACHE_SIZE or 256.
+        :param fresh_for: Seconds a cached page is served without revalidation, default INFOFACT_FETCH_FRESH or 60.
+        """
+        self.timeout = float(timeout or os.environ.get("INFOFACT_FETCH_TIMEOUT", 10))
+        self.max_bytes = int(max_bytes or os.environ.get("INFOFACT_FETCH_MAX_BYTES", 5 * 1024 * 1024))
+        self.fresh_for = float(fresh_for if fresh_for is not None else os.environ.get("INFOFACT_FETCH_FRESH", 60))
+        # Fetching internal addresses on behalf of clients is refused unless explicitly allowed
+        self.allow_private = os.environ.get("INFOFACT_FETCH_ALLOW_PRIVATE", "").lower() in ("1", "true", "yes")
+        self.pages = LRUCache(max_entries=int(cache_size or os.environ.get("INFOFACT_FETCH_CACHE_SIZE", 256)), ttl=24 * 3600)
+
+        # Connection errors and 502/503/504 answers are retried in fetch, within the request's deadline
+        self.retries = 2
+        self.backoff = 0.3
+
+        pool_size = int(os.environ.get("INFOFACT_FETCH_POOL_SIZE", 32))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": "InfoFactAgents/1.0 (+article fetcher)",
+            "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.1",
+        })
+        # Lookups run here so a request waits for DNS only until its deadline
+        self.resolver = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="fetch-resolve")
+        self.lock = threading.Lock()
+        self.revalidated = 0
+
+    def resolve(self, url, host, port, deadline=None):
+        """
+        Returns the addresses the host resolves to, waiting at most until the deadline.
+        :raises FetchError: With status 504 if the deadline passes before the lookup answers.
+        """
+        if deadline is None:
+            return socket.getaddrinfo(host, port)
+        future = self.resolver.submit(socket.getaddrinfo, host, port)
+        try:
+            return future.result(timeout=self.attempt_timeout(url, deadline))
+        except FutureTimeout:
+            # The lookup itself cannot be interrupted, it finishes in the background
+            raise FetchError(f"Deadline passed while resolving {host}", status=504)
+
+    def check_url(self, url, deadline=None):
+        """
+        Rejects URLs that are not http(s) or that resolve to a private, loopback or link-local address.
+        :param deadline: Optional Deadline that bounds the address lookup.
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise FetchError(f"Not an http(s) URL: {url}", status=400)
+        if self.allow_private:
+            return
+        try:
+            port = parsed.port or DEFAULT_PORTS[parsed.scheme]
+        except ValueError:
+            raise FetchError(f"Invalid port in {url}", status=400)
+        try:
+            addresses = {info[4][0] for info in self.resolve(url, parsed.hostname, port, deadline)}
+        except socket.gaierror as e:
+            raise FetchError(f"Cannot resolve {parsed.hostname}: {e}", status=400)
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split("%", 1)[0])
+            if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_multicast:
+                raise FetchError(f"Refusing to fetch {url}: {parsed.hostname} is not a public address", status=400)
+
+    def read_body(self, response, deadline=None):
+        """
+        Reads the response body, failing as soon as it grows beyond the size cap or the deadline passes.
+        """
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise FetchError(f"Page is larger than {self.max_bytes} bytes", status=413)
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise FetchError(f"Page is larger than {self.max_bytes} bytes", status=413)
+            chunks.append(chunk)
+            if deadline is not None and deadline.expired():
+                raise FetchError(f"Deadline passed while reading {response.url}", status=504)
+        return b"".join(chunks)
+
+    def attempt_timeout(self, url, deadline):
+        """
+        Returns the timeout of the next HTTP request: the fetcher's, capped by the time left until the deadline.
+        :raises FetchError: With status 504 if the deadline has passed.
+        """
+        if deadline is None:
+            return self.timeout
+        timeout = deadline.timeout(self.timeout)
+        if timeout <= 0:
+            raise FetchError(f"Deadline passed before {url} could be fetched", status=504)
+        return timeout
+
+    def get(self, url, headers, deadline=None):
+        """
+        Sends a GET request without following redirects. Connection errors and 502/503/504 answers are
+        retried with backoff, and every attempt is bounded by the time left until the deadline.
+        :return: The streamed response.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                pause = self.backoff * 2 ** (attempt - 1)
+                time.sleep(pause if deadline is None else min(pause, deadline.remaining()))
+            timeout = self.attempt_timeout(url, deadline)
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=False)
+            except requests.ConnectionError:
+                if attempt == self.retries:
+                    raise
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            response.close()
+
+    def fetch(self, url, deadline=None):
+        """
+        Returns the article text of the page at the URL.
+        :param deadline: Optional Deadline of the request. Every attempt and redirect hop gets at most
+            the time left until it, and the fetch stops once it has passed.
+        :raises FetchError: If the URL is refused, unreachable, too large or not an HTML or text page,
+            or with status 504 if the deadline passes.
+        """
+        self.check_url(url, deadline)
+        cached = self.pages.get(url)
+        if cached is not None and time.time() - cached["checked_at"] < self.fresh_for:
+            record_cache_lookup("fetch", 1)
+            return cached["text"]
+
+        headers = {}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        started = time.perf_counter()
+        try:
+            # Redirects are not followed blindly: each hop is checked against the address policy
+            response = self.get(url, headers, deadline)
+            for _ in range(MAX_REDIRECTS):
+                if not response.is_redirect:
+                    break
+                location = requests.compat.urljoin(response.url, response.headers["Location"])
+                response.close()
+                self.check_url(location, deadline)
+                response = self.get(location, headers, deadline)
+            with response:
+                if response.status_code == 304 and cached is not None:
+                    record_cache_lookup("fetch", 1)
+                    cached["checked_at"] = time.time()
+                    self.pages.set(url, cached)
+                    with self.lock:
+                        self.revalidated += 1
+                    return cached["text"]
+                if response.is_redirect:
+                    raise FetchError(f"Too many redirects fetching {url}")
+                if response.status_code != 200:
+                    raise FetchError(f"Fetching {url} failed with HTTP {response.status_code}")
+                body = self.read_body(response, deadline)
+        except requests.Timeout as e:
+            FETCH_ERRORS.inc()
+            raise FetchError(f"Fetching {url} timed out: {e}", status=504)
+        except requests.RequestException as e:
+            FETCH_ERRORS.inc()
+            raise FetchError(f"Fetching {url} failed: {e}")
+        except FetchError:
+            FETCH_ERRORS.inc()
+            raise
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - started)
+        record_cache_lookup("fetch", 0, 1)
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type in ("text/html", "application/xhtml+xml", ""):
+            text = extract_text(body, response.url)
+        elif content_type == "text/plain":
+            text = body.decode(response.encoding or "utf-8", errors="replace").strip()
+            text = f"{text}\n\nSource: {response.url}" if text else text
+        else:
+            raise FetchError(f"Unsupported content type {content_type} at {url}", status=415)
+        if not text.strip():
+            raise FetchError(f"No article text found at {url}", status=422)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified or self.fresh_for:
+            self.pages.set(url, {"text": text, "etag": etag, "last_modified": last_modified, "checked_at": time.time()})
+        return text
+
+    def stats(self):
+        """
+        Returns the page cache counters and the number of 304 revalidations.
+        """
+        return {**self.pages.stats(), "revalidated": self.revalidated}
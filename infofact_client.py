@@ -0,0 +1,399 @@
+# Client for the /infofactagents API, used by the Gradio front end:
+#   client = InfoFactClient("http://localhost:5000/infofactagents")
+#   client.analyze(text, ["sentiment_analysis_agent"], format="markdown")
+import os
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # Only the asynchronous client needs httpx
+    httpx = None
+
+DEFAULT_URL = "http://localhost:5000/infofactagents"
+
+
+class InfoFactError(Exception):
+    """
+    Raised when the backend cannot be reached or answers an error.
+    :param status: The HTTP status of the answer, None if the backend could not be reached.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TTLCache:
+    """
+    Small thread-safe cache for slowly changing answers such as the agent list. Kept here instead
+    of using cache.LRUCache so the client does not import the backend's modules.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for the key, or None if it is missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            return None
+
+    def set(self, key, value):
+        """
+        Stores the value for the key for ttl seconds.
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        """
+        Drops all cached values, e.g. after agents were added to the backend.
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+def analysis_form(text, agents, session_id="", format="json", stream=False, deadline=None, bypass_cache=False,
+                  timings=False):
+    """
+    Builds the form fields of an analysis request.
+    :param text: The article text or a URL for the backend to fetch.
+    :param agents: The names of the agents to run.
+    :param format: "json" for the structured response, "markdown" for the rendered report.
+    :param deadline: Optional seconds the backend may spend on the analysis.
+    """
+    form = {"Body": text, "Agents": ",".join(agents), "SessionID": session_id or "", "Format": format}
+    if stream:
+        form["Stream"] = "1"
+    if deadline is not None:
+        form["Deadline"] = str(deadline)
+    if bypass_cache:
+        form["BypassCache"] = "1"
+    if timings:
+        form["Timings"] = "1"
+    return form
+
+def parse_agents(response_text):
+    """
+    Parses the "name - description" lines of the list_agents answer.
+    :return: A list of dictionaries with the name and description of each agent.
+    """
+    agents = []
+    for line in response_text.split("\n"):
+        if " - " in line:
+            name, description = line.split(" - ", 1)
+            agents.append({"name": name.strip(), "description": description.strip()})
+    return agents
+
+def parse_answer(status, text):
+    """
+    Decodes a JSON answer of the backend.
+    :return: The decoded dictionary.
+    :raises InfoFactError: If the status is not 200 or the answer is not JSON.
+    """
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        raise InfoFactError(f"Unexpected answer from the backend ({status}): {text[:200]}", status)
+    if status != 200:
+        raise InfoFactError(payload.get("Error", f"Backend answered {status}") if isinstance(payload, dict) else text, status)
+    return payload
+
+def parse_event(line):
+    """
+    Decodes one JSON line of a streamed analysis, None for keep-alive blank lines.
+    """
+    line = line.strip()
+    return json.loads(line) if line else None
+
+
+class InfoFactClient:
+    """
+    Blocking client with one pooled keep-alive session, safe to share between threads, so a front
+    end serving many users reuses a bounded number of connections. The agent list and the system
+    prompt are cached for cache_ttl seconds.
+    """
+
+    def __init__(self, url=None, timeout=None, connect_timeout=None, retries=None, pool_size=None, cache_ttl=None):
+        """
+        :param url: The /infofactagents endpoint, default INFOFACT_BACKEND_URL or http://localhost:5000/infofactagents.
+        :param timeout: Seconds to wait for each read, default INFOFACT_CLIENT_TIMEOUT or 120; analyses can be slow.
+        :param connect_timeout: Seconds to wait for the connection, default INFOFACT_CLIENT_CONNECT_TIMEOUT or 5.
+        :param retries: Retries on connection errors, and on 502/503/504 answers to health checks and commands,
+            default INFOFACT_CLIENT_RETRIES or 2.
+        :param pool_size: Connections kept alive, default INFOFACT_CLIENT_POOL_SIZE or 32.
+        :param cache_ttl: Seconds the agent list and system prompt are cached, default INFOFACT_CLIENT_CACHE_TTL or 300.
+        """
+        self.url = (url or os.environ.get("INFOFACT_BACKEND_URL", DEFAULT_URL)).rstrip("/")
+        self.timeout = (
+            float(connect_timeout or os.environ.get("INFOFACT_CLIENT_CONNECT_TIMEOUT", 5)),
+            float(timeout or os.environ.get("INFOFACT_CLIENT_TIMEOUT", 120)),
+        )
+        retries = int(retries if retries is not None else os.environ.get("INFOFACT_CLIENT_RETRIES", 2))
+        pool_size = int(pool_size or os.environ.get("INFOFACT_CLIENT_POOL_SIZE", 32))
+        self.cache = TTLCache(float(cache_ttl if cache_ttl is not None else os.environ.get("INFOFACT_CLIENT_CACHE_TTL", 300)))
+
+        # Analyses are only retried when the connection failed, never on a read error or a 502/503/504
+        # answer: the backend may already have run them, and re-running redoes the LLM work
+        self.session = self.build_session(pool_size, Retry(total=retries, connect=retries, read=0, status=0))
+        # Health checks and commands such as list_agents are idempotent and also retried on 502/503/504
+        self.idempotent_session = self.build_session(pool_size, Retry(
+            total=retries, connect=retries, read=0, status=retries, backoff_factor=0.3,
+            status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET", "POST"]), raise_on_status=False,
+        ))
+
+    def build_session(self, pool_size, retry):
+        """
+        Returns a pooled keep-alive session retrying as the given Retry allows.
+        """
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"User-Agent": "InfoFactAgents-Client/1.0"})
+        return session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
+        self.idempotent_session.close()
+
+    def post(self, form, timeout=None, idempotent=False):
+        """
+        Posts a form to the endpoint and decodes the JSON answer.
+        :param timeout: Optional read timeout overriding the client's.
+        :param idempotent: Whether the form may be sent again after a 502/503/504 answer, as commands may.
+        """
+        session = self.idempotent_session if idempotent else self.session
+        try:
+            response = session.post(self.url, data=form, timeout=(self.timeout[0], timeout or self.timeout[1]))
+        except requests.RequestException as e:
+            raise InfoFactError(f"Request failed: {e}")
+        return parse_answer(response.status_code, response.text)
+
+    def command(self, name, cached=True):
+        """
+        Sends a command such as list_agents, answered from the cache while it is fresh. The SessionID
+        of the answer is not kept, as cached answers are shared by all sessions.
+        :return: The text of the answer.
+        """
+        text = self.cache.get(name) if cached else None
+        if text is None:
+            text = self.post({"Body": name}, idempotent=True)["Response"]
+            self.cache.set(name, text)
+        return text
+
+    def list_agents(self, cached=True):
+        """
+        Returns the available agents as dictionaries with their name and description.
+        """
+        return parse_agents(self.command("list_agents", cached))
+
+    def system_prompt(self, cached=True):
+        """
+        Returns the system prompt describing the available agents.
+        """
+        return self.command("system_prompt", cached)
+
+    def analyze(self, text, agents, session_id="", **options):
+        """
+        Analyzes an article and waits for the whole answer.
+        :param text: The article text or a URL for the backend to fetch.
+        :param agents: The names of the agents to run.
+        :param session_id: The SessionID of earlier requests, empty to start a session.
+        :param options: format, deadline, bypass_cache and timings, see analysis_form.
+        :return: The decoded answer, with the SessionID to send with the next request.
+        """
+        return self.post(analysis_form(text, agents, session_id, **options), self.read_timeout(options))
+
+    def stream(self, text, agents, session_id="", **options):
+        """
+        Analyzes an article and yields the events as the backend sends them: "session" first, then
+        "progress" steps and each agent's "result", and finally "done" with the whole answer.
+        :return: A generator of event dictionaries.
+        """
+        form = analysis_form(text, agents, session_id, stream=True, **options)
+        try:
+            with self.session.post(self.url, data=form, stream=True,
+                                   timeout=(self.timeout[0], self.read_timeout(options))) as response:
+                if response.status_code != 200:
+                    parse_answer(response.status_code, response.text)
+                for line in response.iter_lines(decode_unicode=True):
+                    event = parse_event(line)
+                    if event is not None:
+                        yield event
+        except requests.RequestException as e:
+            raise InfoFactError(f"Request failed: {e}")
+
+    def health(self, probe=False):
+        """
+        Returns the backend's health report; probe=True also probes the external services.
+        """
+        try:
+            response = self.idempotent_session.get(f"{self.url}/health", params={"probe": "1"} if probe else None, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise InfoFactError(f"Request failed: {e}")
+        return parse_answer(response.status_code, response.text)
+
+    def read_timeout(self, options):
+        """
+        Returns the read timeout of an analysis: the client's, or a little more than its deadline.
+        """
+        deadline = options.get("deadline")
+        return max(self.timeout[1], float(deadline) + 5) if deadline is not None else self.timeout[1]
+
+
+class AsyncInfoFactClient:
+    """
+    Asynchronous variant of InfoFactClient based on httpx, for front ends such as Gradio that run
+    their callbacks on an event loop. Requires httpx. Its connections belong to the event loop they
+    were opened on, so share it only between callers on the same loop.
+    """
+
+    def __init__(self, url=None, timeout=None, connect_timeout=None, retries=None, pool_size=None, cache_ttl=None):
+        """
+        :param url: The /infofactagents endpoint; the other parameters are those of InfoFactClient.
+        """
+        if httpx is None:
+            raise ImportError("AsyncInfoFactClient requires httpx. Please install it with: pip install httpx")
+        self.url = (url or os.environ.get("INFOFACT_BACKEND_URL", DEFAULT_URL)).rstrip("/")
+        self.connect_timeout = float(connect_timeout or os.environ.get("INFOFACT_CLIENT_CONNECT_TIMEOUT", 5))
+        self.read_timeout_seconds = float(timeout or os.environ.get("INFOFACT_CLIENT_TIMEOUT", 120))
+        retries = int(retries if retries is not None else os.environ.get("INFOFACT_CLIENT_RETRIES", 2))
+        pool_size = int(pool_size or os.environ.get("INFOFACT_CLIENT_POOL_SIZE", 32))
+        self.cache = TTLCache(float(cache_ttl if cache_ttl is not None else os.environ.get("INFOFACT_CLIENT_CACHE_TTL", 300)))
+
+        # httpx retries failed connections only, answers are never retried
+        self.client = httpx.AsyncClient(
+            timeout=self.request_timeout(self.read_timeout_seconds),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+            headers={"User-Agent": "InfoFactAgents-Client/1.0"},
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Closes the pooled connections.
+        """
+        await self.client.aclose()
+
+    def request_timeout(self, read_timeout):
+        """
+        Returns the httpx timeout of a request with the given read timeout.
+        """
+        return httpx.Timeout(read_timeout, connect=self.connect_timeout)
+
+    def read_timeout(self, options):
+        """
+        See InfoFactClient.read_timeout.
+        """
+        deadline = options.get("deadline")
+        return max(self.read_timeout_seconds, float(deadline) + 5) if deadline is not None else self.read_timeout_seconds
+
+    async def post(self, form, timeout=None):
+        """
+        Asynchronous variant of InfoFactClient.post.
+        """
+        try:
+            response = await self.client.post(self.url, data=form, timeout=self.request_timeout(timeout or self.read_timeout_seconds))
+        except httpx.HTTPError as e:
+            raise InfoFactError(f"Request failed: {e}")
+        return parse_answer(response.status_code, response.text)
+
+    async def command(self, name, cached=True):
+        """
+        Asynchronous variant of InfoFactClient.command.
+        """
+        text = self.cache.get(name) if cached else None
+        if text is None:
+            text = (await self.post({"Body": name}))["Response"]
+            self.cache.set(name, text)
+        return text
+
+    async def list_agents(self, cached=True):
+        """
+        Asynchronous variant of InfoFactClient.list_agents.
+        """
+        return parse_agents(await self.command("list_agents", cached))
+
+    async def system_prompt(self, cached=True):
+        """
+        Asynchronous variant of InfoFactClient.system_prompt.
+        """
+        return await self.command("system_prompt", cached)
+
+    async def analyze(self, text, agents, session_id="", **options):
+        """
+        Asynchronous variant of InfoFactClient.analyze.
+        """
+        return await self.post(analysis_form(text, agents, session_id, **options), self.read_timeout(options))
+
+    async def stream(self, text, agents, session_id="", **options):
+        """
+        Asynchronous variant of InfoFactClient.stream.
+        :return: An asynchronous generator of event dictionaries.
+        """
+        form = analysis_form(text, agents, session_id, stream=True, **options)
+        try:
+            async with self.client.stream("POST", self.url, data=form,
+                                          timeout=self.request_timeout(self.read_timeout(options))) as response:
+                if response.status_code != 200:
+                    parse_answer(response.status_code, (await response.aread()).decode("utf-8", "replace"))
+                async for line in response.aiter_lines():
+                    event = parse_event(line)
+                    if event is not None:
+                        yield event
+        except httpx.HTTPError as e:
+            raise InfoFactError(f"Request failed: {e}")
+
+    async def health(self, probe=False):
+        """
+        Asynchronous variant of InfoFactClient.health.
+        """
+        try:
+            response = await self.client.get(f"{self.url}/health", params={"probe": "1"} if probe else None)
+        except httpx.HTTPError as e:
+            raise InfoFactError(f"Request failed: {e}")
+        return parse_answer(response.status_code, response.text)
+
+
+# One client per backend URL and kind, shared by all users of a front end
+shared_clients = {}
+shared_clients_lock = threading.Lock()
+
+def shared_client(url=None, asynchronous=False):
+    """
+    Returns the client shared by all callers for the backend URL, creating it on first use.
+    :param asynchronous: Whether to return an AsyncInfoFactClient instead of an InfoFactClient.
+    """
+    url = (url or os.environ.get("INFOFACT_BACKEND_URL", DEFAULT_URL)).rstrip("/")
+    with shared_clients_lock:
+        client = shared_clients.get((url, asynchronous))
+        if client is None:
+            client = shared_clients[(url, asynchronous)] = (AsyncInfoFactClient if asynchronous else InfoFactClient)(url)
+        return client
@@ -0,0 +1,133 @@
+import os
+import time
+import httpx
+from functools import lru_cache
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from metrics import observe_llm_call, LLM_ERRORS
+from context import count_tokens, PARAGRAPH_BREAK, SENTENCE_BREAK
+from scheduler import LLMScheduler, priority_for
+
+# All agents share one scheduler, so rate limits and concurrency are enforced per model across the process
+scheduler = LLMScheduler()
+
+def split_into_chunks(text, max_tokens, model="gpt-4o"):
+    """
+    Splits a text into chunks of at most max_tokens tokens on paragraph boundaries, falling back to
+    sentence boundaries for paragraphs that do not fit. A single sentence longer than the budget
+    becomes a chunk of its own.
+    :param text: The text to split.
+    :param max_tokens: The token budget per chunk.
+    :param model: The model whose tokenizer is used for counting.
+    :return: A list of chunks, in the order of the text.
+    """
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK.split(text.strip()):
+        if count_tokens(paragraph, model) <= max_tokens:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(SENTENCE_BREAK.split(paragraph))
+
+    chunks = []
+    current, current_tokens = [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+@lru_cache(maxsize=None)
+def create_openai_clients(api_key):
+    """
+    Returns the blocking and asyncio-based OpenAI clients for an API key, shared by all agents using
+    that key. Both clients keep a pool of keep-alive connections sized by INFOFACT_OPENAI_MAX_CONNECTIONS
+    and are safe to share between concurrent requests. The clients do not retry on their own, the
+    scheduler retries with backoff that takes every caller into account. Calls time out after
+    INFOFACT_OPENAI_TIMEOUT seconds, or earlier when the request's deadline is closer.
+    :param api_key: The OpenAI API key.
+    :return: A tuple of (OpenAI, AsyncOpenAI) clients.
+    """
+    max_connections = int(os.environ.get("INFOFACT_OPENAI_MAX_CONNECTIONS", "100"))
+    timeout = float(os.environ.get("INFOFACT_OPENAI_TIMEOUT", "60"))
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    client = OpenAI(api_key=api_key, max_retries=0, timeout=timeout, http_client=DefaultHttpxClient(limits=limits))
+    async_client = AsyncOpenAI(api_key=api_key, max_retries=0, timeout=timeout,
+                               http_client=DefaultAsyncHttpxClient(limits=limits))
+    return client, async_client
+
+def deadline_of(context):
+    """
+    Returns the request Deadline carried by a RunContext, or None.
+    """
+    return getattr(context, "deadline", None)
+
+def request_options(client, deadline):
+    """
+    Returns the keyword arguments bounding one API call by the request's deadline, checked when the
+    call is actually sent so time spent queued in the scheduler counts against the budget.
+    """
+    if deadline is None:
+        return {}
+    deadline.check("the LLM call was sent")
+    default = getattr(client, "timeout", None)
+    return {"timeout": deadline.timeout(default if isinstance(default, (int, float)) else None)}
+
+def record_completion(operation, model, seconds, queued, chat_completion, context):
+    """
+    Records the latency and token usage of a chat completion in the metrics and the run's timings.
+    :param queued: The part of the seconds the call waited for the scheduler.
+    """
+    usage = getattr(chat_completion, "usage", None)
+    observe_llm_call(model, operation, seconds - queued, usage)
+    if context is not None:
+        context.record_call(
+            f"llm:{operation}", seconds, model=model, queued=round(queued, 4),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+def create_chat_completion(client, operation, context=None, priority=None, **kwargs):
+    """
+    Creates a chat completion through the shared scheduler and records its latency and token usage.
+    :param client: The OpenAI client.
+    :param operation: A short name of the call site for the metrics, e.g. "extract_claims".
+    :param context: Optional RunContext receiving the call in its timing breakdown.
+    :param priority: Scheduling priority, by default interactive unless the context is a batch run.
+    :param kwargs: The arguments of chat.completions.create.
+    :return: The chat completion.
+    :raises DeadlineExceeded: If the context's deadline passes before the completion arrives.
+    """
+    priority = priority_for(context) if priority is None else priority
+    deadline = deadline_of(context)
+    started = time.perf_counter()
+    try:
+        completion, queued = scheduler.call(
+            lambda: client.chat.completions.create(**kwargs, **request_options(client, deadline)), kwargs, priority, deadline
+        )
+    except Exception:
+        LLM_ERRORS.labels(kwargs.get("model"), operation).inc()
+        raise
+    record_completion(operation, kwargs.get("model"), time.perf_counter() - started, queued, completion, context)
+    return completion
+
+async def acreate_chat_completion(async_client, operation, context=None, priority=None, **kwargs):
+    """
+    Asynchronous variant of create_chat_completion.
+    """
+    priority = priority_for(context) if priority is None else priority
+    deadline = deadline_of(context)
+    started = time.perf_counter()
+    try:
+        completion, queued = await scheduler.acall(
+            lambda: async_client.chat.completions.create(**kwargs, **request_options(async_client, deadline)),
+            kwargs, priority, deadline,
+        )
+    except Exception:
+        LLM_ERRORS.labels(kwargs.get("model"), operation).inc()
+        raise
+    record_completion(operation, kwargs.get("model"), time.perf_counter() - started, queued, completion, context)
+    return completion
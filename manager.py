@@ -1,51 +1,118 @@
 import os
+import ast
 import importlib
 import inspect
+import threading
 
 class Manager:
     def __init__(self):
-        # Dictionary to hold dynamically loaded agents by filename
+        # Dictionary to hold dynamically discovered agents by filename
         self.agents = {}
-        
-        # Dynamically load agents from the agents folder
+
+        # Agents are instantiated on first use, the lock keeps two requests from building the same agent
+        self.lock = threading.Lock()
+
+        # Dynamically discover agents from the agents folder
         self.load_agents()
 
+    def find_agent_class(self, path):
+        """
+        Parses an agent module without importing it and returns the name and description of the
+        first class that defines process_article, or None if the module has no such class.
+        """
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            methods = {item.name for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))}
+            if "process_article" not in methods:
+                continue
+
+            # Read the class-level description constant
+            description = "No description provided"
+            for item in node.body:
+                if (isinstance(item, ast.Assign) and any(getattr(target, "id", None) == "description" for target in item.targets)
+                        and isinstance(item.value, ast.Constant) and isinstance(item.value.value, str)):
+                    description = item.value.value
+            return node.name, description
+        return None
+
     def load_agents(self):
         """
-        Dynamically loads all agents in the agents folder using the filename as the key,
-        and populates the agents dictionary with the agent instances and their descriptions.
+        Discovers all agents in the agents folder using the filename as the key, and populates the
+        agents dictionary with their class names and descriptions. Modules are only imported, and
+        agents instantiated, when an agent is first requested.
         """
         agents_path = os.path.join(os.path.dirname(__file__), 'agents')
-        for filename in os.listdir(agents_path):
+        for filename in sorted(os.listdir(agents_path)):
             # Process only Python files, ignore __init__.py
             if filename.endswith('.py') and filename != '__init__.py':
                 agent_name = filename[:-3]  # Remove the '.py' extension
-                module_name = f'agents.{agent_name}'
-                module = importlib.import_module(module_name)
-
-                # Find the first class in the module to use as the agent
-                for _, obj in inspect.getmembers(module, inspect.isclass):
-                    # Ensure the class is defined in the current module
-                    if obj.__module__ == module_name:
-                        # Instantiate the agent and retrieve its description
-                        agent_instance = obj()
-                        description = getattr(agent_instance, "description", "No description provided")
-                        
-                        # Store the agent instance and description with the filename as the key
-                        self.agents[agent_name] = {
-                            "instance": agent_instance,
-                            "description": description
-                        }
-                        break  # Stop after the first class is found
+                agent_class = self.find_agent_class(os.path.join(agents_path, filename))
+                if agent_class is None:
+                    continue
+
+                class_name, description = agent_class
+                self.agents[agent_name] = {
+                    "module": f'agents.{agent_name}',
+                    "class": class_name,
+                    "description": description,
+                    "instance": None
+                }
+
+    def instantiate_agent(self, data):
+        """
+        Imports the agent's module, instantiates the agent and records its optional capabilities.
+        """
+        module = importlib.import_module(data["module"])
+        agent_instance = getattr(module, data["class"])()
+
+        # Agents may optionally provide an aprocess_article coroutine next to process_article
+        async_handler = getattr(agent_instance, "aprocess_article", None)
+        data["async"] = inspect.iscoroutinefunction(async_handler)
+
+        # Agents that accept a context argument keep per-call state in a RunContext and can report progress
+        data["context"] = "context" in inspect.signature(agent_instance.process_article).parameters
+
+        data["instance"] = agent_instance
+        return agent_instance
 
     def get_agents_list(self):
         """
-        Returns a list of all loaded agents with their descriptions.
+        Returns a list of all discovered agents with their descriptions.
         """
         return [{"name": name, "description": data["description"]} for name, data in self.agents.items()]
 
     def get_agent_by_name(self, name):
         """
-        Retrieves an agent instance by filename-based name if it exists in the loaded agents.
+        Retrieves an agent instance by filename-based name, instantiating it on first use.
+        Returns None if no such agent exists.
+        """
+        data = self.agents.get(name)
+        if data is None:
+            return None
+        if data["instance"] is None:
+            with self.lock:
+                if data["instance"] is None:
+                    self.instantiate_agent(data)
+        return data["instance"]
+
+    def is_loaded(self, name):
+        """
+        Returns True if the named agent has already been instantiated.
+        """
+        return self.agents.get(name, {}).get("instance") is not None
+
+    def supports_async(self, name):
+        """
+        Returns True if the named agent implements the aprocess_article coroutine.
+        """
+        return self.agents.get(name, {}).get("async", False)
+
+    def supports_context(self, name):
+        """
+        Returns True if the named agent accepts a per-call RunContext.
         """
-        return self.agents.get(name, {}).get("instance")
+        return self.agents.get(name, {}).get("context", False)
@@ -0,0 +1,62 @@
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Rough prices in USD per million (prompt, completion) tokens, used to estimate spend per model
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+REQUESTS_IN_FLIGHT = Gauge("infofact_requests_in_flight", "Analysis requests currently being processed")
+REQUEST_SECONDS = Histogram("infofact_request_seconds", "Wall time of analysis requests", ["route"])
+AGENT_SECONDS = Histogram("infofact_agent_seconds", "Wall time of agent runs, including cache hits", ["agent"])
+AGENT_ERRORS = Counter("infofact_agent_errors_total", "Agent runs that raised an error", ["agent"])
+AGENT_COALESCED = Counter("infofact_agent_coalesced_total", "Agent runs that joined an identical run in flight", ["agent"])
+AGENT_TIMEOUTS = Counter("infofact_agent_timeouts_total", "Agent runs that missed the request deadline", ["agent", "partial"])
+LLM_SECONDS = Histogram("infofact_llm_call_seconds", "Latency of LLM calls", ["model", "operation"])
+LLM_ERRORS = Counter("infofact_llm_errors_total", "LLM calls that raised an error", ["model", "operation"])
+LLM_TOKENS = Counter("infofact_llm_tokens_total", "Tokens used by LLM calls", ["model", "kind"])
+LLM_COST = Counter("infofact_llm_cost_dollars_total", "Estimated LLM spend in USD", ["model"])
+LLM_QUEUE_SECONDS = Histogram("infofact_llm_queue_seconds", "Time LLM calls waited for the scheduler", ["model", "priority"])
+LLM_THROTTLED = Counter("infofact_llm_throttled_total", "LLM calls the provider rejected with 429", ["model"])
+LLM_RETRIES = Counter("infofact_llm_retries_total", "LLM calls retried by the scheduler", ["model"])
+LLM_CONCURRENCY_LIMIT = Gauge("infofact_llm_concurrency_limit", "Adaptive concurrency limit per model", ["model"])
+LLM_IN_FLIGHT = Gauge("infofact_llm_in_flight", "LLM calls currently admitted per model", ["model"])
+FACTCHECK_SECONDS = Histogram("infofact_factcheck_call_seconds", "Latency of Google Fact Check API calls")
+FACTCHECK_ERRORS = Counter("infofact_factcheck_errors_total", "Google Fact Check API calls that failed")
+FETCH_SECONDS = Histogram("infofact_fetch_seconds", "Latency of article URL fetches")
+FETCH_ERRORS = Counter("infofact_fetch_errors_total", "Article URL fetches that failed")
+SENTIMENT_ARTICLES = Counter(
+    "infofact_sentiment_articles_total", "Articles scored by the sentiment agent, locally or escalated to the LLM", ["path"]
+)
+CACHE_LOOKUPS = Counter("infofact_cache_lookups_total", "Cache lookups by cache and outcome", ["cache", "outcome"])
+
+def observe_llm_call(model, operation, seconds, usage):
+    """
+    Records the latency and token usage of a chat completion.
+    :param usage: The usage object of the completion, or None if the API did not report it.
+    """
+    LLM_SECONDS.labels(model, operation).observe(seconds)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+    if model in MODEL_PRICES:
+        prompt_price, completion_price = MODEL_PRICES[model]
+        LLM_COST.labels(model).inc((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000)
+
+def record_cache_lookup(cache, hits, misses=0):
+    """
+    Counts cache hits and misses for the named cache.
+    """
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+def render_metrics():
+    """
+    Returns the metrics in the Prometheus text format and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
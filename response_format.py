@@ -0,0 +1,59 @@
+from agent_report import as_report, result_score
+
+def result_status(agent_name, result, timed_out):
+    """
+    Returns "ok", "error", "timed_out" or "partial" for an agent result.
+    """
+    if agent_name in timed_out:
+        return "partial" if as_report(result).partial else "timed_out"
+    if result.startswith(f"Error in {agent_name}:"):
+        return "error"
+    return "ok"
+
+def agent_entry(agent_name, result, timed_out=()):
+    """
+    Builds the structured entry of one agent result from the findings the agent reported: status,
+    score and what it measures, verdicts, evidence and the markdown text.
+    """
+    report = as_report(result)
+    return {
+        "agent": agent_name,
+        "status": result_status(agent_name, result, timed_out),
+        "score": report.score,
+        "score_label": report.score_label,
+        "verdicts": report.verdicts,
+        "evidence": report.evidence,
+        "text": str(report),
+    }
+
+def article_summary(article):
+    """
+    Describes the analyzed article by its content hash instead of echoing the text.
+    """
+    return {"hash": article.content_hash, "tokens": article.token_count, "characters": len(article.text)}
+
+def build_response(session_id, article, results, timed_out=()):
+    """
+    Builds the structured JSON response of an analysis.
+    :param session_id: The SessionID of the request.
+    :param article: The ArticleContext of the analyzed text.
+    :param results: A list of (agent_name, result) tuples in the requested order.
+    :param timed_out: The names of the agents that missed the deadline.
+    :return: A dictionary with the SessionID, the article summary and one entry per agent.
+    """
+    return {
+        "SessionID": session_id,
+        "Article": article_summary(article),
+        "Agents": [agent_entry(agent_name, result, timed_out) for agent_name, result in results],
+    }
+
+def history_entry(article, results):
+    """
+    Builds the compact session history entry of an analysis: the article hash, its paragraph hashes
+    for diffing the next edit against it, and each agent's score.
+    """
+    return {
+        "article": article.content_hash,
+        "paragraphs": list(article.paragraph_hashes),
+        "scores": {agent_name: result_score(result) for agent_name, result in results},
+    }
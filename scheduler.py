@@ -0,0 +1,384 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from concurrent.futures import Future
+import openai
+from context import count_tokens, DeadlineExceeded
+from metrics import LLM_QUEUE_SECONDS, LLM_THROTTLED, LLM_RETRIES, LLM_CONCURRENCY_LIMIT, LLM_IN_FLIGHT
+
+# Interactive analyses are admitted before bulk jobs waiting for the same model
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Requests and tokens per minute per model. The defaults follow OpenAI's usage tier 2; set
+# INFOFACT_LLM_LIMITS to the account's limits, e.g. "gpt-4o=5000:450000,gpt-3.5-turbo=3500:2000000".
+# A limit of 0 disables that bucket.
+DEFAULT_LIMITS = {
+    "gpt-4o": (5000, 450000),
+    "gpt-3.5-turbo": (3500, 2000000),
+}
+FALLBACK_LIMITS = (500, 200000)  # Models missing from the table
+
+# Completion tokens assumed for the tokens-per-minute budget when a call sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+# Errors worth retrying: throttling, dropped connections and timeouts, and server errors
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+def parse_limits(spec):
+    """
+    Parses INFOFACT_LLM_LIMITS, a comma-separated list of model=rpm:tpm entries.
+    :return: A dictionary of model -> (rpm, tpm).
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = entry.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+def priority_for(context):
+    """
+    Returns the scheduling priority of a call made for the given RunContext.
+    """
+    return PRIORITY_BATCH if context is not None and context.batch else PRIORITY_INTERACTIVE
+
+def retry_after(error):
+    """
+    Returns the delay the API asked for in its Retry-After header, or None.
+    """
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(value), 60.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    A bucket refilled continuously at `per_minute` units per minute and holding at most a minute's
+    worth. Reservations may overdraw it; the overdraft is the time the caller has to wait.
+    Not thread-safe on its own, the owning lane serializes access.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """
+        Takes `amount` units and returns the seconds until the bucket is out of debt again.
+        """
+        if not self.rate:
+            return 0.0
+        self.refill(now)
+        self.level -= min(amount, self.capacity)  # A call larger than a minute's budget still goes through
+        return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount):
+        """
+        Corrects an earlier reservation by `amount` units, negative to refund an overestimate.
+        """
+        if self.rate:
+            self.level = min(self.capacity, self.level - amount)
+
+    def drain(self):
+        """
+        Empties the bucket after the provider throttled us, so queued calls do not burst again.
+        """
+        if self.rate:
+            self.level = min(self.level, 0.0)
+
+
+class ModelLane:
+    """
+    Admission control for one model: request and token buckets, a priority queue of waiting calls
+    and an AIMD concurrency limit that halves when the provider throttles and grows by about one
+    call per round trip while calls succeed.
+    """
+
+    def __init__(self, model, rpm, tpm, max_concurrency, min_concurrency=1):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = []  # Heap of (priority, sequence, Future)
+        self.sequence = itertools.count()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        LLM_CONCURRENCY_LIMIT.labels(model).set(self.limit)
+
+    def enqueue(self, priority):
+        """
+        Queues a call and returns a Future that is resolved when the call may start.
+        """
+        future = Future()
+        with self.lock:
+            heapq.heappush(self.waiting, (priority, next(self.sequence), future))
+            self.dispatch()
+        return future
+
+    def dispatch(self):
+        """
+        Admits waiting calls in priority order while there is concurrency to spare. Called with the lock held.
+        """
+        while self.waiting and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self.waiting)
+            if not future.set_running_or_notify_cancel():
+                continue  # The waiter gave up
+            self.in_flight += 1
+            LLM_IN_FLIGHT.labels(self.model).set(self.in_flight)
+            future.set_result(None)
+
+    def reserve(self, tokens):
+        """
+        Charges one request and the estimated tokens to the buckets.
+        :return: The seconds to wait before sending the call.
+        """
+        now = time.monotonic()
+        with self.lock:
+            return max(self.paused_until - now, self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+
+    def release(self, succeeded=False, tokens_delta=0, throttled=False, pause=None, requests_delta=0):
+        """
+        Frees the call's slot and adapts the concurrency limit to its outcome.
+        :param succeeded: Whether the call completed; only successes grow the limit.
+        :param tokens_delta: Actual minus estimated tokens of a completed call.
+        :param throttled: Whether the provider answered 429 Too Many Requests.
+        :param pause: Seconds the provider asked us to wait before the next call.
+        :param requests_delta: -1 to refund the request of a call that was never sent.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.in_flight -= 1
+            self.requests.adjust(requests_delta)
+            self.tokens.adjust(tokens_delta)
+            if throttled:
+                self.throttled += 1
+                self.requests.drain()
+                self.tokens.drain()
+                if pause:
+                    self.paused_until = max(self.paused_until, now + pause)
+                # Calls already in flight fail together, so decrease at most once per second
+                if now - self.last_decrease > 1.0:
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                    self.last_decrease = now
+            elif succeeded and self.limit < self.max_concurrency:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            LLM_CONCURRENCY_LIMIT.labels(self.model).set(self.limit)
+            LLM_IN_FLIGHT.labels(self.model).set(self.in_flight)
+            self.dispatch()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self.waiting),
+                "throttled": self.throttled,
+            }
+
+
+class LLMScheduler:
+    """
+    Central admission control for all outbound LLM calls. Each model has its own lane with
+    requests-per-minute and tokens-per-minute buckets, so sustained throughput stays at the
+    provider's limits instead of oscillating between bursts and 429s. Throttled, dropped and
+    failed calls are retried here with jittered exponential backoff; the OpenAI clients
+    themselves do not retry.
+    """
+
+    def __init__(self, limits=None, max_concurrency=None, max_retries=None):
+        """
+        :param limits: Dictionary of model -> (rpm, tpm), default DEFAULT_LIMITS updated by INFOFACT_LLM_LIMITS.
+        :param max_concurrency: Upper bound of the adaptive concurrency per model, default INFOFACT_LLM_MAX_CONCURRENCY or 32.
+        :param max_retries: Retries of a failed call, default INFOFACT_LLM_MAX_RETRIES or 4.
+        """
+        if limits is None:
+            limits = {**DEFAULT_LIMITS, **parse_limits(os.environ.get("INFOFACT_LLM_LIMITS", ""))}
+        self.limits = limits
+        self.max_concurrency = int(max_concurrency or os.environ.get("INFOFACT_LLM_MAX_CONCURRENCY", 32))
+        self.max_retries = int(max_retries if max_retries is not None else os.environ.get("INFOFACT_LLM_MAX_RETRIES", 4))
+        self.lanes = {}
+        self.lock = threading.Lock()
+
+    def lane(self, model):
+        """
+        Returns the lane of a model, creating it on first use.
+        """
+        with self.lock:
+            lane = self.lanes.get(model)
+            if lane is None:
+                rpm, tpm = self.limits.get(model, FALLBACK_LIMITS)
+                lane = self.lanes[model] = ModelLane(model, rpm, tpm, self.max_concurrency)
+            return lane
+
+    def estimate_tokens(self, request):
+        """
+        Estimates the prompt and completion tokens a chat completion request will be charged.
+        """
+        model = request.get("model", "gpt-4o")
+        prompt_tokens = sum(count_tokens(message.get("content") or "", model) + 4 for message in request.get("messages", []))
+        return prompt_tokens + (request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+    def backoff(self, error, attempt, deadline=None):
+        """
+        Returns the delay before retrying a failed call, or None if it should not be retried,
+        including when the retry could not start before the deadline.
+        """
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            return None
+        # Full jitter spreads out the retries of calls that failed together
+        delay = retry_after(error) or random.uniform(0, min(20.0, 0.5 * 2 ** attempt))
+        if deadline is not None and delay >= deadline.remaining():
+            return None
+        return delay
+
+    def give_up(self, error, deadline):
+        """
+        Returns the error to raise for a call that is not retried: DeadlineExceeded if the call
+        failed because the deadline passed, e.g. a timeout cut short by it, otherwise the error itself.
+        """
+        if deadline is not None and deadline.expired() and not isinstance(error, DeadlineExceeded):
+            return DeadlineExceeded(f"Deadline of {deadline.seconds:g} seconds passed during the call: {error}")
+        return error
+
+    def check_wait(self, lane, estimate, wait, deadline):
+        """
+        Gives the slot, the reserved request and the reserved tokens back and raises DeadlineExceeded
+        if the rate limit wait would end after the deadline.
+        """
+        if deadline is not None and wait >= deadline.remaining():
+            lane.release(requests_delta=-1, tokens_delta=-estimate)
+            raise DeadlineExceeded(f"Rate limit of {lane.model} delays the call past the deadline")
+
+    def settle(self, lane, estimate, completion=None, error=None):
+        """
+        Releases the call's slot with what was learned from its outcome.
+        """
+        usage = getattr(completion, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        throttled = isinstance(error, openai.RateLimitError)
+        if throttled:
+            LLM_THROTTLED.labels(lane.model).inc()
+        lane.release(succeeded=completion is not None, tokens_delta=(actual - estimate) if actual else 0, throttled=throttled,
+                     pause=retry_after(error) if throttled else None)
+
+    def call(self, send, request, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        Sends a chat completion once the model's lane admits it, retrying transient failures.
+        :param send: A function taking no arguments that performs the API call.
+        :param request: The arguments of chat.completions.create, used for the model and the token estimate.
+        :param priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH.
+        :param deadline: Optional Deadline; DeadlineExceeded is raised if the call cannot complete before it.
+        :return: The completion and the seconds spent queued.
+        """
+        lane = self.lane(request.get("model"))
+        estimate = self.estimate_tokens(request)
+        queued = 0.0
+        for attempt in itertools.count():
+            started = time.perf_counter()
+            admitted = lane.enqueue(priority)
+            try:
+                admitted.result(timeout=deadline.remaining() if deadline is not None else None)
+            except TimeoutError:
+                # Give the slot back if it was granted just as the wait timed out
+                if not admitted.cancel():
+                    lane.release()
+                raise DeadlineExceeded(f"Deadline of {deadline.seconds:g} seconds passed while queued for {lane.model}")
+            wait = lane.reserve(estimate)
+            self.check_wait(lane, estimate, wait, deadline)
+            if wait > 0:
+                time.sleep(wait)
+            waited = time.perf_counter() - started
+            queued += waited
+            LLM_QUEUE_SECONDS.labels(lane.model, str(priority)).observe(waited)
+
+            try:
+                completion = send()
+            except Exception as e:
+                self.settle(lane, estimate, error=e)
+                delay = self.backoff(e, attempt, deadline)
+                if delay is None:
+                    error = self.give_up(e, deadline)
+                    if error is e:
+                        raise
+                    raise error from e
+                LLM_RETRIES.labels(lane.model).inc()
+                time.sleep(delay)
+                continue
+            except BaseException:
+                lane.release()
+                raise
+            self.settle(lane, estimate, completion=completion)
+            return completion, queued
+
+    async def acall(self, send, request, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        Asynchronous variant of call.
+        :param send: A function taking no arguments that returns the API call's awaitable.
+        """
+        lane = self.lane(request.get("model"))
+        estimate = self.estimate_tokens(request)
+        queued = 0.0
+        for attempt in itertools.count():
+            started = time.perf_counter()
+            admitted = lane.enqueue(priority)
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(admitted), deadline.remaining() if deadline is not None else None)
+            except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+                # Give the slot back if it was granted while the waiter was being cancelled
+                if not admitted.cancel():
+                    lane.release()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise DeadlineExceeded(f"Deadline of {deadline.seconds:g} seconds passed while queued for {lane.model}")
+                raise
+            wait = lane.reserve(estimate)
+            self.check_wait(lane, estimate, wait, deadline)
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                waited = time.perf_counter() - started
+                queued += waited
+                LLM_QUEUE_SECONDS.labels(lane.model, str(priority)).observe(waited)
+                completion = await send()
+            except asyncio.CancelledError:
+                lane.release()
+                raise
+            except Exception as e:
+                self.settle(lane, estimate, error=e)
+                delay = self.backoff(e, attempt, deadline)
+                if delay is None:
+                    error = self.give_up(e, deadline)
+                    if error is e:
+                        raise
+                    raise error from e
+                LLM_RETRIES.labels(lane.model).inc()
+                await asyncio.sleep(delay)
+                continue
+            self.settle(lane, estimate, completion=completion)
+            return completion, queued
+
+    def stats(self):
+        """
+        Returns each model lane's concurrency limit, in-flight and waiting calls and throttle count.
+        """
+        with self.lock:
+            lanes = dict(self.lanes)
+        return {model: lane.stats() for model, lane in lanes.items()}
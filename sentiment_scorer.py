@@ -0,0 +1,174 @@
+import re
+import json
+import numpy as np
+
+# Lower-cased words, keeping contractions such as "didn't" together
+WORD_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+# A negator flips the valence of lexicon words up to this many tokens after it
+NEGATION_WINDOW = 3
+INTENSIFIER_BOOST = 1.5
+
+# Articles whose valence mass per token stays below this are neutral wire copy (bias score below about 25)
+NEUTRAL_DENSITY = 0.03
+# Polarity (-1..1) beyond which the tone is positive or negative
+TONE_THRESHOLD = 0.25
+# Pseudo-tokens of neutral text added to every article, so a single charged word in a short text
+# does not read as a highly charged article
+PRIOR_TOKENS = 50
+# Scales valence density into the 0-100 bias score: 0.02 gives about 20, 0.15 about 80
+BIAS_SCALE = 10.0
+
+
+def render_sentiment(tone, bias_score, highlights, impact):
+    """
+    Renders a sentiment reading in the agent's text format: Overall Tone, Sentiment Bias Score,
+    Key Highlights and Impact.
+    """
+    return (
+        f"Overall Tone: {tone}\n"
+        f"Sentiment Bias Score: {bias_score}\n"
+        "Key Highlights:\n" + "\n".join(f"- {highlight}" for highlight in highlights) + "\n"
+        f"Impact: {impact}"
+    )
+
+
+class SentimentScore:
+    """
+    The local scorer's verdict on one article, in the fields of the LLM prompt's output format.
+    """
+
+    def __init__(self, tone, bias_score, confidence, positive, negative, tokens, charged_terms):
+        self.tone = tone
+        self.bias_score = bias_score
+        self.confidence = confidence
+        self.positive = positive  # Lexicon hits with positive valence
+        self.negative = negative  # Lexicon hits with negative valence
+        self.tokens = tokens
+        self.charged_terms = charged_terms  # The words contributing most valence, strongest first
+
+    def highlights(self):
+        """
+        Returns the key highlights of the score: the density of charged terms and the strongest ones.
+        """
+        per_hundred = 100.0 / max(self.tokens, 1)
+        return [
+            f"{self.positive * per_hundred:.1f} positive and {self.negative * per_hundred:.1f} negative terms per 100 words",
+            f"Most charged terms: {', '.join(self.charged_terms)}" if self.charged_terms else "No emotionally charged terms found",
+        ]
+
+    def impact(self):
+        """
+        Returns how the wording might influence readers.
+        """
+        if self.bias_score < 30:
+            return "The wording is unlikely to sway readers."
+        if self.bias_score < 70:
+            return f"The wording may nudge readers toward a {self.tone.lower()} view."
+        return f"Charged wording is likely to push readers toward a {self.tone.lower()} view."
+
+    def render(self):
+        """
+        Renders the score in the agent's text format, see render_sentiment.
+        """
+        return render_sentiment(self.tone, self.bias_score, self.highlights(), self.impact())
+
+
+class LexiconScorer:
+    """
+    Scores the tone and sentiment bias of articles from a valence lexicon, with negation and
+    intensifiers. All articles of a call are scored together in NumPy, so scoring a bulk run's
+    articles costs about as much as scoring one.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: JSON file with "valence" (word -> -3..3), "negators" and "intensifiers".
+        """
+        with open(path, encoding="utf-8") as f:
+            lexicon = json.load(f)
+        words = list(lexicon["valence"])
+        self.vocabulary = {word: i for i, word in enumerate(words)}
+        # Negators and intensifiers get ids after the valence words; id `self.unknown` is every other word
+        for word in lexicon.get("negators", []) + lexicon.get("intensifiers", []):
+            self.vocabulary.setdefault(word, len(self.vocabulary))
+        self.unknown = len(self.vocabulary)
+        self.words = np.array(words + [""] * (self.unknown + 1 - len(words)), dtype=object)
+
+        self.valence = np.zeros(self.unknown + 1)
+        self.valence[:len(words)] = [lexicon["valence"][word] for word in words]
+        self.is_negator = np.zeros(self.unknown + 1, dtype=bool)
+        self.is_negator[[self.vocabulary[word] for word in lexicon.get("negators", [])]] = True
+        self.is_intensifier = np.zeros(self.unknown + 1, dtype=bool)
+        self.is_intensifier[[self.vocabulary[word] for word in lexicon.get("intensifiers", [])]] = True
+
+    def token_ids(self, text):
+        return [self.vocabulary.get(word, self.unknown) for word in WORD_PATTERN.findall(text.lower())]
+
+    def score(self, texts):
+        """
+        Scores a list of articles.
+        :param texts: The article texts.
+        :return: A list of SentimentScore, one per text.
+        """
+        count = len(texts)
+        if not count:
+            return []
+
+        # Concatenate all articles, separated by padding so negation does not leak across them
+        ids, docs = [], []
+        for doc, text in enumerate(texts):
+            text_ids = self.token_ids(text)
+            ids.extend(text_ids + [self.unknown] * NEGATION_WINDOW)
+            docs.extend([doc] * len(text_ids) + [-1] * NEGATION_WINDOW)
+        ids = np.asarray(ids, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int64)
+        real = docs >= 0
+
+        # A word is negated if any of the previous NEGATION_WINDOW tokens is a negator
+        negators = self.is_negator[ids].astype(np.int64)
+        negated = np.convolve(negators, np.ones(NEGATION_WINDOW + 1, dtype=np.int64))[:len(ids)] - negators > 0
+        boosted = np.zeros(len(ids), dtype=bool)
+        boosted[1:] = self.is_intensifier[ids[:-1]]
+        valence = self.valence[ids] * np.where(negated, -1.0, 1.0) * np.where(boosted, INTENSIFIER_BOOST, 1.0)
+
+        docs, ids, valence = docs[real], ids[real], valence[real]
+        tokens = np.bincount(docs, minlength=count)
+        positive_mass = np.bincount(docs, weights=np.clip(valence, 0, None), minlength=count)
+        negative_mass = np.bincount(docs, weights=np.clip(-valence, 0, None), minlength=count)
+        positive_hits = np.bincount(docs, weights=valence > 0, minlength=count)
+        negative_hits = np.bincount(docs, weights=valence < 0, minlength=count)
+
+        mass = positive_mass + negative_mass
+        hits = positive_hits + negative_hits
+        polarity = np.divide(positive_mass - negative_mass, mass, out=np.zeros(count), where=mass > 0)
+        density = mass / (tokens + PRIOR_TOKENS)
+
+        tone = np.where(polarity > TONE_THRESHOLD, "Positive", np.where(polarity < -TONE_THRESHOLD, "Negative", "Neutral"))
+        neutral_copy = density < NEUTRAL_DENSITY
+        tone = np.where(neutral_copy, "Neutral", tone)
+        bias = np.rint(100 * (1 - np.exp(-BIAS_SCALE * density * (0.5 + 0.5 * np.abs(polarity))))).astype(int)
+
+        # Confidence: near-certain for plainly neutral copy, otherwise the polarity's distance from
+        # the tone threshold, discounted when only a handful of words carry the verdict
+        margin = np.clip(np.abs(np.abs(polarity) - TONE_THRESHOLD) / (1 - TONE_THRESHOLD), 0, 1)
+        support = 1 - np.exp(-hits / 4)
+        confidence = np.where(neutral_copy, 1 - 0.5 * density / NEUTRAL_DENSITY, margin * support)
+
+        # The three words with the most valence mass in each article
+        term_mass = np.zeros((count, self.unknown + 1))
+        np.add.at(term_mass, (docs, ids), np.abs(valence))
+        top_terms = np.argsort(-term_mass, axis=1)[:, :3]
+
+        return [
+            SentimentScore(
+                tone=str(tone[i]),
+                bias_score=int(bias[i]),
+                confidence=round(float(confidence[i]), 3),
+                positive=int(positive_hits[i]),
+                negative=int(negative_hits[i]),
+                tokens=int(tokens[i]),
+                charged_terms=[str(self.words[term]) for term in top_terms[i] if term_mass[i, term] > 0],
+            )
+            for i in range(count)
+        ]
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+
+def entry_size(entry):
+    """
+    Approximates the memory held by a history entry by its serialized length.
+    """
+    return len(json.dumps(entry, ensure_ascii=False))
+
+
+class MemorySessionStore:
+    """
+    In-memory session store with LRU and idle-TTL eviction, a per-session history cap and a
+    total memory budget across all sessions.
+    """
+
+    def __init__(self, max_sessions, idle_ttl, history_limit, memory_budget):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_limit = history_limit
+        self.memory_budget = memory_budget
+        self.sessions = OrderedDict()  # session_id -> {"history": [(size, entry)], "last_access": t, "size": bytes}
+        self.total_size = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def evict(self, keep=None):
+        """
+        Drops idle sessions, then the least recently used ones until the store is within its limits.
+        Must be called with the lock held.
+        """
+        expired_before = time.time() - self.idle_ttl
+        # Sessions are kept in access order, so idle ones are at the front
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            over_limit = len(self.sessions) > self.max_sessions or self.total_size > self.memory_budget
+            if session_id == keep or (session["last_access"] >= expired_before and not over_limit):
+                break
+            self.sessions.popitem(last=False)
+            self.total_size -= session["size"]
+            self.evictions += 1
+
+    def get_or_create(self, session_id):
+        """
+        Returns the SessionID if the session exists, otherwise creates a new session and returns its ID.
+        """
+        now = time.time()
+        with self.lock:
+            session = self.sessions.get(session_id) if session_id else None
+            if session is None or session["last_access"] < now - self.idle_ttl:
+                session_id = str(uuid.uuid4())
+                session = self.sessions[session_id] = {"history": [], "last_access": now, "size": 0}
+            session["last_access"] = now
+            self.sessions.move_to_end(session_id)
+            self.evict(keep=session_id)
+            return session_id
+
+    def append_history(self, session_id, entry):
+        """
+        Appends an entry to the session's history, dropping its oldest entries beyond the cap.
+        """
+        size = entry_size(entry)
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return  # Evicted while the request was running
+            session["history"].append((size, entry))
+            session["size"] += size
+            self.total_size += size
+
+            session["last_access"] = time.time()
+            self.sessions.move_to_end(session_id)
+
+            # Trim this session's history to the cap, then evict other sessions to meet the budget
+            history = session["history"]
+            while len(history) > self.history_limit:
+                self.drop_oldest_entry(session)
+            self.evict(keep=session_id)
+
+            # If this session alone exceeds the budget, drop its oldest entries too
+            while len(history) > 1 and self.total_size > self.memory_budget:
+                self.drop_oldest_entry(session)
+
+    def drop_oldest_entry(self, session):
+        """
+        Removes the oldest history entry of a session. Must be called with the lock held.
+        """
+        dropped_size, _ = session["history"].pop(0)
+        session["size"] -= dropped_size
+        self.total_size -= dropped_size
+
+    def get_history(self, session_id):
+        """
+        Returns a copy of the session's history entries, oldest first.
+        """
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return [entry for _, entry in session["history"]] if session else []
+
+    def stats(self):
+        """
+        Returns the number of sessions, their total size and the eviction counter.
+        """
+        with self.lock:
+            return {"sessions": len(self.sessions), "bytes": self.total_size, "evictions": self.evictions}
+
+
+class SQLiteSessionStore:
+    """
+    Session store backed by a local SQLite file, so several worker processes share the same sessions
+    without each holding a copy in RAM. Applies the same limits as the in-memory store, with the
+    memory budget capping the total size of stored history.
+    """
+
+    def __init__(self, db_path, max_sessions, idle_ttl, history_limit, memory_budget, evict_interval=30):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_limit = history_limit
+        self.memory_budget = memory_budget
+        self.evict_interval = evict_interval
+        self.last_eviction = 0
+        self.local = threading.local()
+
+        db = self.connection()
+        db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, last_access REAL NOT NULL)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS history (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL, entry TEXT NOT NULL, size INTEGER NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS history_session ON history (session_id, seq)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_access ON sessions (last_access)")
+        db.commit()
+
+    def connection(self):
+        """
+        Returns this thread's connection to the database, opening it on first use.
+        """
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")  # Readers in other processes do not block writers
+        return db
+
+    def delete_sessions(self, db, session_ids):
+        """
+        Deletes the given sessions and their history.
+        """
+        db.executemany("DELETE FROM history WHERE session_id = ?", [(session_id,) for session_id in session_ids])
+        db.executemany("DELETE FROM sessions WHERE id = ?", [(session_id,) for session_id in session_ids])
+
+    def evict(self, db, keep=None):
+        """
+        Drops idle sessions, then the least recently used ones until the store is within its limits.
+        Runs at most every evict_interval seconds since it scans the tables.
+        """
+        now = time.time()
+        if now - self.last_eviction < self.evict_interval:
+            return
+        self.last_eviction = now
+
+        expired = [row[0] for row in db.execute("SELECT id FROM sessions WHERE last_access < ?", (now - self.idle_ttl,))]
+        self.delete_sessions(db, [session_id for session_id in expired if session_id != keep])
+
+        count = db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        total_size = db.execute("SELECT COALESCE(SUM(size), 0) FROM history").fetchone()[0]
+        if count <= self.max_sessions and total_size <= self.memory_budget:
+            return
+
+        # Walk sessions from least to most recently used until both limits hold
+        victims = []
+        rows = db.execute(
+            "SELECT s.id, COALESCE(SUM(h.size), 0) FROM sessions s LEFT JOIN history h ON h.session_id = s.id "
+            "GROUP BY s.id ORDER BY s.last_access"
+        ).fetchall()
+        for session_id, size in rows:
+            if count <= self.max_sessions and total_size <= self.memory_budget:
+                break
+            if session_id == keep:
+                continue
+            victims.append(session_id)
+            count -= 1
+            total_size -= size
+        self.delete_sessions(db, victims)
+
+        # If the kept session alone exceeds the budget, drop its oldest entries but the latest
+        if keep and total_size > self.memory_budget:
+            for seq, size in db.execute(
+                "SELECT seq, size FROM history WHERE session_id = ? ORDER BY seq DESC LIMIT -1 OFFSET 1", (keep,)
+            ).fetchall()[::-1]:
+                if total_size <= self.memory_budget:
+                    break
+                db.execute("DELETE FROM history WHERE seq = ?", (seq,))
+                total_size -= size
+
+    def get_or_create(self, session_id):
+        """
+        Returns the SessionID if the session exists, otherwise creates a new session and returns its ID.
+        """
+        now = time.time()
+        db = self.connection()
+        with db:
+            row = db.execute("SELECT last_access FROM sessions WHERE id = ?", (session_id,)).fetchone() if session_id else None
+            if row is None or row[0] < now - self.idle_ttl:
+                if row is not None:
+                    self.delete_sessions(db, [session_id])
+                session_id = str(uuid.uuid4())
+                db.execute("INSERT INTO sessions (id, last_access) VALUES (?, ?)", (session_id, now))
+            else:
+                db.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, session_id))
+            self.evict(db, keep=session_id)
+        return session_id
+
+    def append_history(self, session_id, entry):
+        """
+        Appends an entry to the session's history, dropping its oldest entries beyond the cap.
+        """
+        serialized = json.dumps(entry, ensure_ascii=False)
+        db = self.connection()
+        with db:
+            if db.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is None:
+                return  # Evicted while the request was running
+            db.execute(
+                "INSERT INTO history (session_id, entry, size) VALUES (?, ?, ?)",
+                (session_id, serialized, len(serialized)),
+            )
+            db.execute(
+                "DELETE FROM history WHERE session_id = ? AND seq NOT IN "
+                "(SELECT seq FROM history WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                (session_id, session_id, self.history_limit),
+            )
+            db.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (time.time(), session_id))
+            self.evict(db, keep=session_id)
+
+    def get_history(self, session_id):
+        """
+        Returns the session's history entries, oldest first.
+        """
+        rows = self.connection().execute("SELECT entry FROM history WHERE session_id = ? ORDER BY seq", (session_id,))
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self):
+        """
+        Returns the number of sessions and the total size of their history.
+        """
+        db = self.connection()
+        return {
+            "sessions": db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "bytes": db.execute("SELECT COALESCE(SUM(size), 0) FROM history").fetchone()[0],
+        }
+
+
+def create_session_store():
+    """
+    Creates the session store configured by the environment:
+    INFOFACT_SESSION_BACKEND ("memory" or "sqlite"), INFOFACT_SESSION_DB, INFOFACT_SESSION_MAX,
+    INFOFACT_SESSION_TTL (idle seconds), INFOFACT_SESSION_HISTORY and INFOFACT_SESSION_MEMORY_BYTES.
+    """
+    limits = {
+        "max_sessions": int(os.environ.get("INFOFACT_SESSION_MAX", "10000")),
+        "idle_ttl": float(os.environ.get("INFOFACT_SESSION_TTL", "3600")),
+        "history_limit": int(os.environ.get("INFOFACT_SESSION_HISTORY", "20")),
+        "memory_budget": int(os.environ.get("INFOFACT_SESSION_MEMORY_BYTES", str(64 * 1024 * 1024))),
+    }
+    backend = os.environ.get("INFOFACT_SESSION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        db_path = os.environ.get("INFOFACT_SESSION_DB", os.path.join(os.path.dirname(__file__), "sessions.db"))
+        return SQLiteSessionStore(db_path, **limits)
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend}")
+    return MemorySessionStore(**limits)
@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import Future
+
+def outlasts(leader_expires_at, expires_at):
+    """
+    Returns True if a run with the leader's deadline ends no earlier than one with the given deadline.
+    """
+    return leader_expires_at is None or (expires_at is not None and leader_expires_at >= expires_at)
+
+
+class SingleFlight:
+    """
+    De-duplicates identical work in flight: the first caller for a key runs it, and callers that
+    arrive with the same key while it runs wait on the same Future instead of starting their own.
+    The key is dropped as soon as the run finishes, after that a result cache takes over.
+
+    A caller only joins a run whose deadline is not earlier than its own, so a run cut short by
+    its deadline never leaves a caller that still had time without a result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}  # key -> (Future shared by the leader and its followers, leader's deadline)
+        self.led = 0
+        self.joined = 0
+
+    def begin(self, key, join=True, expires_at=None):
+        """
+        Registers a run for the key, or finds the run already in flight.
+        :param key: Identifies the work, e.g. agent, prompt version and article hash.
+        :param join: Whether the caller may share a run in flight; callers that want a fresh
+            result pass False and run on their own if the key is taken.
+        :param expires_at: The caller's deadline as a time.monotonic() value, None without one.
+            A caller whose deadline is later than the leader's runs on its own.
+        :return: A tuple (future, leader). The leader must call finish with the outcome, followers
+            wait on the future. The future is None if the caller should run without sharing.
+        """
+        with self.lock:
+            future, leader_expires_at = self.flights.get(key, (None, None))
+            if future is not None:
+                if not join or not outlasts(leader_expires_at, expires_at):
+                    return None, False
+                self.joined += 1
+                return future, False
+            future = Future()
+            self.flights[key] = (future, expires_at)
+            # Running futures cannot be cancelled, so a follower giving up does not cancel the others
+            future.set_running_or_notify_cancel()
+            self.led += 1
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        """
+        Unregisters the leader's run and hands its outcome to the followers.
+        :param error: The exception the run failed with, raised to the followers instead of a result.
+        """
+        with self.lock:
+            if self.flights.get(key, (None, None))[0] is future:
+                del self.flights[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        """
+        Returns the number of runs in flight, the runs started and the duplicates that joined one.
+        """
+        with self.lock:
+            return {"in_flight": len(self.flights), "led": self.led, "joined": self.joined}
@@ -0,0 +1,34 @@
+import os
+import sys
+
+# The modules of the repository are imported as top-level modules, like the backend does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from benchmarks.stubs import Latency, OpenAIStubHandler, FactCheckStubHandler, start_stub
+from llm import create_openai_clients
+
+@pytest.fixture
+def stub_services(monkeypatch, tmp_path):
+    """
+    Starts the OpenAI and Fact Check stand-ins of the benchmarks and points the agents at them.
+    :return: The (openai, factcheck) stub servers, whose request counters the tests can read.
+    """
+    stubs = (
+        start_stub(OpenAIStubHandler, Latency("fixed:0.01")),
+        start_stub(FactCheckStubHandler, Latency("fixed:0.01")),
+    )
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{stubs[0].server_port}/v1")
+    monkeypatch.setenv("GOOGLE_API_KEY", "stub")
+    monkeypatch.setenv("INFOFACT_FACTCHECK_ENDPOINT", f"http://127.0.0.1:{stubs[1].server_port}/")
+    monkeypatch.setenv("INFOFACT_VERDICT_DB", ":memory:")
+    monkeypatch.setenv("INFOFACT_EVIDENCE_INDEX", ":memory:")
+    monkeypatch.setenv("INFOFACT_BATCH_DIR", str(tmp_path / "batch_jobs"))
+    # The pooled OpenAI clients keep the base URL they were created with
+    create_openai_clients.cache_clear()
+    yield stubs
+    create_openai_clients.cache_clear()
+    for stub in stubs:
+        stub.shutdown()
+        stub.server_close()
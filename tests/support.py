@@ -0,0 +1,21 @@
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def backend_environment(tmp_path, **overrides):
+    """
+    Returns the environment of a backend that keeps all state under tmp_path and talks to no real service.
+    """
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="stub",
+        GOOGLE_API_KEY="stub",
+        INFOFACT_VERDICT_DB=":memory:",
+        INFOFACT_EVIDENCE_INDEX=":memory:",
+        INFOFACT_BATCH_DIR=str(tmp_path / "batch_jobs"),
+        INFOFACT_SESSION_BACKEND="memory",
+        PYTHONPATH=ROOT,
+    )
+    env.pop("INFOFACT_CACHE_DB", None)
+    env.update(overrides)
+    return env
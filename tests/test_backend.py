@@ -0,0 +1,20 @@
+import pytest
+
+from support import backend_environment
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    for name, value in backend_environment(tmp_path).items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv("INFOFACT_DEFAULT_DEADLINE", "60")
+    monkeypatch.setenv("INFOFACT_MAX_DEADLINE", "300")
+    import backend
+    return backend
+
+@pytest.mark.parametrize("value", ["nan", "NaN", "inf", "-inf", "infinity", "-5", "0", "soon", ""])
+def test_invalid_deadlines_fall_back_to_the_default(backend, value):
+    assert backend.request_deadline({"Deadline": value}).seconds == 60
+
+@pytest.mark.parametrize("value, seconds", [("12.5", 12.5), ("300", 300), ("1e9", 300)])
+def test_deadlines_are_capped(backend, value, seconds):
+    assert backend.request_deadline({"Deadline": value}).seconds == seconds
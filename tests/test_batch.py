@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+from batch import BatchJob, BatchManager
+
+
+class FakeExecutor:
+    """
+    Answers every agent with a fixed report; articles containing "boom" fail.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.runs = 0
+        self.lock = threading.Lock()
+
+    def prepare_batch(self, agent_names, texts):
+        pass
+
+    def run(self, agent_names, text, use_cache=True, batch=False):
+        with self.lock:
+            self.runs += 1
+        time.sleep(self.delay)
+        if "boom" in text:
+            raise RuntimeError("boom")
+        return [(agent_name, "Score: 50") for agent_name in agent_names]
+
+
+def write_input(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+JOB_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def make_job(tmp_path, lines):
+    job_dir = tmp_path / JOB_ID
+    job_dir.mkdir()
+    manifest = {
+        "job_id": JOB_ID,
+        "input_path": write_input(job_dir / "input.jsonl", lines),
+        "agents": ["metadata_agent"],
+        "concurrency": 2,
+        "use_cache": False,
+        "status": "queued",
+        "total": None,
+    }
+    return BatchJob(str(job_dir), manifest)
+
+
+def test_malformed_line_fails_only_itself(tmp_path):
+    job = make_job(tmp_path, [json.dumps({"text": "Fine"}), "{not json", json.dumps(["a list"]), json.dumps({"text": "boom"})])
+    job.run(FakeExecutor())
+
+    status = job.status()
+    assert (status["Status"], status["Total"], status["Completed"], status["Failed"]) == ("finished", 4, 4, 3)
+    records = sorted((json.loads(line) for line in open(job.results_path, encoding="utf-8")), key=lambda r: r["index"])
+    assert [("error" in record) for record in records] == [False, True, True, True]
+
+
+def test_failed_count_survives_a_restart(tmp_path):
+    job = make_job(tmp_path, [json.dumps({"text": "Fine"}), json.dumps({"text": "boom"})])
+    job.run(FakeExecutor())
+    job.save_manifest()
+
+    reloaded = BatchManager(FakeExecutor(), jobs_dir=str(tmp_path)).get_job(job.job_id)
+    assert (reloaded.status()["Completed"], reloaded.status()["Failed"]) == (2, 1)
+
+    # Resuming skips both records and keeps counting the failure
+    reloaded.manifest["status"] = "running"
+    reloaded.run(FakeExecutor())
+    assert (reloaded.status()["Completed"], reloaded.status()["Failed"]) == (2, 1)
+
+
+def test_concurrent_resumes_start_one_runner(tmp_path):
+    job = make_job(tmp_path, [json.dumps({"text": f"Article {i}"}) for i in range(4)])
+    job.manifest["status"] = "running"  # Left by a process that stopped
+    job.save_manifest()
+    executor = FakeExecutor(delay=0.05)
+    manager = BatchManager(executor, jobs_dir=str(tmp_path))
+
+    barrier = threading.Barrier(8)
+
+    def resume():
+        barrier.wait()
+        manager.resume(job.job_id)
+
+    threads = [threading.Thread(target=resume) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    resumed = manager.get_job(job.job_id)
+    while resumed.running:
+        time.sleep(0.01)
+
+    assert executor.runs == 4
+    assert sum(1 for _ in open(resumed.results_path, encoding="utf-8")) == 4
@@ -0,0 +1,58 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from infofact_client import InfoFactClient, InfoFactError
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request with 504, like the backend when an analysis missed its deadline.
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.posts += 1
+        self.answer()
+
+    def do_GET(self):
+        self.server.gets += 1
+        self.answer()
+
+    def answer(self):
+        body = b'{"Error": "Deadline passed"}'
+        self.send_response(504)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def backend():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UnavailableHandler)
+    server.posts = server.gets = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_analysis_answered_504_is_not_resubmitted(backend):
+    with InfoFactClient(f"http://127.0.0.1:{backend.server_port}/infofactagents", retries=2) as client:
+        with pytest.raises(InfoFactError) as error:
+            client.analyze("Town001 has 2 million people.", ["factual_consistency_agent"])
+    assert error.value.status == 504
+    assert backend.posts == 1
+
+def test_idempotent_requests_are_retried(backend):
+    with InfoFactClient(f"http://127.0.0.1:{backend.server_port}/infofactagents", retries=2) as client:
+        with pytest.raises(InfoFactError):
+            client.list_agents(cached=False)
+        with pytest.raises(InfoFactError):
+            client.health()
+    assert (backend.posts, backend.gets) == (3, 3)
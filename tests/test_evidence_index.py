@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from evidence_index import EvidenceIndex, claim_terms
+from support import ROOT
+
+# Threshold the agent uses by default (INFOFACT_EVIDENCE_SIMILARITY)
+THRESHOLD = 0.9
+
+REVIEWED = [
+    "Vaccines contain microchips",
+    "The Earth is flat and NASA hides it",
+    "Joe Biden won the 2020 election by fraud",
+    "5G towers spread the coronavirus",
+    "The Eiffel Tower is located in Tampere, Finland",
+    "Vaccines cause autism",
+    "Drinking bleach cures COVID-19",
+    "Town007 is the capital of Country007 and has a population of 8 million people.",
+]
+
+# Rewordings of a reviewed claim, which may use its review
+NEAR_DUPLICATES = [
+    ("The vaccines contain microchips", "Vaccines contain microchips"),
+    ("NASA hides that the Earth is flat", "The Earth is flat and NASA hides it"),
+    ("Biden won the 2020 election through fraud", "Joe Biden won the 2020 election by fraud"),
+    ("Coronavirus is spread by 5G towers", "5G towers spread the coronavirus"),
+    ("Drinking bleach cures covid-19", "Drinking bleach cures COVID-19"),
+]
+
+# Claims that share words with a reviewed claim but say something else
+DIFFERENT_CLAIMS = [
+    "The Earth is round",
+    "The Earth is triangular",
+    "The Eiffel Tower is in Paris",
+    "Vaccines do not cause autism",
+    "Vaccines don't cause autism",
+    "Vaccines never cause autism",
+    "Biden won the 2020 election",
+    "Town001 is the capital of Country001 and has a population of 2 million people.",
+    "Town007 is the capital of Country007 and has a population of 2 million people.",
+]
+
+
+@pytest.fixture
+def index():
+    index = EvidenceIndex(":memory:", dimensions=1024)
+    index.add([{"text": text, "url": f"https://factcheck.example.com/{i}"} for i, text in enumerate(REVIEWED)])
+    return index
+
+
+@pytest.mark.parametrize("claim, reviewed", NEAR_DUPLICATES)
+def test_near_duplicates_match(index, claim, reviewed):
+    matches = index.search(claim, THRESHOLD)
+    assert [record["text"] for _, record in matches] == [reviewed]
+
+
+@pytest.mark.parametrize("claim", DIFFERENT_CLAIMS)
+def test_different_claims_do_not_match(index, claim):
+    assert index.search(claim, THRESHOLD) == []
+
+
+def test_stopwords_are_dropped_and_negations_kept():
+    assert claim_terms("The Earth is flat") == ["earth", "flat"]
+    assert claim_terms("Vaccines don't cause autism") == claim_terms("Vaccines do not cause autism")
+    assert "not" in claim_terms("Vaccines never cause autism")
+
+
+def test_old_index_is_vectorized_again(tmp_path):
+    path = str(tmp_path / "index")
+    EvidenceIndex(path).add([{"text": text, "url": "u"} for text in REVIEWED])
+    # An index written before the vector file was versioned only has the records
+    (tmp_path / "index" / "vectors-v2.npy").unlink()
+    np.save(tmp_path / "index" / "vectors.npy", np.zeros((4, 1024), dtype=np.float32))
+
+    index = EvidenceIndex(path)
+    assert index.stats()["reviews"] == len(REVIEWED)
+    assert [record["text"] for _, record in index.search("Vaccines contain microchips", THRESHOLD)] == [REVIEWED[0]]
+
+
+# Adds 600 distinct reviews in small batches, so the writers interleave and grow the vector file
+WRITER = """
+import sys
+from evidence_index import EvidenceIndex
+index = EvidenceIndex(sys.argv[1])
+worker = sys.argv[2]
+for start in range(0, 600, 20):
+    index.add([{"text": f"Worker {worker} claim {i} about Town{i:03d}", "url": f"https://factcheck.example.com/{worker}/{i}"}
+               for i in range(start, start + 20)])
+"""
+
+def test_processes_share_a_directory(tmp_path):
+    path = str(tmp_path / "index")
+    reader = EvidenceIndex(path)
+    writers = [
+        subprocess.Popen([sys.executable, "-c", WRITER, path, str(worker)], cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT))
+        for worker in range(4)
+    ]
+    assert all(writer.wait(timeout=120) == 0 for writer in writers)
+
+    index = EvidenceIndex(path)
+    assert index.stats()["reviews"] == 2400
+    # Every vector row belongs to the record on the same line
+    for row, record in enumerate(index.records):
+        assert np.array_equal(index.vectors[row], index.vectorize(record["text"]))
+
+    # An index opened before the writers ran sees their reviews
+    matches = reader.search("Worker 3 claim 599 about Town599", THRESHOLD)
+    assert matches and matches[0][1]["url"] == "https://factcheck.example.com/3/599"
@@ -0,0 +1,135 @@
+import sqlite3
+import time
+import threading
+
+from context import Deadline, DeadlineExceeded
+from executor import AgentExecutor
+
+
+class SlowAgent:
+    """
+    Takes a fixed time per article, or gives up at the deadline if that comes first.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.runs = 0
+
+    def process_article(self, article_text, context=None):
+        self.runs += 1
+        if context.deadline is not None and context.deadline.remaining() < self.seconds:
+            time.sleep(context.deadline.remaining())
+            context.deadline.check("the analysis")
+        time.sleep(self.seconds)
+        return f"Analysis of {article_text}"
+
+
+class PartialAgent(SlowAgent):
+    """
+    Returns what it has at the deadline, flagging the result as partial like the agents do.
+    """
+
+    def process_article(self, article_text, context=None):
+        try:
+            return super().process_article(article_text, context)
+        except DeadlineExceeded:
+            context.partial = True
+            return "Analysis of the first paragraph"
+
+
+class StaticManager:
+    def __init__(self, agent):
+        self.agent = agent
+
+    def get_agent_by_name(self, name):
+        return self.agent
+
+    def supports_context(self, name):
+        return True
+
+    def supports_async(self, name):
+        return False
+
+
+def run_together(executor, deadlines, stagger=0.05):
+    """
+    Runs the same agent on the same article once per deadline, each started shortly after the previous one.
+    :return: The result of each run, in the order of the deadlines.
+    """
+    results = [None] * len(deadlines)
+
+    def run(index, seconds):
+        results[index] = executor.run(["slow"], "The article", deadline=Deadline(seconds))[0][1]
+
+    threads = [threading.Thread(target=run, args=(index, seconds)) for index, seconds in enumerate(deadlines)]
+    for thread in threads:
+        thread.start()
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_run_with_later_deadline_does_not_join_a_timed_out_run():
+    agent = SlowAgent(0.5)
+    executor = AgentExecutor(StaticManager(agent), max_workers=4)
+
+    short, long = run_together(executor, [0.2, 5])
+    assert "did not finish within the 0.2 second deadline" in short
+    assert long == "Analysis of The article"
+    assert agent.runs == 2
+
+
+def test_partial_result_is_not_shared():
+    agent = PartialAgent(0.5)
+    executor = AgentExecutor(StaticManager(agent), max_workers=4)
+
+    leader, follower = run_together(executor, [0.3, 0.15])
+    assert leader == "Analysis of the first paragraph"
+    assert "did not finish" in follower
+    assert agent.runs == 1
+    assert executor.flights.stats()["joined"] == 1
+
+
+def test_run_with_earlier_deadline_shares_a_complete_result():
+    agent = SlowAgent(0.3)
+    executor = AgentExecutor(StaticManager(agent), max_workers=4)
+
+    assert run_together(executor, [5, 2]) == ["Analysis of The article"] * 2
+    assert agent.runs == 1
+
+
+class FailingCache:
+    """
+    A result cache whose writes fail, like a locked or full SQLite file.
+    """
+
+    def make_key(self, agent_name, agent_instance, article_text, digest=None):
+        return f"{agent_name}:{digest}"
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_follower_returns_when_the_leader_fails_in_the_cache():
+    agent = SlowAgent(0.3)
+    executor = AgentExecutor(StaticManager(agent), max_workers=4, cache=FailingCache())
+    results = [None, None]
+
+    def run(index):
+        results[index] = executor.run(["slow"], "The article")[0][1]
+
+    threads = [threading.Thread(target=run, args=(index,), daemon=True) for index in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert results == ["Error in slow: database is locked"] * 2
+    assert agent.runs == 1
+    assert executor.flights.stats()["in_flight"] == 0
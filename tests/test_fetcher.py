@@ -0,0 +1,116 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from context import Deadline
+from fetcher import ArticleFetcher, FetchError
+
+PAGE = b"<html><head><title>Town news</title></head><body><article><p>Town001 has 2 million people.</p></article></body></html>"
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """
+    /hop/<n> redirects to /hop/<n - 1> after HOP_SECONDS, /hop/0 is the page; /flaky answers 503
+    until it has been asked three times.
+    """
+    HOP_SECONDS = 0.3
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.path.startswith("/hop/"):
+            hops = int(self.path.rsplit("/", 1)[1])
+            if hops:
+                time.sleep(self.HOP_SECONDS)
+                self.answer(302, location=f"/hop/{hops - 1}")
+            else:
+                self.answer(200, PAGE)
+        elif self.path == "/flaky":
+            self.answer(503 if self.server.requests < 3 else 200, PAGE)
+        else:
+            self.answer(404)
+
+    def answer(self, status, body=b"", location=None):
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    monkeypatch.setenv("INFOFACT_FETCH_ALLOW_PRIVATE", "1")
+    return ArticleFetcher(timeout=5, fresh_for=0)
+
+
+def test_redirects_stop_at_the_deadline(site, fetcher):
+    server, base = site
+    started = time.perf_counter()
+    with pytest.raises(FetchError) as error:
+        fetcher.fetch(f"{base}/hop/5", Deadline(0.5))
+    assert error.value.status == 504
+    # Each hop is bounded by the time left, not by the full fetch timeout
+    assert time.perf_counter() - started < 1.5
+    assert server.requests < 5
+
+def test_redirects_within_the_deadline(site, fetcher):
+    _, base = site
+    assert "Town001 has 2 million people." in fetcher.fetch(f"{base}/hop/2", Deadline(5))
+
+def test_unavailable_answers_are_retried(site, fetcher):
+    server, base = site
+    assert "Town001 has 2 million people." in fetcher.fetch(f"{base}/flaky", Deadline(5))
+    assert server.requests == 3
+
+def test_retries_stop_at_the_deadline(site, fetcher):
+    server, base = site
+    fetcher.backoff = 1
+    with pytest.raises(FetchError) as error:
+        fetcher.fetch(f"{base}/flaky", Deadline(0.3))
+    assert error.value.status == 504
+    assert server.requests == 1
+
+def test_address_check_uses_the_port_of_the_scheme(monkeypatch):
+    ports = []
+
+    def getaddrinfo(host, port, *args):
+        ports.append(port)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    fetcher = ArticleFetcher()
+    for url in ("https://example.com/news", "http://example.com/news", "https://example.com:8443/news"):
+        fetcher.check_url(url)
+    assert ports == [443, 80, 8443]
+    with pytest.raises(FetchError):
+        fetcher.check_url("https://example.com:99999/news")
+
+def test_address_check_stops_at_the_deadline(monkeypatch):
+    def getaddrinfo(host, port, *args):
+        time.sleep(2)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    started = time.perf_counter()
+    with pytest.raises(FetchError) as error:
+        ArticleFetcher().fetch("https://example.com/news", Deadline(0.3))
+    assert error.value.status == 504
+    assert time.perf_counter() - started < 1
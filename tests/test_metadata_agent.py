@@ -0,0 +1,15 @@
+from agents.metadata_agent import MetadataAgent, registrable_domain
+
+def test_registrable_domain():
+    assert registrable_domain("https://www.bbc.co.uk/news") == "bbc.co.uk"
+    assert registrable_domain("https://news.example.com/a?b=c).") == "example.com"
+    assert registrable_domain("https://localhost/") is None
+
+def test_malformed_urls_are_skipped():
+    assert registrable_domain("https://[abc") is None
+    assert registrable_domain("https://[::1/") is None
+
+def test_article_with_a_malformed_url_is_analyzed(stub_services):
+    article = "Jane Doe wrote on https://[abc and https://www.example-news.com about the results."
+    entities = MetadataAgent().extract_entities(article)
+    assert entities == [("URL", "example-news.com"), ("Person", "Jane Doe")]
@@ -0,0 +1,22 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+CONCURRENCY = 32
+
+def test_concurrent_articles_do_not_cross_talk(stub_services):
+    from agents.factual_consistency_agent import FactualConsistencyAgent
+
+    # One shared instance serves every article, as in the threaded backend
+    agent = FactualConsistencyAgent()
+    articles = [
+        f"Town{i:03d} is the capital of Country{i:03d} and has a population of {i + 1} million people."
+        for i in range(CONCURRENCY)
+    ]
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        outputs = list(pool.map(agent.process_article, articles))
+
+    for i, output in enumerate(outputs):
+        assert set(re.findall(r"Town\d{3}", output)) == {f"Town{i:03d}"}
+        assert set(re.findall(r"Country\d{3}", output)) == {f"Country{i:03d}"}
+        assert output.count("Final Trustworthiness Score") == 1
+    assert stub_services[0].requests >= CONCURRENCY
@@ -0,0 +1,56 @@
+from agent_report import AgentReport
+from cache import ResultCache
+from context import ArticleContext, RunContext
+from response_format import build_response
+
+ARTICLE = (
+    "Town001 is the capital of Country001 and has 2 million people. "
+    "John Smith told https://www.example-news.com that the city was founded in 1850."
+)
+
+def analyze(agent):
+    article = ArticleContext(ARTICLE)
+    return agent.process_article(ARTICLE, context=RunContext(article=article))
+
+def test_agents_report_findings_with_labelled_scores(stub_services, monkeypatch):
+    # Above 1 the sentiment agent always asks the LLM instead of its local scorer
+    monkeypatch.setenv("INFOFACT_SENTIMENT_CONFIDENCE", "2")
+    from agents.factual_consistency_agent import FactualConsistencyAgent
+    from agents.metadata_agent import MetadataAgent
+    from agents.sentiment_analysis_agent import SentimentAnalysisAgent
+
+    results = [
+        ("factual_consistency_agent", analyze(FactualConsistencyAgent())),
+        ("sentiment_analysis_agent", analyze(SentimentAnalysisAgent())),
+        ("metadata_agent", analyze(MetadataAgent())),
+    ]
+    factual, sentiment, metadata = build_response("session", ArticleContext(ARTICLE), results)["Agents"]
+
+    assert factual["score_label"] == "trustworthiness"
+    assert f"Final Trustworthiness Score: {factual['score']}" in factual["text"]
+    assert {verdict["claim"] for verdict in factual["verdicts"]} >= {
+        "Town001 is the capital of Country001 and has 2 million people."
+    }
+    assert all(verdict["verdict"] in ("True", "False") for verdict in factual["verdicts"])
+
+    assert (sentiment["score"], sentiment["score_label"]) == (25, "bias")
+    assert sentiment["verdicts"] == [{"tone": "Neutral"}]
+    assert "Sentiment Bias Score: 25" in sentiment["text"]
+
+    assert (metadata["score"], metadata["score_label"]) == (None, None)
+    assert {verdict["entity"] for verdict in metadata["verdicts"]} == {"example-news.com", "John Smith"}
+
+def test_disk_cache_keeps_findings(tmp_path):
+    path = str(tmp_path / "results.db")
+    report = AgentReport("Final Trustworthiness Score: 90", score=90, score_label="trustworthiness",
+                         verdicts=[{"claim": "The sky is green.", "verdict": "False"}])
+    ResultCache(db_path=path).set("key", report)
+
+    cached = ResultCache(db_path=path).get("key")
+    assert cached == report
+    assert cached.findings() == report.findings()
+
+def test_error_messages_have_no_findings():
+    entry = build_response("session", ArticleContext(ARTICLE), [("metadata_agent", "Error in metadata_agent: boom")])
+    agent = entry["Agents"][0]
+    assert (agent["status"], agent["score"], agent["verdicts"]) == ("error", None, [])
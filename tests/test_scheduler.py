@@ -0,0 +1,23 @@
+import pytest
+
+from context import Deadline, DeadlineExceeded
+from scheduler import LLMScheduler
+
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Is Town001 the capital of Country001?"}]}
+
+
+def test_calls_refused_for_the_deadline_refund_their_reservations():
+    # One request per minute, so the second call would wait about a minute
+    scheduler = LLMScheduler(limits={"gpt-4o-mini": (1, 1000)})
+    scheduler.call(lambda: "completion", REQUEST, deadline=Deadline(5))
+    lane = scheduler.lane("gpt-4o-mini")
+    requests_level, tokens_level = lane.requests.level, lane.tokens.level
+
+    for _ in range(3):
+        with pytest.raises(DeadlineExceeded):
+            scheduler.call(lambda: "completion", REQUEST, deadline=Deadline(1))
+
+    # Refused calls leave the buckets as they were, so later calls do not wait for them
+    assert lane.requests.level == pytest.approx(requests_level, abs=0.01)
+    assert lane.tokens.level == pytest.approx(tokens_level, abs=1)
+    assert lane.stats()["in_flight"] == 0
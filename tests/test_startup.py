@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+from support import ROOT, backend_environment
+
+# Importing the backend parses the agent modules but must not import them or touch the network
+STARTUP_BOUND_SECONDS = 5.0
+
+PROBE = """
+import json, socket, sys
+
+def refuse(*args, **kwargs):
+    raise OSError("network access during startup")
+socket.socket.connect = refuse
+socket.create_connection = refuse
+socket.getaddrinfo = refuse
+
+import backend
+imported = sorted(name for name in sys.modules if name.startswith("agents."))
+health = backend.app.test_client().get("/infofactagents/health")
+print(json.dumps({
+    "startup": backend.STARTUP_SECONDS,
+    "imported": imported,
+    "status": health.status_code,
+    "health": health.get_json(),
+    "imported_after_health": sorted(name for name in sys.modules if name.startswith("agents.")),
+}))
+"""
+
+def run_probe(tmp_path):
+    completed = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=backend_environment(tmp_path),
+                               capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_backend_starts_fast_without_network_or_agent_imports(tmp_path):
+    report = run_probe(tmp_path)
+
+    assert report["startup"] < STARTUP_BOUND_SECONDS
+    assert report["imported"] == []
+    assert report["imported_after_health"] == []
+
+    assert report["status"] == 200
+    health = report["health"]
+    assert health["StartupSeconds"] == round(report["startup"], 4)
+    assert health["Agents"]
+    assert all(agent == {"loaded": False} for agent in health["Agents"].values())